@@ -1,113 +1,272 @@
-# A simple python script to trigger the different apigw endpoints
+# A python script to load test the apigw endpoints
 
 # What you should do before execution?
 # ------------------------------------
-# Update 'url' with the api gateway url 
+# Pass the api gateway url with --url (or set API_URL), the requests are
+# authorized with tokens signed with a key of the orders-api-signing-keys
+# secret, set AUTH_SIGNING_KEY_ID and AUTH_SIGNING_KEY to one of its key
+# ids and key. Use --local instead to load test the api served on
+# localhost, backed by an in-memory table (no token is needed).
 
 # What this script does:
 # ----------------------
-# 1) Places an order
-# 2) Waits 5 sec then gets the order status
-# 3) Cancels the order
-# 4) Waits 5 sec then gets the order status
+# Sends requests at the arrival rates of the --stages, each one picked
+# from the --mix of endpoints, with up to --workers requests in flight:
+# 1) create: places an order
+# 2) get: gets the status of one of the orders placed
+# 3) cancel: cancels one of the orders placed
+# 4) list: gets a page of the orders of the customer
+# It then prints the count, errors, throughput and p50/p95/p99/max latency
+# (ms) of every endpoint, and writes every request to --output.
 
 # What you can do?
 # ----------------
-# Run the script as it is and verify the order status in db and payment
-# processor step function (It should fail as we cancelled the order)
+# python apigw_script.py --local
+# python apigw_script.py --url <url> --stages 10:30,100:60,100:120 \
+#     --mix create=6,get=3,cancel=1 --output results.json
+# The stages above ramp up to 100 requests/s over 30s, then to 100/s
+# over 60s and hold it for 120s. --lifecycle instead places, gets,
+# cancels and gets a single order, waiting --wait seconds in between:
+# verify the order status in db and the payment processor step function
+# (It should fail as we cancelled the order)
 # stepfunction name: process-new-order-payment
 # dynamodb table: users-orders-table
-#                           OR
-# Play around with the sleep time and see how the behavior changes
 
 import os
-import json
+import sys
+import random
+import argparse
+import threading
 import requests
-from time import sleep
+from time import sleep, time
+from collections import deque
+from requests.adapters import HTTPAdapter
 
+root = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(root)
+sys.path.append(os.path.join(root, "src", "layers"))
 
-url = "Provide your url here"
+from loadgen import LoadTest, parse_mix, parse_stages, export, format_summary
 
 
-def getAuthToken():
+url = os.environ.get("API_URL", "Provide your url here")
+
+# seconds the signed tokens are valid for
+TOKEN_LIFETIME_SECONDS = 300
+# max number of placed orders kept for the get/cancel requests
+MAX_KNOWN_ORDERS = 10000
+
+
+class ApiClient:
+    """
+    requests to the apigw endpoints, shared by the worker threads. The
+    orders placed are kept so they can be polled and cancelled
+    """
+
+    def __init__(self, base_url, sign=True, timeout=30):
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.sign = sign
+        self.timeout = timeout
+        self.orders = deque(maxlen=MAX_KNOWN_ORDERS)
+        # ETag of the last response for each order
+        self.order_etags = {}
+        self._token = None
+        self._token_expiry = 0
+        self._lock = threading.Lock()
+
+    def session(self):
+        """
+        http session keeping its connection alive between requests
+        """
+        session = requests.Session()
+        session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        return session
+
+    def headers(self):
+        if not self.sign:
+            return {}
+        # tokens are reused until they're about to expire
+        with self._lock:
+            if time() > self._token_expiry - 30:
+                self._token_expiry = int(time()) + TOKEN_LIFETIME_SECONDS
+                self._token = getAuthToken(self._token_expiry)
+            return {"authorizationToken": self._token}
+
+    def create(self, session):
+        json_body = {
+            "Item": "test_item",
+            "Amount": 100,
+            "Description": "Description for item_test",
+        }
+        response = session.post(
+            self.base_url + "order",
+            headers=self.headers(),
+            json=json_body,
+            timeout=self.timeout,
+        )
+        if response.status_code == 200:
+            self.orders.append(response.json()["OrderId"])
+        return response.status_code
+
+    def get(self, session):
+        order_id = self.__known_order()
+        if order_id is None:
+            return self.create(session)
+        headers = self.headers()
+        # only get the order back if it changed since the last poll
+        etag = self.order_etags.get(order_id)
+        if etag:
+            headers["If-None-Match"] = etag
+        response = session.get(
+            self.base_url + f"order/{order_id}", headers=headers, timeout=self.timeout
+        )
+        if response.status_code == 200:
+            self.order_etags[order_id] = response.headers.get("ETag")
+        return response.status_code
+
+    def cancel(self, session):
+        order_id = self.__known_order(remove=True)
+        if order_id is None:
+            return self.create(session)
+        response = session.put(
+            self.base_url + f"cancel/{order_id}",
+            headers=self.headers(),
+            timeout=self.timeout,
+        )
+        return response.status_code
+
+    def list(self, session):
+        response = session.get(
+            self.base_url + "orders",
+            params={"limit": 20},
+            headers=self.headers(),
+            timeout=self.timeout,
+        )
+        return response.status_code
+
+    def operations(self):
+        return {
+            "create": self.create,
+            "get": self.get,
+            "cancel": self.cancel,
+            "list": self.list,
+        }
+
+    def __known_order(self, remove=False):
+        # deque appends/pops are thread safe, picking one isn't atomic but
+        # polling or cancelling an order twice is fine for a load test
+        try:
+            if remove:
+                return self.orders.popleft()
+            return self.orders[random.randrange(len(self.orders))]
+        except (IndexError, ValueError):
+            return None
+
+
+def getAuthToken(expiry=None):
     # Pass authentication token
     # along with the request.
-    # For demonstartion purpose, I'm 
-    # using the api-gw id which can be
-    # extracted from the endpoint url.
-    endpoint_items = url.split(".")
-    __gw_id = endpoint_items[0].split("/")[-1]
-    return __gw_id
-
-
-def create_new_order(item, amount, description=None):
-    # creating the json body
-    json_body = {"Item": item, "Amount": amount}
-    if description:
-        json_body["Description"] = description
-    # sending requests
-    __response = requests.post(
-        url=os.path.join(url, "order"),
-        headers={
-            "authorizationToken": getAuthToken(),
-        },
-        json=json_body,
+    # The token is signed with a key of the
+    # orders-api-signing-keys secret, set
+    # AUTH_SIGNING_KEY_ID and AUTH_SIGNING_KEY
+    # to one of its key ids and key.
+    from common.tokens import sign_token
+
+    expiry = expiry or int(time()) + TOKEN_LIFETIME_SECONDS
+    claims = {"sub": "apigw_script", "exp": expiry}
+    return sign_token(
+        claims, os.environ["AUTH_SIGNING_KEY"], os.environ["AUTH_SIGNING_KEY_ID"]
+    )
+
+
+def run_lifecycle(client, wait):
+    """
+    places, gets, cancels and gets a single order
+    """
+    session = client.session()
+    print("Creating new order")
+    print(f"Status: {client.create(session)}, order: {client.orders[-1]}")
+    sleep(wait)
+    print("Getting order status")
+    print(f"Status: {client.get(session)}")
+    print("Cancelling order")
+    order_id = client.orders[-1]
+    print(f"Status: {client.cancel(session)}")
+    client.orders.append(order_id)
+    sleep(wait)
+    print("Getting order status after cancellation")
+    print(f"Status: {client.get(session)}")
+
+
+def run_load_test(client, args):
+    load_test = LoadTest(
+        client.operations(),
+        parse_mix(args.mix),
+        parse_stages(args.stages),
+        workers=args.workers,
+        session=client.session,
+        seed=args.seed,
+    )
+    summary = load_test.run()
+    print(format_summary(summary))
+    if args.output:
+        export(args.output, summary, load_test.results)
+        print(f"Results written to {args.output}")
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the orders api")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default=url, help="api gateway url, defaults to API_URL")
+    target.add_argument(
+        "--local", action="store_true", help="load test the api served on localhost"
+    )
+    parser.add_argument(
+        "--stages",
+        default="10:10,10:30",
+        help="rate:seconds stages, the rate ramps linearly to each stage's rate",
     )
-    if __response.status_code == 200:
-        print(__response.text)
-        response = json.loads(__response.text)
-        return response["OrderId"]
-    else:
-        print(f"Execution failed, response message: {__response.text}")
-
-
-def get_order_status(order_id):
-    __response = requests.get(
-        url=os.path.join(url, "order", order_id),
-        headers={
-            "authorizationToken": getAuthToken(),
-        },
+    parser.add_argument(
+        "--mix", default="create=5,get=4,cancel=1", help="endpoint=weight of the requests"
     )
-    if __response.status_code == 200:
-        print(__response.text)
-        return __response.text
-    else:
-        print(f"Execution failed, response message: {__response.text}")
-
-
-def cancel_order(order_id):
-    __response = requests.put(
-        url=os.path.join(url, "cancel", order_id),
-        headers={
-            "authorizationToken": getAuthToken(),
-        },
+    parser.add_argument("--workers", type=int, default=32, help="max requests in flight")
+    parser.add_argument("--output", help="results file, .json or .csv (one row per request)")
+    parser.add_argument("--seed", type=int, help="seed of the endpoint picks")
+    parser.add_argument(
+        "--lifecycle", action="store_true", help="place, get and cancel a single order"
     )
-    if __response.status_code == 200:
-        print(__response.text)
-        return __response.text
-    else:
-        print(f"Execution failed, response message: {__response.text}")
-
-
-item: str = "test_item"
-ammount: int = 100
-description: str = "Description for item_test"
-
-# Create new Order
-print("Creating new order")
-order_id = create_new_order(
-    item=item,
-    amount=ammount,
-    description=description,
-)
-sleep(5)
-# Get Order Status
-print("Getting order status")
-get_order_status(order_id=order_id)
-# Cancel Order
-print("Cancelling order")
-cancel_order(order_id=order_id)
-sleep(5)
-# Get Order Status after Cancellation
-print("Getting order status")
-get_order_status(order_id=order_id)
+    parser.add_argument(
+        "--wait", type=float, default=5, help="seconds between lifecycle steps"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.local:
+        # chalice packages chalicelib next to app.py
+        sys.path.append(os.path.join(root, "src", "lambda"))
+        sys.path.append(os.path.join(root, "src", "lambda", "restapi"))
+        os.environ.setdefault("ORDERS_TABLE", "local-orders-table")
+        os.environ.setdefault("LAMBDA_FUNCTION_AUTHORIZER_URI", "local")
+        os.environ.setdefault("APIGW_INVOKE_LAMBDA_ROLE_ARN", "local")
+        # the app logs every order at INFO
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        from restapi import app
+        from local_aws.api import LocalApi
+
+        with LocalApi(app.app) as api:
+            return run(ApiClient(api.url, sign=False), args)
+    return run(ApiClient(args.url), args)
+
+
+def run(client, args):
+    if args.lifecycle:
+        return run_lifecycle(client, args.wait)
+    return run_load_test(client, args)
+
+
+if __name__ == "__main__":
+    main()
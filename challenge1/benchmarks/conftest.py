@@ -0,0 +1,81 @@
+import os
+import sys
+
+stub_env_var = {
+    "ORDERS_TABLE": "TEST_TABLE",
+    "ORDERS_SQS_URL": "TEST_SQS_URL",
+    "LAMBDA_FUNCTION_AUTHORIZER_URI": "TEST_URI",
+    "APIGW_INVOKE_LAMBDA_ROLE_ARN": "TEST_ARN",
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+}
+for k, v in stub_env_var.items():
+    os.environ[k] = v
+# chalice packages chalicelib next to app.py
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "lambda", "restapi"))
+
+import json
+import time
+from pytest import fixture
+from collections import Counter
+from unittest.mock import patch
+from common import dynamodb
+from local_aws.dynamodb import InMemoryTable
+from botocore.awsrequest import AWSResponse
+
+# latency added to every stubbed AWS call, roughly a same-region round trip
+REMOTE_CALL_LATENCY = 0.002
+
+
+@fixture
+def in_memory_table():
+    table = InMemoryTable(latency=REMOTE_CALL_LATENCY)
+    with patch.object(dynamodb, "__table", table):
+        yield table
+
+
+class utils:
+    def canned_http_response(client, body):
+        """
+        answer every call of `client` with `body` right after the request is
+        signed, so calls go through the whole botocore pipeline but the network
+        """
+        content = json.dumps(body).encode()
+
+        class RawBody:
+            def stream(self, **kwargs):
+                yield content
+
+        def send(request, **kwargs):
+            return AWSResponse(request.url, 200, {}, RawBody())
+
+        client.meta.events.register("before-send", send)
+
+    def benchmark_round_trips(benchmark, invoke, services, setup=None, rounds=20):
+        """
+        benchmark `invoke`, run after `setup` every round, and record the
+        round trips it makes to the `services` stand-ins and the cpu time
+        it takes per call in extra_info, so the time spent waiting on the
+        network and the time spent computing can be told apart.
+        Returns the round trips per call, by service operation
+        """
+        cpu_times = []
+        round_trips = Counter()
+
+        def timed_invoke():
+            before = [service.calls.copy() for service in services]
+            started = time.process_time()
+            invoke()
+            cpu_times.append(time.process_time() - started)
+            for service, calls in zip(services, before):
+                round_trips.update(service.calls - calls)
+
+        benchmark.pedantic(timed_invoke, setup=setup, rounds=rounds)
+        per_call = {
+            operation: count / len(cpu_times) for operation, count in round_trips.items()
+        }
+        benchmark.extra_info["round_trips"] = sum(per_call.values())
+        benchmark.extra_info["round_trips_by_operation"] = per_call
+        benchmark.extra_info["cpu_ms"] = sum(cpu_times) * 1000 / len(cpu_times)
+        return per_call
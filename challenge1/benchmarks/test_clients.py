@@ -0,0 +1,66 @@
+import json
+import boto3
+import pytest
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from common.clients import client_config
+
+CALLS = 50
+ITEM = {"pkey": {"S": "ORD0000001"}, "Status": {"S": "PLACED"}}
+
+
+class DynamoDBStandIn(BaseHTTPRequestHandler):
+    """
+    answers every request like a GetItem, keeping connections alive
+    """
+
+    protocol_version = "HTTP/1.1"
+    # send headers and body in one segment, avoids delayed ACK stalls
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        body = json.dumps({"Item": ITEM}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-amz-json-1.0")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def endpoint_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DynamoDBStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def back_to_back_calls(get_client):
+    for _ in range(CALLS):
+        get_client().get_item(TableName="TEST_TABLE", Key={"pkey": {"S": "ORD0000001"}})
+
+
+@pytest.mark.benchmark(group="clients")
+def test_new_client_per_call(benchmark, endpoint_url):
+    """
+    client created inside the handler on every invocation
+    """
+    benchmark(back_to_back_calls, lambda: boto3.client("dynamodb", endpoint_url=endpoint_url))
+
+
+@pytest.mark.benchmark(group="clients")
+def test_default_config_client(benchmark, endpoint_url):
+    client = boto3.client("dynamodb", endpoint_url=endpoint_url)
+    benchmark(back_to_back_calls, lambda: client)
+
+
+@pytest.mark.benchmark(group="clients")
+def test_factory_client(benchmark, endpoint_url):
+    client = boto3.client("dynamodb", endpoint_url=endpoint_url, config=client_config())
+    benchmark(back_to_back_calls, lambda: client)
@@ -0,0 +1,70 @@
+import boto3
+import pytest
+from conftest import utils
+from boto3.dynamodb.types import TypeSerializer, TypeDeserializer
+from common.codec import CodecTable, decode_order_item, encode_order_item
+
+ORDER = {
+    "pkey": "ORD0000001",
+    "Item": "dummy",
+    "Amount": 100,
+    "Description": "Description for item_test",
+    "Status": "PLACED",
+    "OrderedBy": "dummy@dummy.com",
+}
+
+serializer = TypeSerializer()
+deserializer = TypeDeserializer()
+WIRE_ORDER = {k: serializer.serialize(v) for k, v in ORDER.items()}
+
+
+@pytest.mark.benchmark(group="encode")
+def test_encode_type_serializer(benchmark):
+    benchmark(lambda: {k: serializer.serialize(v) for k, v in ORDER.items()})
+
+
+@pytest.mark.benchmark(group="encode")
+def test_encode_codec(benchmark):
+    benchmark(encode_order_item, ORDER)
+
+
+@pytest.mark.benchmark(group="decode")
+def test_decode_type_deserializer(benchmark):
+    benchmark(lambda: {k: deserializer.deserialize(v) for k, v in WIRE_ORDER.items()})
+
+
+@pytest.mark.benchmark(group="decode")
+def test_decode_codec(benchmark):
+    benchmark(decode_order_item, WIRE_ORDER)
+
+
+@pytest.mark.benchmark(group="get_item")
+def test_get_item_table_resource(benchmark):
+    table = boto3.resource("dynamodb").Table("TEST_TABLE")
+    utils.canned_http_response(table.meta.client, {"Item": WIRE_ORDER})
+    assert benchmark(table.get_item, Key={"pkey": "ORD0000001"})["Item"] == ORDER
+
+
+@pytest.mark.benchmark(group="get_item")
+def test_get_item_codec_table(benchmark):
+    client = boto3.client("dynamodb")
+    utils.canned_http_response(client, {"Item": WIRE_ORDER})
+    table = CodecTable(client, "TEST_TABLE")
+    assert benchmark(table.get_item, Key={"pkey": "ORD0000001"})["Item"] == ORDER
+
+
+@pytest.mark.benchmark(group="batch_get_item")
+def test_batch_get_item_table_resource(benchmark):
+    client = boto3.resource("dynamodb").meta.client
+    utils.canned_http_response(client, {"Responses": {"TEST_TABLE": [WIRE_ORDER] * 100}})
+    keys = [{"pkey": f"ORD{i:07d}"} for i in range(100)]
+    benchmark(client.batch_get_item, RequestItems={"TEST_TABLE": {"Keys": keys}})
+
+
+@pytest.mark.benchmark(group="batch_get_item")
+def test_batch_get_item_codec_table(benchmark):
+    client = boto3.client("dynamodb")
+    utils.canned_http_response(client, {"Responses": {"TEST_TABLE": [WIRE_ORDER] * 100}})
+    table = CodecTable(client, "TEST_TABLE")
+    keys = [{"pkey": f"ORD{i:07d}"} for i in range(100)]
+    benchmark(table.batch_get_item, RequestItems={"TEST_TABLE": {"Keys": keys}})
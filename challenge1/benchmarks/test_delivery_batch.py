@@ -0,0 +1,55 @@
+import json
+import time
+import pytest
+from unittest.mock import patch
+from common import dynamodb
+from local_aws.dynamodb import InMemoryTable
+from handle_delivery_process import index
+
+BATCH_SIZE = 10
+ORDER_LATENCY = 0.01
+# one order whose write is much slower than the rest, e.g. throttled
+SLOW_ORDER_LATENCY = 0.05
+
+ORDER_NUMBERS = [f"ORD{i:07d}" for i in range(1, BATCH_SIZE + 1)]
+EVENT = {
+    "Records": [
+        {"messageId": str(i), "body": json.dumps({"pkey": order_number})}
+        for i, order_number in enumerate(ORDER_NUMBERS)
+    ]
+}
+
+
+@pytest.mark.parametrize("workers", [1, 10])
+def test_delivery_batch(benchmark, workers):
+    """
+    with concurrent workers a batch takes about as long as its
+    slowest order instead of the sum of all of them
+    """
+    table = InMemoryTable(
+        latency=ORDER_LATENCY, key_latency={ORDER_NUMBERS[0]: SLOW_ORDER_LATENCY}
+    )
+    elapsed = []
+
+    def reset_orders():
+        for order_number in ORDER_NUMBERS:
+            table.items[order_number] = {"pkey": order_number, "Status": "PLACED"}
+
+    def process_batch():
+        started = time.monotonic()
+        response = index.handler(EVENT, None)
+        elapsed.append(time.monotonic() - started)
+        assert response == {"batchItemFailures": []}
+
+    benchmark.group = "delivery_batch"
+    with patch.object(dynamodb, "__table", table), patch.object(
+        index, "PROCESSING_WORKERS", workers
+    ):
+        benchmark.pedantic(process_batch, setup=reset_orders, rounds=5)
+
+    benchmark.extra_info["round_trips_per_batch"] = table.calls["update_item"] / len(elapsed)
+    sum_of_orders = SLOW_ORDER_LATENCY + ORDER_LATENCY * (BATCH_SIZE - 1)
+    if workers == 1:
+        assert min(elapsed) >= sum_of_orders
+    else:
+        assert min(elapsed) < SLOW_ORDER_LATENCY + 2 * ORDER_LATENCY
@@ -0,0 +1,174 @@
+import json
+import time
+import pytest
+from conftest import REMOTE_CALL_LATENCY, utils
+from unittest.mock import patch
+from chalice.test import Client
+from common import dynamodb, clients
+from common.tokens import SigningKeys, sign_token
+from local_aws.sqs import InMemoryQueue
+from local_aws.secretsmanager import InMemorySecrets
+
+ORDER = {"Item": "test_item", "Amount": 100, "Description": "dummy"}
+BATCH_SIZE = 10
+ORDER_NUMBERS = [f"ORD{i:07d}" for i in range(1, BATCH_SIZE + 1)]
+
+SIGNING_KEYS_SECRET_ARN = "TEST_SECRET_ARN"
+SIGNING_KEYS = {"key-1": "test-signing-key-1"}
+METHOD_ARN = "arn:aws:execute-api:us-east-1:123456789012:abcdef123/api/POST/order"
+
+pytestmark = pytest.mark.benchmark(group="handlers")
+
+
+@pytest.fixture
+def api(in_memory_table):
+    from restapi import app
+
+    with Client(app.app) as client, patch.object(
+        dynamodb, "__get_batch_client", lambda: in_memory_table
+    ), patch.object(dynamodb, "order_number_allocator", dynamodb.OrderNumberAllocator()):
+        # the first request pays for the lazy imports and the first number block
+        request(client, "POST", "/order", ORDER)
+        yield client
+
+
+def request(client, method, path, body=None):
+    response = client.http.request(
+        method,
+        path,
+        headers={"Content-Type": "application/json"},
+        body=json.dumps(body) if body is not None else b"",
+    )
+    assert response.status_code == 200
+    return response.json_body
+
+
+def set_status(table, status, order_numbers=ORDER_NUMBERS):
+    for order_number in order_numbers:
+        table.items[order_number] = {"pkey": order_number, **ORDER, "Status": status}
+
+
+def test_create_new_order(benchmark, api, in_memory_table):
+    round_trips = utils.benchmark_round_trips(
+        benchmark, lambda: request(api, "POST", "/order", ORDER), [in_memory_table]
+    )
+
+    # the order and its outbox record are a single transaction,
+    # order numbers are leased a block at a time
+    assert round_trips == {"transact_write_items": 1}
+
+
+def test_get_order_details(benchmark, api, in_memory_table):
+    set_status(in_memory_table, "PLACED")
+    round_trips = utils.benchmark_round_trips(
+        benchmark, lambda: request(api, "GET", f"/order/{ORDER_NUMBERS[0]}"), [in_memory_table]
+    )
+
+    assert round_trips == {"get_item": 1}
+
+
+def test_cancel_order(benchmark, api, in_memory_table):
+    round_trips = utils.benchmark_round_trips(
+        benchmark,
+        lambda: request(api, "PUT", f"/cancel/{ORDER_NUMBERS[0]}"),
+        [in_memory_table],
+        setup=lambda: set_status(in_memory_table, "PLACED"),
+    )
+
+    # a single conditional update, the order isn't read first
+    assert round_trips == {"update_item": 1}
+
+
+def test_orders_table_update_status(benchmark, in_memory_table):
+    from orders_table_update_status.index import handler
+
+    round_trips = utils.benchmark_round_trips(
+        benchmark,
+        lambda: handler({"pkey": ORDER_NUMBERS[0]}, None),
+        [in_memory_table],
+        setup=lambda: set_status(in_memory_table, "PROCESSING"),
+    )
+
+    assert round_trips == {"update_item": 1}
+
+
+def test_handle_delivery_process_records(benchmark, in_memory_table):
+    """
+    a batch delivered by the event source mapping
+    """
+    from handle_delivery_process.index import handler
+
+    event = {
+        "Records": [
+            {"messageId": str(i), "body": json.dumps({"pkey": order_number})}
+            for i, order_number in enumerate(ORDER_NUMBERS)
+        ]
+    }
+    round_trips = utils.benchmark_round_trips(
+        benchmark,
+        lambda: handler(event, None),
+        [in_memory_table],
+        setup=lambda: set_status(in_memory_table, "PLACED"),
+    )
+
+    assert round_trips == {"update_item": BATCH_SIZE}
+
+
+def test_handle_delivery_process_drain(benchmark, in_memory_table):
+    """
+    a batch received by draining the queue
+    """
+    from handle_delivery_process import index
+
+    # empty receives return right away instead of long polling
+    queue = InMemoryQueue(latency=REMOTE_CALL_LATENCY, time_scale=0)
+
+    def send_batch():
+        set_status(in_memory_table, "PLACED")
+        for order_number in ORDER_NUMBERS:
+            queue.send_message(MessageBody=json.dumps({"pkey": order_number}))
+
+    with patch.object(index, "get_sqs_client", lambda: queue):
+        round_trips = utils.benchmark_round_trips(
+            benchmark, lambda: index.handler({}, None), [in_memory_table, queue], setup=send_batch
+        )
+
+    # the messages are received and deleted a batch at a time,
+    # the last receive finds the queue empty
+    assert round_trips == {
+        "receive_message": 2,
+        "update_item": BATCH_SIZE,
+        "delete_message_batch": 1,
+    }
+
+
+@pytest.mark.parametrize("keys", ["cached", "expired"])
+def test_apigw_authorizer(benchmark, keys):
+    from apigw_authorizer import index
+
+    secrets = InMemorySecrets(
+        {SIGNING_KEYS_SECRET_ARN: json.dumps(SIGNING_KEYS)}, latency=REMOTE_CALL_LATENCY
+    )
+    claims = {"sub": "dummy@dummy.com", "exp": int(time.time()) + 300}
+    event = {
+        "methodArn": METHOD_ARN,
+        "authorizationToken": f"Bearer {sign_token(claims, SIGNING_KEYS['key-1'], 'key-1')}",
+    }
+
+    def expire_signing_keys():
+        index.signing_keys = SigningKeys(index.load_signing_keys)
+
+    with patch.object(index, "AUTH_SIGNING_KEYS_SECRET_ARN", SIGNING_KEYS_SECRET_ARN), patch.object(
+        index, "signing_keys", SigningKeys(index.load_signing_keys)
+    ), patch.object(clients, "get_client", lambda service, **kwargs: secrets):
+        # cached keys are loaded by an earlier invocation
+        if keys == "cached":
+            index.handler(event, None)
+        round_trips = utils.benchmark_round_trips(
+            benchmark,
+            lambda: index.handler(event, None),
+            [secrets],
+            setup=expire_signing_keys if keys == "expired" else None,
+        )
+
+    assert round_trips == ({"get_secret_value": 1} if keys == "expired" else {})
@@ -0,0 +1,71 @@
+import os
+import sys
+import json
+import pytest
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAYERS = os.path.join(ROOT, "src", "layers")
+
+with open(os.path.join(os.path.dirname(__file__), "import_time_budget.json")) as f:
+    BUDGET = json.load(f)
+
+# environment of the deployed functions, values don't matter at import
+HANDLER_ENV = {
+    "ORDERS_TABLE": "TEST_TABLE",
+    "ORDERS_SQS_URL": "TEST_SQS_URL",
+    "PAYMENT_PROCESSOR_SF_ARN": "TEST_ARN",
+    "LAMBDA_FUNCTION_AUTHORIZER_URI": "TEST_URI",
+    "APIGW_INVOKE_LAMBDA_ROLE_ARN": "TEST_ARN",
+}
+
+
+def import_handler(path, module, deferred):
+    """
+    import `module` in a fresh interpreter laid out like a lambda, the handler
+    folder and the layer on the path. Returns the cumulative import time of the
+    module in ms and the `deferred` modules it loaded
+    """
+    script = (
+        f"import sys, json, {module}; "
+        f"print(json.dumps([m for m in {deferred!r} if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        cwd=os.path.join(ROOT, path),
+        env={
+            **os.environ,
+            **HANDLER_ENV,
+            "PYTHONPATH": os.pathsep.join([os.path.join(ROOT, path), LAYERS]),
+        },
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # "import time: self [us] | cumulative | imported package", top level
+    # modules are the ones whose name isn't indented
+    for line in result.stderr.splitlines():
+        _, cumulative, name = line.split("|")
+        if name.strip() == module and not name[1:].startswith(" "):
+            return int(cumulative) / 1000, json.loads(result.stdout)
+    raise AssertionError(f"{module} not found in the import time report")
+
+
+@pytest.mark.parametrize("handler", BUDGET["handlers"])
+def test_import_time_within_budget(handler):
+    config = BUDGET["handlers"][handler]
+    timings = [
+        import_handler(config["path"], config["module"], config["deferred"])[0]
+        for _ in range(BUDGET["runs"])
+    ]
+    assert min(timings) <= config["budget_ms"], (
+        f"{handler} takes {min(timings):.1f}ms to import, "
+        f"budget is {config['budget_ms']}ms"
+    )
+
+
+@pytest.mark.parametrize("handler", BUDGET["handlers"])
+def test_heavy_modules_are_deferred(handler):
+    config = BUDGET["handlers"][handler]
+    _, loaded = import_handler(config["path"], config["module"], config["deferred"])
+    assert loaded == []
@@ -0,0 +1,64 @@
+import json
+import time
+import pytest
+from decimal import Decimal
+from chalice.app import handle_extra_types
+from common import serializer
+from common.serializer import dumps
+
+ORDER = {
+    "pkey": "ORD0000001",
+    "Item": "dummy",
+    "Amount": Decimal("100"),
+    "Description": "Description for item_test",
+    "Status": "PLACED",
+    "OrderedBy": "dummy@dummy.com",
+}
+# a single order, a page of GET /orders and the largest GET /orders?ids= response
+BODIES = {
+    "order": ORDER,
+    "page": {"Orders": [dict(ORDER, pkey=f"ORD{i:07d}") for i in range(100)]},
+    "batch": {"Orders": [dict(ORDER, pkey=f"ORD{i:07d}") for i in range(500)]},
+}
+ROUNDS = 200
+
+
+def chalice_dumps(body):
+    # what chalice does with a route's return value
+    return json.dumps(body, separators=(",", ":"), default=handle_extra_types)
+
+
+def elapsed(serialize, body):
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        serialize(body)
+    return time.perf_counter() - started
+
+
+@pytest.mark.parametrize("size", BODIES)
+def test_serialize_chalice(benchmark, size):
+    benchmark.group = f"serialize_{size}"
+    benchmark(chalice_dumps, BODIES[size])
+
+
+@pytest.mark.parametrize("size", BODIES)
+def test_serialize_layer(benchmark, size):
+    benchmark.group = f"serialize_{size}"
+    body = BODIES[size]
+    assert json.loads(benchmark(dumps, body)) == json.loads(chalice_dumps(body))
+    speedup = elapsed(chalice_dumps, body) / elapsed(dumps, body)
+    benchmark.extra_info["encoder"] = "orjson" if serializer.orjson else "json"
+    benchmark.extra_info["speedup"] = round(speedup, 2)
+    if serializer.orjson and size != "order":
+        assert speedup > 1.2
+
+
+@pytest.mark.benchmark(group="execution_input")
+def test_execution_input_json_dumps(benchmark):
+    # the order as received by POST /order, json.dumps can't take Decimals
+    benchmark(json.dumps, dict(ORDER, Amount=100))
+
+
+@pytest.mark.benchmark(group="execution_input")
+def test_execution_input_layer(benchmark):
+    assert json.loads(benchmark(dumps, ORDER))["Amount"] == 100
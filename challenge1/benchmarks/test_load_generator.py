@@ -0,0 +1,74 @@
+import csv
+import json
+import pytest
+from apigw_script import ApiClient
+from local_aws.api import LocalApi
+from loadgen import LoadTest, arrival_times, parse_stages, parse_mix, percentile, export
+
+
+@pytest.fixture(scope="module")
+def local_api():
+    from restapi import app
+
+    with LocalApi(app.app) as api:
+        yield api
+
+
+def test_arrivals_follow_the_stages():
+    # ramp up from 0 to 10/s over 2s (10 requests) then hold 10/s for 1s
+    offsets = list(arrival_times(parse_stages("10:2,10:1")))
+
+    assert len(offsets) == 20
+    assert offsets == sorted(offsets)
+    assert sum(1 for offset in offsets if offset <= 2) == 10
+    assert offsets[-1] == pytest.approx(3)
+
+
+def test_jump_to_a_rate():
+    offsets = list(arrival_times(parse_stages("20:0,20:1")))
+
+    assert offsets == pytest.approx([n / 20 for n in range(1, 21)])
+
+
+def test_percentiles_are_nearest_rank():
+    values = list(range(1, 101))
+
+    assert [percentile(values, p) for p in (50, 95, 99, 100)] == [50, 95, 99, 100]
+    assert percentile([], 50) is None
+
+
+def test_mix_and_stages_are_validated():
+    with pytest.raises(ValueError):
+        parse_mix("create=0")
+    with pytest.raises(ValueError):
+        parse_stages("-1:10")
+    with pytest.raises(ValueError):
+        LoadTest({"create": None}, {"delete": 1}, [(1, 1)])
+
+
+def test_load_test_against_the_local_api(local_api, tmp_path):
+    client = ApiClient(local_api.url, sign=False)
+    load_test = LoadTest(
+        client.operations(),
+        parse_mix("create=5,get=3,cancel=1,list=1"),
+        parse_stages("100:0,100:1"),
+        workers=8,
+        session=client.session,
+        seed=1,
+    )
+    summary = load_test.run()
+
+    assert summary["all"]["count"] == 100
+    assert summary["all"]["errors"] == 0
+    assert set(summary) == {"create", "get", "cancel", "list", "all"}
+    for stats in summary.values():
+        assert stats["p50"] <= stats["p95"] <= stats["p99"] <= stats["max"]
+    # every request went through the in-memory table
+    assert local_api.table.calls["transact_write_items"] >= summary["create"]["count"]
+
+    export(str(tmp_path / "results.json"), summary, load_test.results)
+    export(str(tmp_path / "results.csv"), summary, load_test.results)
+    with open(tmp_path / "results.json") as f:
+        assert json.load(f)["summary"] == summary
+    with open(tmp_path / "results.csv") as f:
+        assert len(list(csv.DictReader(f))) == 100
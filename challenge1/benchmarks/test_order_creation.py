@@ -0,0 +1,60 @@
+import json
+import time
+from conftest import REMOTE_CALL_LATENCY
+from unittest.mock import patch
+from chalice.test import Client
+from common import dynamodb
+from local_aws.dynamodb import InMemoryTable
+
+# StartExecution is a much slower call than a DynamoDB write
+START_EXECUTION_LATENCY = 0.05
+
+ORDER = {"Item": "test_item", "Amount": 100, "Description": "dummy"}
+
+
+def test_order_creation(benchmark):
+    """
+    POST /order only waits for the transactional write, payment
+    processing is started by the outbox relay off the request path
+    """
+    from restapi import app
+    from outbox_relay import index
+
+    table = InMemoryTable(latency=REMOTE_CALL_LATENCY)
+    started = []
+    elapsed = []
+
+    def start_payment_processing(order):
+        time.sleep(START_EXECUTION_LATENCY)
+        started.append(order["pkey"])
+
+    def create_order():
+        begin = time.monotonic()
+        response = client.http.post(
+            "/order",
+            headers={"Content-Type": "application/json"},
+            body=json.dumps(ORDER),
+        )
+        elapsed.append(time.monotonic() - begin)
+        assert response.status_code == 200
+
+    benchmark.group = "order_creation"
+    with Client(app.app) as client, patch.object(dynamodb, "__table", table), patch.object(
+        dynamodb, "__get_batch_client", lambda: table
+    ), patch.object(index, "start_payment_processing", start_payment_processing):
+        # the first request pays for the lazy imports and clients
+        create_order()
+        elapsed.clear()
+        benchmark.pedantic(create_order, rounds=10)
+        relayed = index.handler({"Records": table.stream}, None)
+
+    benchmark.extra_info["transactions_per_order"] = table.calls["transact_write_items"] / (
+        len(elapsed) + 1
+    )
+    assert min(elapsed) < START_EXECUTION_LATENCY
+    # every order created got its execution started by the relay
+    assert relayed == {"batchItemFailures": []}
+    assert sorted(started) == sorted(
+        key for key, item in table.items.items() if item.get("Status") == "PROCESSING"
+    )
+    assert len(started) == len(elapsed) + 1
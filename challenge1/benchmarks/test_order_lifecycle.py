@@ -0,0 +1,105 @@
+import time
+import pytest
+import threading
+from conftest import REMOTE_CALL_LATENCY
+from botocore.exceptions import ClientError
+from local_aws import stack
+from local_aws.sqs import InMemoryQueue
+from local_aws.pipeline import OrderPipeline
+from local_aws.stepfunctions import LocalStateMachine, LocalStepFunctions
+from lifecycle_driver import lifecycle_report
+
+ORDERS = 300
+
+
+@pytest.fixture(scope="module")
+def definition():
+    template = stack.synth(payment_wait_seconds=0, payment_state_machine_type="EXPRESS")
+    return stack.state_machine_definition(template)
+
+
+def run_pipeline(definition, **options):
+    from restapi import app
+
+    pipeline = OrderPipeline(app.app, definition, seed=1, **options)
+    with pipeline:
+        started = time.time()
+        timelines = pipeline.run(ORDERS, api_workers=8, cancel_ratio=0.1, timeout=60)
+        duration = time.time() - started
+    return lifecycle_report(pipeline, timelines, duration)
+
+
+def test_order_lifecycle(benchmark, definition):
+    """
+    every order goes through the api, the relay, the payment state
+    machine and the delivery lambda, or is cancelled on the way
+    """
+    benchmark.group = "order_lifecycle"
+    (report,) = benchmark.pedantic(
+        lambda: [run_pipeline(definition, state_machine_type="EXPRESS", latency=REMOTE_CALL_LATENCY)],
+        rounds=1,
+    )
+    benchmark.extra_info.update(
+        throughput=report["throughput"],
+        **{f"{stage}_p95_ms": stats["p95"] for stage, stats in report["stages"].items()},
+    )
+
+    statuses = report["statuses"]
+    assert set(statuses) <= {"IN_TRANSIT", "CANCELLED"}
+    assert sum(statuses.values()) == ORDERS
+    assert report["stages"]["end_to_end"]["count"] == statuses["IN_TRANSIT"]
+    assert report["dead_letters"] == {"outbox": 0, "orders_queue": 0}
+    # a single transaction per order and no execution for repeated records
+    assert report["calls"]["dynamodb"]["transact_write_items"] == ORDERS
+    assert report["calls"]["stepfunctions"]["start_execution"] == ORDERS
+
+
+def test_throttled_order_lifecycle(definition):
+    report = run_pipeline(
+        definition,
+        state_machine_type="EXPRESS",
+        throttle_rates={"stepfunctions": 0.2, "sqs": 0.05},
+    )
+
+    # throttled starts are retried by the relay, throttled receives
+    # fail the delivery invocation and are polled again
+    assert report["throttled"]["stepfunctions"]["start_execution"] > 0
+    assert report["throttled"]["sqs"]
+    assert report["invocation_errors"]["delivery"] > 0
+    assert report["dead_letters"]["outbox"] == 0
+    # orders whose message couldn't be sent stay PLACED
+    assert set(report["statuses"]) <= {"IN_TRANSIT", "CANCELLED", "PLACED"}
+    assert sum(report["statuses"].values()) == ORDERS
+
+
+def test_unprocessed_messages_go_to_the_dead_letters():
+    queue = InMemoryQueue(max_receive_count=1, time_scale=0.001)
+    queue.send_message(MessageBody="{}")
+
+    assert len(queue.receive_message(VisibilityTimeout=30)["Messages"]) == 1
+    # not deleted, received again once visible, but only once
+    time.sleep(0.05)
+    assert queue.receive_message() == {}
+    assert len(queue.dead_letters) == 1
+    assert queue.pending() == 0
+
+
+def test_standard_executions_are_deduplicated_while_running():
+    released = threading.Event()
+    state_machine = LocalStateMachine(
+        {"StartAt": "Wait", "States": {"Wait": {"Type": "Wait", "Seconds": 1, "End": True}}},
+        resources={},
+        wait=lambda seconds: released.wait(),
+    )
+    stepfunctions = LocalStepFunctions({"arn": state_machine})
+    execution = {"stateMachineArn": "arn", "name": "process_payment_ORD0000001", "input": "{}"}
+
+    started = stepfunctions.start_execution(**execution)
+    assert stepfunctions.start_execution(**execution) == started
+    released.set()
+    stepfunctions.shutdown()
+
+    # like the service once the execution closed
+    with pytest.raises(ClientError) as e:
+        stepfunctions.start_execution(**execution)
+    assert e.value.response["Error"]["Code"] == "ExecutionAlreadyExists"
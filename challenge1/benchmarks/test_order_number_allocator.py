@@ -0,0 +1,20 @@
+from common.dynamodb import OrderNumberAllocator
+
+ORDERS = 1000
+
+
+def test_allocate_order_numbers(benchmark, in_memory_table):
+    """
+    round trips per order drop to 1 / block_size
+    """
+    allocator = OrderNumberAllocator(block_size=50)
+
+    def allocate_orders():
+        for _ in range(ORDERS):
+            allocator.allocate()
+
+    benchmark.pedantic(allocate_orders, rounds=5)
+
+    round_trips_per_order = allocator.round_trips / (ORDERS * 5)
+    benchmark.extra_info["round_trips_per_order"] = round_trips_per_order
+    assert round_trips_per_order <= 0.02
@@ -0,0 +1,43 @@
+import re
+import time
+import pytest
+from schema import Schema
+from chalicelib.schemas import is_order_number, validate_post_order, post_order_schema_dict
+
+ORDER = {"Item": "dummy", "Amount": 100, "Description": "Description for item_test"}
+VALIDATIONS = 2000
+
+post_order_schema = Schema(post_order_schema_dict)
+
+
+def validations_per_second(validate, data):
+    started = time.perf_counter()
+    for _ in range(VALIDATIONS):
+        validate(data)
+    return VALIDATIONS / (time.perf_counter() - started)
+
+
+@pytest.mark.benchmark(group="post_order_validation")
+def test_validate_schema_library(benchmark):
+    benchmark(post_order_schema.validate, ORDER)
+    benchmark.extra_info["validations_per_second"] = round(
+        validations_per_second(post_order_schema.validate, ORDER)
+    )
+
+
+@pytest.mark.benchmark(group="post_order_validation")
+def test_validate_compiled(benchmark):
+    benchmark(validate_post_order, ORDER)
+    per_second = validations_per_second(validate_post_order, ORDER)
+    benchmark.extra_info["validations_per_second"] = round(per_second)
+    assert per_second > 10 * validations_per_second(post_order_schema.validate, ORDER)
+
+
+@pytest.mark.benchmark(group="order_number_validation")
+def test_order_number_re_match(benchmark):
+    benchmark(re.match, r"^ORD\d{7,}$", "ORD0000001")
+
+
+@pytest.mark.benchmark(group="order_number_validation")
+def test_order_number_compiled(benchmark):
+    assert benchmark(is_order_number, "ORD0000001")
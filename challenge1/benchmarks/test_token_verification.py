@@ -0,0 +1,28 @@
+import time
+import pytest
+from common.tokens import SigningKeys, sign_token, verify_token
+
+KEYS = {"key-1": "test-signing-key-1"}
+VERIFICATIONS = 10000
+
+
+@pytest.mark.benchmark(group="token_verification")
+@pytest.mark.parametrize("algorithm", ["HS256", "HS512"])
+def test_token_verification(benchmark, algorithm):
+    """
+    verifications are done in-process, the keys are only loaded once
+    """
+    signing_keys = SigningKeys(lambda: dict(KEYS))
+    claims = {"sub": "dummy@dummy.com", "aud": "orders-api", "exp": int(time.time()) + 300}
+    token = sign_token(claims, KEYS["key-1"], "key-1", algorithm)
+
+    assert benchmark(verify_token, token, signing_keys, audience="orders-api") == claims
+
+    started = time.perf_counter()
+    for _ in range(VERIFICATIONS):
+        verify_token(token, signing_keys, audience="orders-api")
+    per_second = VERIFICATIONS / (time.perf_counter() - started)
+    benchmark.extra_info["verifications_per_second"] = round(per_second)
+    assert signing_keys.loads == 1
+    # well under the latency of a single remote call per request
+    assert per_second > 10000
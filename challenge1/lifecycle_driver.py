@@ -0,0 +1,210 @@
+# A python script to benchmark the whole order lifecycle offline
+
+# What this script does:
+# ----------------------
+# Synthesizes the stack to get the payment state machine, then pushes
+# --orders orders through the api, the outbox relay, the payment state
+# machine, the orders queue and the delivery lambda, all running in this
+# process on top of in-memory stand-ins of DynamoDB, SQS and Step Functions
+# (see local_aws/). A --cancel-ratio share of the orders is cancelled
+# right after being placed.
+# It then prints the end-to-end throughput, the final status of the
+# orders, and the p50/p95/p99/max latency (ms) of every stage:
+# 1) api: POST /order
+# 2) relay: order written -> payment execution started
+# 3) payment: execution started -> order PLACED
+# 4) delivery: order PLACED -> sent to the queue -> order IN_TRANSIT
+# 5) end_to_end: POST /order sent -> order IN_TRANSIT
+
+# What you can do?
+# ----------------
+# python lifecycle_driver.py --orders 5000
+# python lifecycle_driver.py --orders 5000 --latency 0.005 \
+#     --throttle dynamodb=0.001,stepfunctions=0.05 --output report.json
+# Every AWS call takes --latency seconds and a share of the calls of each
+# service is throttled, so the retries and failures paths are exercised.
+
+import os
+import sys
+import json
+import time
+import argparse
+
+root = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(root)
+sys.path.append(os.path.join(root, "src", "layers"))
+sys.path.append(os.path.join(root, "src", "lambda"))
+# chalice packages chalicelib next to app.py
+sys.path.append(os.path.join(root, "src", "lambda", "restapi"))
+
+from loadgen import percentile, PERCENTILES
+
+# stage: (from, to) events of the order timelines
+STAGES = {
+    "api": ("requested", "created"),
+    "relay": ("written", "execution_started"),
+    "payment": ("execution_started", "placed"),
+    "delivery": ("placed", "in_transit"),
+    "end_to_end": ("requested", "in_transit"),
+}
+
+
+def stage_latencies(timelines):
+    """
+    count and latency percentiles (ms) of every stage, over the orders
+    that went through it
+    """
+    stages = {}
+    for stage, (start, end) in STAGES.items():
+        latencies = sorted(
+            (timeline[end] - timeline[start]) * 1000
+            for timeline in timelines
+            if start in timeline and end in timeline
+        )
+        if not latencies:
+            continue
+        stages[stage] = {
+            "count": len(latencies),
+            **{f"p{p}": percentile(latencies, p) for p in PERCENTILES},
+            "max": latencies[-1],
+            "mean": sum(latencies) / len(latencies),
+        }
+    return stages
+
+
+def lifecycle_report(pipeline, timelines, duration):
+    """
+    throughput, final statuses, stage latencies and calls made to every
+    stand-in of a pipeline run
+    """
+    statuses = {}
+    for timeline in timelines:
+        status = timeline.get("status", f"api {timeline['api_status']}")
+        statuses[status] = statuses.get(status, 0) + 1
+    in_transit = statuses.get("IN_TRANSIT", 0)
+    services = {
+        "dynamodb": pipeline.table,
+        "sqs": pipeline.queue,
+        "stepfunctions": pipeline.stepfunctions,
+    }
+    return {
+        "orders": len(timelines),
+        "duration": duration,
+        "throughput": in_transit / duration if duration else None,
+        "statuses": statuses,
+        "stages": stage_latencies(timelines),
+        "calls": {name: dict(service.calls) for name, service in services.items()},
+        "throttled": {name: dict(service.throttled) for name, service in services.items()},
+        "dead_letters": {
+            "outbox": len(pipeline.outbox_dead_letters),
+            "orders_queue": len(pipeline.queue.dead_letters),
+        },
+        "invocation_errors": dict(pipeline.invocation_errors),
+    }
+
+
+def format_report(report):
+    lines = [
+        f"{report['orders']} orders in {report['duration']:.1f}s, "
+        f"{report['throughput']:.1f} orders/s in transit",
+        "statuses: " + ", ".join(f"{k}={v}" for k, v in report["statuses"].items()),
+        "throttled: "
+        + ", ".join(f"{k}={sum(v.values())}" for k, v in report["throttled"].items()),
+        "dead letters: " + ", ".join(f"{k}={v}" for k, v in report["dead_letters"].items()),
+    ]
+    columns = ["count", *(f"p{p}" for p in PERCENTILES), "max"]
+    lines.append(f"{'stage':<12}" + "".join(f"{column:>10}" for column in columns))
+    for stage, stats in report["stages"].items():
+        lines.append(
+            f"{stage:<12}"
+            + f"{stats['count']:>10}"
+            + "".join(f"{stats[column]:>10.1f}" for column in columns[1:])
+        )
+    return "\n".join(lines)
+
+
+def parse_throttle(value):
+    """
+    "dynamodb=0.01,stepfunctions=0.05" -> {"dynamodb": 0.01, "stepfunctions": 0.05}
+    """
+    if not value:
+        return {}
+    return {
+        service.strip(): float(rate)
+        for service, rate in (pair.split("=") for pair in value.split(","))
+    }
+
+
+def run(args):
+    from local_aws import stack
+    from local_aws.pipeline import OrderPipeline
+
+    # the mocked payment wait is done by the pipeline
+    template = stack.synth(
+        payment_wait_seconds=0,
+        payment_state_machine_type=args.state_machine_type,
+        order_status_update=args.order_status_update,
+    )
+    from restapi import app
+
+    pipeline = OrderPipeline(
+        app.app,
+        stack.state_machine_definition(template),
+        latency=args.latency,
+        throttle_rates=parse_throttle(args.throttle),
+        state_machine_type=args.state_machine_type,
+        payment_wait=args.payment_wait,
+        execution_workers=args.execution_workers,
+        seed=args.seed,
+    )
+    with pipeline:
+        started = time.time()
+        timelines = pipeline.run(
+            args.orders,
+            api_workers=args.api_workers,
+            cancel_ratio=args.cancel_ratio,
+            timeout=args.timeout,
+        )
+        duration = time.time() - started
+    return lifecycle_report(pipeline, timelines, duration), timelines
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the order lifecycle offline")
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--api-workers", type=int, default=16, help="concurrent POST /order")
+    parser.add_argument("--cancel-ratio", type=float, default=0.1)
+    parser.add_argument("--latency", type=float, default=0, help="seconds per AWS call")
+    parser.add_argument(
+        "--throttle", help="service=share of the calls throttled, i.e. stepfunctions=0.05"
+    )
+    parser.add_argument(
+        "--state-machine-type", choices=["STANDARD", "EXPRESS"], default="STANDARD"
+    )
+    parser.add_argument("--order-status-update", choices=["lambda", "dynamodb"], default="lambda")
+    parser.add_argument("--payment-wait", type=float, default=0, help="seconds per payment")
+    parser.add_argument("--execution-workers", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--output", help="json file for the report and the order timelines")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.environ.setdefault("ORDERS_TABLE", "local-orders-table")
+    os.environ.setdefault("LAMBDA_FUNCTION_AUTHORIZER_URI", "local")
+    os.environ.setdefault("APIGW_INVOKE_LAMBDA_ROLE_ARN", "local")
+    # the lambdas log every order at INFO
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    report, timelines = run(args)
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"report": report, "orders": timelines}, f, indent=2)
+        print(f"Report written to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
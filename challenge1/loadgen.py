@@ -0,0 +1,210 @@
+import csv
+import json
+import math
+import time
+import random
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+# percentiles reported for every endpoint
+PERCENTILES = (50, 95, 99)
+
+
+def parse_stages(value):
+    """
+    "10:30,50:60" -> [(10.0, 30.0), (50.0, 60.0)], each stage moving the
+    arrival rate (requests per second) linearly from the rate of the
+    previous stage to its own rate over its duration (seconds). The
+    first stage starts from 0, a 0 duration stage jumps to its rate
+    """
+    stages = []
+    for stage in value.split(","):
+        rate, duration = stage.split(":")
+        stages.append((float(rate), float(duration)))
+        if stages[-1][0] < 0 or stages[-1][1] < 0:
+            raise ValueError(f"Invalid stage {stage}")
+    return stages
+
+
+def parse_mix(value):
+    """
+    "create=6,get=3,cancel=1" -> {"create": 6.0, "get": 3.0, "cancel": 1.0}
+    """
+    mix = {}
+    for weight in value.split(","):
+        name, share = weight.split("=")
+        mix[name.strip()] = float(share)
+    if not mix or min(mix.values()) < 0 or sum(mix.values()) <= 0:
+        raise ValueError(f"Invalid request mix {value}")
+    return mix
+
+
+def arrival_times(stages):
+    """
+    offsets in seconds of the requests sent following `stages`, spaced
+    so the cumulated number of requests follows the integral of the rate
+    """
+    start, previous_rate, count = 0.0, 0.0, 0.0
+    n = 1
+    for rate, duration in stages:
+        if duration == 0:
+            previous_rate = rate
+            continue
+        slope = (rate - previous_rate) / duration
+        stage_count = (previous_rate + rate) / 2 * duration
+        # the n-th request is sent when count + r0*t + slope*t^2/2 == n
+        while n <= count + stage_count:
+            needed = n - count
+            if slope == 0:
+                offset = needed / previous_rate
+            else:
+                offset = (
+                    -previous_rate
+                    + math.sqrt(previous_rate * previous_rate + 2 * slope * needed)
+                ) / slope
+            yield start + min(offset, duration)
+            n += 1
+        start += duration
+        count += stage_count
+        previous_rate = rate
+
+
+def percentile(values, p):
+    """
+    nearest-rank percentile of sorted `values`
+    """
+    if not values:
+        return None
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+class LoadTest:
+    """
+    open model load test: requests are sent at the times set by the
+    stages whatever the response times, by up to `workers` threads.
+
+    `operations` maps each endpoint of the mix to a function taking the
+    thread's http session and returning the response status code.
+    Latency is measured from the time a request was due, so requests
+    waiting for a free worker show in the tail instead of being hidden
+    """
+
+    def __init__(self, operations, mix, stages, workers=32, session=None, seed=None):
+        unknown = set(mix) - set(operations)
+        if unknown:
+            raise ValueError(f"Unknown endpoints in the mix: {', '.join(sorted(unknown))}")
+        self.operations = operations
+        self.endpoints = list(mix)
+        self.weights = [mix[name] for name in self.endpoints]
+        self.stages = stages
+        self.workers = workers
+        self.new_session = session
+        self.results = []
+        self.duration = 0
+        self._random = random.Random(seed)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _session(self):
+        # one pooled session per thread, requests sessions aren't thread safe
+        session = getattr(self._local, "session", None)
+        if session is None and self.new_session is not None:
+            session = self._local.session = self.new_session()
+        return session
+
+    def _send(self, endpoint, due, started):
+        begin = time.monotonic()
+        try:
+            status, error = self.operations[endpoint](self._session()), None
+        except Exception as e:
+            status, error = None, f"{type(e).__name__}: {e}"
+        end = time.monotonic()
+        result = {
+            "endpoint": endpoint,
+            "status": status,
+            "offset": due,
+            "latency": end - started - due,
+            "service_time": end - begin,
+            "error": error,
+        }
+        with self._lock:
+            self.results.append(result)
+
+    def run(self):
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for due in arrival_times(self.stages):
+                delay = started + due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                endpoint = self._random.choices(self.endpoints, self.weights)[0]
+                executor.submit(self._send, endpoint, due, started)
+        self.duration = time.monotonic() - started
+        return self.summary()
+
+    def summary(self):
+        """
+        count, errors, throughput and latency percentiles (ms) by endpoint
+        """
+        by_endpoint = defaultdict(list)
+        for result in self.results:
+            by_endpoint[result["endpoint"]].append(result)
+        by_endpoint["all"] = self.results
+        summary = {}
+        for endpoint, results in by_endpoint.items():
+            if not results:
+                continue
+            latencies = sorted(result["latency"] * 1000 for result in results)
+            statuses = defaultdict(int)
+            for result in results:
+                statuses[str(result["status"] or result["error"])] += 1
+            summary[endpoint] = {
+                "count": len(results),
+                "errors": sum(1 for r in results if not is_success(r["status"])),
+                "throughput": len(results) / self.duration if self.duration else None,
+                **{f"p{p}": percentile(latencies, p) for p in PERCENTILES},
+                "max": latencies[-1],
+                "mean": sum(latencies) / len(latencies),
+                "statuses": dict(statuses),
+            }
+        return summary
+
+
+def is_success(status):
+    # 304 is the answer to a poll of an unchanged order
+    return status is not None and (200 <= status < 300 or status == 304)
+
+
+def export(path, summary, results):
+    """
+    write the summary and every request to `path`, as json or as csv
+    (one row per request) depending on its extension
+    """
+    if path.endswith(".csv"):
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(
+                f, ["endpoint", "status", "offset", "latency", "service_time", "error"]
+            )
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        with open(path, "w") as f:
+            json.dump({"summary": summary, "requests": results}, f, indent=2)
+
+
+def format_summary(summary):
+    """
+    summary as a table, latencies in ms
+    """
+    columns = ["count", "errors", "throughput", *(f"p{p}" for p in PERCENTILES), "max"]
+    lines = [f"{'endpoint':<10}" + "".join(f"{column:>12}" for column in columns)]
+    for endpoint, stats in summary.items():
+        cells = "".join(
+            f"{stats[column]:>12.1f}"
+            if isinstance(stats[column], float)
+            else f"{stats[column]!s:>12}"
+            for column in columns
+        )
+        lines.append(f"{endpoint:<10}{cells}")
+    return "\n".join(lines)
@@ -0,0 +1,61 @@
+import threading
+from unittest.mock import patch
+from common import dynamodb
+from chalice.config import Config
+from chalice.local import LocalDevServer, ChaliceRequestHandler
+from local_aws.dynamodb import InMemoryTable
+
+
+class QuietRequestHandler(ChaliceRequestHandler):
+    # headers and body are written separately, with Nagle's algorithm the
+    # body waits for the client's delayed ack on kept alive connections
+    disable_nagle_algorithm = True
+
+    # a line per request would slow the server down under load
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalApi:
+    """
+    serves the chalice `app` on localhost, backed by an InMemoryTable
+    instead of the orders table, so it can be load tested offline.
+
+    The custom authorizer isn't run by chalice locally and the outbox
+    relay isn't either: orders stay PLACED until they're cancelled.
+    `port` 0 picks a free port, the server runs in a daemon thread
+    while the context is entered
+    """
+
+    def __init__(self, app, table=None, host="127.0.0.1", port=0):
+        self.app = app
+        self.table = table or InMemoryTable()
+        self._server = LocalDevServer(
+            app, Config.create(), host, port, handler_cls=QuietRequestHandler
+        )
+        self._patches = [
+            patch.object(dynamodb, "__table", self.table),
+            patch.object(dynamodb, "__get_batch_client", lambda: self.table),
+            # numbers leased off another table would be handed out again
+            patch.object(dynamodb, "order_number_allocator", dynamodb.OrderNumberAllocator()),
+        ]
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def __enter__(self):
+        for patcher in self._patches:
+            patcher.start()
+        self._thread = threading.Thread(target=self._server.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server.server_close()
+        self._thread.join()
+        for patcher in reversed(self._patches):
+            patcher.stop()
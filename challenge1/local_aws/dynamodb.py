@@ -0,0 +1,342 @@
+import re
+import copy
+import time
+import threading
+from decimal import Decimal
+from botocore.exceptions import ClientError
+from boto3.dynamodb.types import TypeSerializer
+from local_aws.service import RemoteService
+
+
+class InMemoryTable(RemoteService):
+    """
+    in-process stand-in for the boto3 dynamodb Table resource.
+
+    Only the calls and expressions used by the common layer are
+    supported. Every call is atomic, latency and throttling are
+    injected as described in RemoteService.
+
+    Writes are recorded in `stream` like the table's stream (NEW_IMAGE).
+    """
+
+    throttling_error = "ProvisionedThroughputExceededException"
+
+    def __init__(
+        self, name="TEST_TABLE", latency=0, key_latency=None, throttle_rate=0, seed=None
+    ):
+        super().__init__(latency, key_latency, throttle_rate, seed)
+        self.name = name
+        self.items = {}
+        self.stream = []
+        self._lock = threading.Lock()
+
+    def get_item(self, Key, **kwargs):
+        self._round_trip("get_item", Key["pkey"])
+        with self._lock:
+            item = self.items.get(Key["pkey"])
+            return {"Item": copy.deepcopy(item)} if item else {}
+
+    def _write(self, item):
+        """
+        store `item` and record it in the stream, the lock must be held
+        """
+        serializer = TypeSerializer()
+        event = "MODIFY" if item["pkey"] in self.items else "INSERT"
+        self.items[item["pkey"]] = copy.deepcopy(item)
+        self.stream.append(
+            {
+                "eventName": event,
+                "dynamodb": {
+                    "Keys": {"pkey": serializer.serialize(item["pkey"])},
+                    "NewImage": {k: serializer.serialize(v) for k, v in item.items()},
+                    "SequenceNumber": str(len(self.stream) + 1),
+                    "ApproximateCreationDateTime": time.time(),
+                },
+            }
+        )
+
+    def put_item(
+        self,
+        Item,
+        ConditionExpression=None,
+        ExpressionAttributeNames=None,
+        ExpressionAttributeValues=None,
+        ReturnValuesOnConditionCheckFailure="NONE",
+        **kwargs,
+    ):
+        self._round_trip("put_item", Item["pkey"])
+        with self._lock:
+            self._check_condition(
+                "PutItem",
+                Item["pkey"],
+                ConditionExpression,
+                ExpressionAttributeNames,
+                ExpressionAttributeValues,
+                ReturnValuesOnConditionCheckFailure,
+            )
+            self._write(Item)
+        return {}
+
+    def delete_item(
+        self,
+        Key,
+        ConditionExpression=None,
+        ExpressionAttributeNames=None,
+        ExpressionAttributeValues=None,
+        ReturnValuesOnConditionCheckFailure="NONE",
+        **kwargs,
+    ):
+        self._round_trip("delete_item", Key["pkey"])
+        with self._lock:
+            self._check_condition(
+                "DeleteItem",
+                Key["pkey"],
+                ConditionExpression,
+                ExpressionAttributeNames,
+                ExpressionAttributeValues,
+                ReturnValuesOnConditionCheckFailure,
+            )
+            self.items.pop(Key["pkey"], None)
+        return {}
+
+    def query(
+        self,
+        KeyConditionExpression,
+        ExpressionAttributeNames=None,
+        ExpressionAttributeValues=None,
+        Limit=None,
+        ExclusiveStartKey=None,
+        **kwargs,
+    ):
+        """
+        equality key conditions only, i.e. on the partition key of an
+        index. Items are returned by pkey, all attributes projected
+        """
+        self._round_trip("query")
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        with self._lock:
+            items = sorted(
+                (
+                    item
+                    for item in self.items.values()
+                    if _evaluate_condition(KeyConditionExpression, item, names, values)
+                ),
+                key=lambda item: item["pkey"],
+            )
+            if ExclusiveStartKey:
+                items = [i for i in items if i["pkey"] > ExclusiveStartKey["pkey"]]
+            response = {"Items": copy.deepcopy(items[:Limit])}
+        if Limit and len(items) > Limit:
+            last = items[Limit - 1]
+            response["LastEvaluatedKey"] = {
+                "pkey": last["pkey"],
+                **{
+                    key: last[key]
+                    for key in _condition_attributes(KeyConditionExpression, names)
+                },
+            }
+        return response
+
+    def _check_condition(
+        self, operation, pkey, expression, names, values, return_values
+    ):
+        """
+        raise the error of a failed ConditionExpression, the lock must be held
+        """
+        old = self.items.get(pkey)
+        if expression and not _evaluate_condition(
+            expression, old or {}, names or {}, values or {}
+        ):
+            raise _condition_check_failed(
+                operation, old if return_values == "ALL_OLD" else None
+            )
+
+    def transact_write_items(self, TransactItems):
+        """
+        Put actions only, all items are written or none is
+        """
+        self._round_trip("transact_write_items")
+        puts = [action["Put"] for action in TransactItems]
+        with self._lock:
+            reasons = [
+                {"Code": "ConditionalCheckFailed"}
+                if "ConditionExpression" in put
+                and not _evaluate_condition(
+                    put["ConditionExpression"],
+                    self.items.get(put["Item"]["pkey"], {}),
+                    put.get("ExpressionAttributeNames", {}),
+                    put.get("ExpressionAttributeValues", {}),
+                )
+                else {"Code": "None"}
+                for put in puts
+            ]
+            if any(reason["Code"] != "None" for reason in reasons):
+                raise ClientError(
+                    {
+                        "Error": {
+                            "Code": "TransactionCanceledException",
+                            "Message": "Transaction cancelled",
+                        },
+                        "CancellationReasons": reasons,
+                    },
+                    "TransactWriteItems",
+                )
+            for put in puts:
+                self._write(put["Item"])
+        return {}
+
+    def update_item(
+        self,
+        Key,
+        UpdateExpression,
+        ExpressionAttributeNames=None,
+        ExpressionAttributeValues=None,
+        ConditionExpression=None,
+        ReturnValues="NONE",
+        ReturnValuesOnConditionCheckFailure="NONE",
+        **kwargs,
+    ):
+        self._round_trip("update_item", Key["pkey"])
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        with self._lock:
+            self._check_condition(
+                "UpdateItem",
+                Key["pkey"],
+                ConditionExpression,
+                names,
+                values,
+                ReturnValuesOnConditionCheckFailure,
+            )
+            old = self.items.get(Key["pkey"])
+            item = copy.deepcopy(old) if old else dict(Key)
+            updated = {}
+            for action, operands in _parse_update_expression(UpdateExpression):
+                for attribute, *value in operands:
+                    attribute = names.get(attribute, attribute)
+                    if action == "REMOVE":
+                        item.pop(attribute, None)
+                        continue
+                    value = values[value[0]]
+                    if action == "ADD":
+                        value = item.get(attribute, Decimal(0)) + Decimal(value)
+                    item[attribute] = value
+                    updated[attribute] = value
+            self._write(item)
+            if ReturnValues == "UPDATED_NEW":
+                return {"Attributes": copy.deepcopy(updated)}
+            if ReturnValues == "ALL_NEW":
+                return {"Attributes": copy.deepcopy(item)}
+            if ReturnValues == "ALL_OLD" and old:
+                return {"Attributes": copy.deepcopy(old)}
+        return {}
+
+
+def _condition_check_failed(operation, item=None):
+    """
+    the error raised by the Table resource, its Item isn't deserialized
+    """
+    response = {
+        "Error": {
+            "Code": "ConditionalCheckFailedException",
+            "Message": "The conditional request failed",
+        }
+    }
+    if item is not None:
+        serializer = TypeSerializer()
+        response["Item"] = {k: serializer.serialize(v) for k, v in item.items()}
+    return ClientError(response, operation)
+
+
+def _evaluate_condition(expression, item, names, values):
+    """
+    evaluate a condition made of attribute_exists(a), attribute_not_exists(a),
+    a = :v, a < :v and a IN (:v, ...) clauses joined by AND, and of such
+    conditions joined by OR, parenthesized or not
+    """
+    return any(
+        _evaluate_conjunction(alternative, item, names, values)
+        for alternative in _split_top_level(expression, "OR")
+    )
+
+
+def _evaluate_conjunction(expression, item, names, values):
+    for clause in _split_top_level(expression, "AND"):
+        function = re.fullmatch(r"(attribute_exists|attribute_not_exists)\((.+)\)", clause)
+        if function:
+            attribute = names.get(function[2], function[2])
+            if (attribute in item) != (function[1] == "attribute_exists"):
+                return False
+            continue
+        comparison = re.fullmatch(r"(\S+)\s*(=|<|IN)\s*\(?([^)]*)\)?", clause)
+        if not comparison:
+            raise NotImplementedError(f"Unsupported condition: {clause}")
+        attribute = names.get(comparison[1], comparison[1])
+        operands = [values[v.strip()] for v in comparison[3].split(",")]
+        if attribute not in item:
+            return False
+        if comparison[2] == "<":
+            if not item[attribute] < operands[0]:
+                return False
+        elif item[attribute] not in operands:
+            return False
+    return True
+
+
+def _condition_attributes(expression, names):
+    """
+    attributes compared by an equality condition
+    """
+    return [
+        names.get(attribute, attribute)
+        for attribute in re.findall(r"(\S+)\s*=", expression)
+    ]
+
+
+def _split_top_level(expression, operator):
+    """
+    split `expression` on the `operator` outside of parentheses, the
+    parentheses around each part are removed
+    """
+    parts, depth, start = [], 0, 0
+    tokens = re.finditer(rf"\(|\)|\s+{operator}\s+", expression)
+    for token in tokens:
+        if token[0] == "(":
+            depth += 1
+        elif token[0] == ")":
+            depth -= 1
+        elif depth == 0:
+            parts.append(expression[start : token.start()])
+            start = token.end()
+    parts.append(expression[start:])
+    return [_strip_parentheses(part.strip()) for part in parts]
+
+
+def _strip_parentheses(expression):
+    while expression.startswith("(") and expression.endswith(")"):
+        depth = 0
+        for i, char in enumerate(expression):
+            depth += {"(": 1, ")": -1}.get(char, 0)
+            if depth == 0 and i < len(expression) - 1:
+                # "(a) AND (b)", the parentheses don't enclose everything
+                return expression
+        expression = expression[1:-1].strip()
+    return expression
+
+
+def _parse_update_expression(expression):
+    """
+    split "SET #a = :a, #b = :b ADD #c :c REMOVE #d" into its actions and
+    their (attribute, value placeholder) pairs, (attribute,) for REMOVE
+    """
+    clauses, action = [], None
+    for token in expression.replace(",", " , ").split():
+        if token.upper() in ("SET", "ADD", "REMOVE"):
+            action = token.upper()
+            clauses.append((action, [[]]))
+        elif token == ",":
+            clauses[-1][1].append([])
+        elif token != "=":
+            clauses[-1][1][-1].append(token)
+    return [(action, [tuple(pair) for pair in pairs]) for action, pairs in clauses]
@@ -0,0 +1,304 @@
+import os
+import json
+import time
+import random
+import threading
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+from chalice.config import Config
+from chalice.local import LocalGateway
+from common import dynamodb, payments
+from common.cache import LRUCache
+from local_aws.sqs import InMemoryQueue
+from local_aws.dynamodb import InMemoryTable
+from local_aws.stepfunctions import (
+    LocalStateMachine,
+    LocalStepFunctions,
+    lambda_invoke,
+    sqs_send_message,
+    dynamodb_update_item,
+)
+
+PAYMENT_STATE_MACHINE_ARN = (
+    "arn:aws:states:local:000000000000:stateMachine:process-new-order-payment"
+)
+ORDERS_QUEUE_URL = "local-orders-queue"
+# like the outbox relay's event source mapping
+RELAY_BATCH_SIZE = 100
+RELAY_MAX_RETRIES = 5
+# like the orders queue's redrive policy
+ORDERS_QUEUE_MAX_RECEIVE_COUNT = 1
+# statuses an order no longer leaves without a new request
+SETTLED_STATUSES = ("IN_TRANSIT", "CANCELLED", "FAILED")
+
+
+class OrderPipeline:
+    """
+    the whole order lifecycle run in-process on the local_aws stand-ins:
+    the chalice `app` writes the orders, the table stream feeds the outbox
+    relay starting the payment state machine (`definition`, from a
+    synthesized stack), which sends the placed orders to the orders
+    queue drained by the delivery lambda.
+
+    Every stand-in call takes `latency` seconds, `throttle_rates` maps
+    "dynamodb", "sqs" and "stepfunctions" to the share of their calls
+    throttled. The relay is invoked like the stream's event source mapping,
+    one batch at a time with the failed records retried, the delivery
+    lambda back to back. Mocked payments take `payment_wait` seconds and
+    the queue's timeouts are multiplied by `time_scale`
+    """
+
+    def __init__(
+        self,
+        app,
+        definition,
+        latency=0,
+        throttle_rates=None,
+        state_machine_type="STANDARD",
+        payment_wait=0,
+        execution_workers=50,
+        time_scale=0.01,
+        seed=None,
+    ):
+        throttle_rates = throttle_rates or {}
+        self.app = app
+        self.table = InMemoryTable(
+            latency=latency, throttle_rate=throttle_rates.get("dynamodb", 0), seed=seed
+        )
+        self.queue = InMemoryQueue(
+            latency=latency,
+            throttle_rate=throttle_rates.get("sqs", 0),
+            seed=seed,
+            max_receive_count=ORDERS_QUEUE_MAX_RECEIVE_COUNT,
+            time_scale=time_scale,
+        )
+        self.definition = definition
+        self.payment_wait = payment_wait
+        self.stepfunctions_options = {
+            "type": state_machine_type,
+            "workers": execution_workers,
+            "latency": latency,
+            "throttle_rate": throttle_rates.get("stepfunctions", 0),
+            "seed": seed,
+        }
+        self.stepfunctions = None
+        # stream records the relay gave up on, and lambda invocations that failed
+        self.outbox_dead_letters = []
+        self.invocation_errors = {"relay": 0, "delivery": 0}
+        self._random = random.Random(seed)
+        self._relay_position = 0
+        self._relay_idle = False
+        self._local = threading.local()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._patches = []
+
+    def __enter__(self):
+        os.environ.setdefault("ORDERS_SQS_URL", ORDERS_QUEUE_URL)
+        from outbox_relay import index as relay
+        from handle_delivery_process import index as delivery
+        from orders_table_update_status.index import handler as update_status
+
+        state_machine = LocalStateMachine(
+            self.definition,
+            resources={
+                "lambda:invoke": lambda_invoke(update_status),
+                "dynamodb:updateItem": dynamodb_update_item(self.table),
+                "sqs:sendMessage": sqs_send_message(self.queue),
+            },
+            wait=lambda seconds: time.sleep(self.payment_wait),
+        )
+        self.stepfunctions = LocalStepFunctions(
+            {PAYMENT_STATE_MACHINE_ARN: state_machine}, **self.stepfunctions_options
+        )
+        self._patches = [
+            patch.object(dynamodb, "__table", self.table),
+            patch.object(dynamodb, "__get_batch_client", lambda: self.table),
+            # numbers leased off another table would be handed out again
+            patch.object(dynamodb, "order_number_allocator", dynamodb.OrderNumberAllocator()),
+            patch.object(payments, "get_client", lambda service, **kwargs: self.stepfunctions),
+            patch.object(relay, "relayed_orders", LRUCache(max_size=100000, ttl=3600)),
+            patch.object(delivery, "get_sqs_client", lambda: self.queue),
+            patch.dict(
+                os.environ,
+                {
+                    "PAYMENT_PROCESSOR_SF_ARN": PAYMENT_STATE_MACHINE_ARN,
+                    "PAYMENT_PROCESSOR_SF_TYPE": self.stepfunctions_options["type"],
+                },
+            ),
+        ]
+        for patcher in self._patches:
+            patcher.start()
+        self._threads = [
+            threading.Thread(target=self.__relay, args=(relay.handler,), daemon=True),
+            threading.Thread(target=self.__deliver, args=(delivery.handler,), daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopping.set()
+        self.queue.close()
+        for thread in self._threads:
+            thread.join()
+        self.stepfunctions.shutdown()
+        for patcher in reversed(self._patches):
+            patcher.stop()
+
+    def request(self, method, path, body=None):
+        """
+        send a request to the app like API Gateway, returns the
+        status code and the json body of the response
+        """
+        gateway = getattr(self._local, "gateway", None)
+        if gateway is None:
+            gateway = self._local.gateway = LocalGateway(self.app, Config.create())
+        response = gateway.handle_request(
+            method=method,
+            path=path,
+            headers={"content-type": "application/json"},
+            body=json.dumps(body).encode() if body is not None else b"",
+        )
+        response_body = response["body"]
+        return response["statusCode"], json.loads(response_body) if response_body else None
+
+    def run(self, orders, api_workers=16, cancel_ratio=0, timeout=60):
+        """
+        place `orders` orders from `api_workers` threads, cancel a
+        `cancel_ratio` share of them right after they're placed, then wait
+        up to `timeout` seconds for every order to be settled, or for the
+        pipeline to be drained when some orders got stuck.
+        Returns the timeline of every order
+        """
+        timelines = []
+        cancels = {i for i in range(orders) if self._random.random() < cancel_ratio}
+
+        def place_order(i):
+            timeline = {"requested": time.time()}
+            status, body = self.request(
+                "POST", "/order", {"Item": "test_item", "Amount": 100}
+            )
+            timeline.update(created=time.time(), api_status=status)
+            if status == 200:
+                timeline["pkey"] = body["OrderId"]
+                if i in cancels:
+                    begin = time.time()
+                    status, _ = self.request("PUT", f"/cancel/{body['OrderId']}")
+                    timeline.update(cancel_latency=time.time() - begin, cancel_status=status)
+            timelines.append(timeline)
+
+        with ThreadPoolExecutor(max_workers=api_workers) as executor:
+            list(executor.map(place_order, range(orders)))
+
+        placed = [timeline["pkey"] for timeline in timelines if "pkey" in timeline]
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.__settled(placed) or self.__drained():
+                break
+            time.sleep(0.02)
+        return self.__timelines(timelines)
+
+    def __settled(self, pkeys):
+        items = self.table.items
+        return all(items[pkey]["Status"] in SETTLED_STATUSES for pkey in pkeys)
+
+    def __drained(self):
+        """
+        whether the stream was relayed, the executions ended and the queue
+        emptied, orders not settled by then are stuck
+        """
+        return (
+            self._relay_idle
+            and self._relay_position == len(self.table.stream)
+            and not any(
+                execution["status"] == "RUNNING"
+                for execution in list(self.stepfunctions.executions.values())
+            )
+            and self.queue.pending() == 0
+        )
+
+    def __timelines(self, timelines):
+        """
+        add the time each order was written, had its execution started,
+        was placed, queued and moved to IN_TRANSIT or CANCELLED
+        """
+        events = {}
+        for record in list(self.table.stream):
+            pkey = record["dynamodb"]["Keys"]["pkey"]["S"]
+            status = record["dynamodb"]["NewImage"].get("Status", {}).get("S")
+            at = record["dynamodb"]["ApproximateCreationDateTime"]
+            order = events.setdefault(pkey, {})
+            if record["eventName"] == "INSERT":
+                order["written"] = at
+            elif status == "PLACED":
+                order["placed"] = at
+            elif status in ("IN_TRANSIT", "CANCELLED"):
+                order[status.lower()] = at
+        for message in list(self.queue.sent):
+            pkey = json.loads(message["Body"])["pkey"]
+            events.setdefault(pkey, {})["queued"] = message["SentTimestamp"]
+        for name, execution in list(self.stepfunctions.executions.items()):
+            pkey = name[len("process_payment_") :]
+            events.setdefault(pkey, {})["execution_started"] = execution["startDate"]
+
+        for timeline in timelines:
+            if "pkey" in timeline:
+                timeline.update(events.get(timeline["pkey"], {}))
+                timeline["status"] = self.table.items[timeline["pkey"]]["Status"]
+        return timelines
+
+    def __relay(self, handler):
+        """
+        invoke the outbox relay with the new outbox records of the stream,
+        retrying a batch from its first failed record like the event
+        source mapping, records failing after the retries are sent to
+        `outbox_dead_letters`
+        """
+        while not self._stopping.is_set():
+            records = self.table.stream[self._relay_position :]
+            self._relay_idle = not records
+            self._relay_position += len(records)
+            records = [
+                record
+                for record in records
+                if record["eventName"] == "INSERT"
+                and record["dynamodb"]["Keys"]["pkey"]["S"].startswith(
+                    dynamodb.OUTBOX_PKEY_PREFIX
+                )
+            ]
+            if not records:
+                time.sleep(0.005)
+                continue
+            for start in range(0, len(records), RELAY_BATCH_SIZE):
+                self.__relay_batch(handler, records[start : start + RELAY_BATCH_SIZE])
+
+    def __relay_batch(self, handler, batch):
+        for attempt in range(RELAY_MAX_RETRIES + 1):
+            try:
+                failures = handler({"Records": batch}, None)["batchItemFailures"]
+            except Exception:
+                self.invocation_errors["relay"] += 1
+                failures = [{"itemIdentifier": batch[0]["dynamodb"]["SequenceNumber"]}]
+            if not failures:
+                return
+            failed = {failure["itemIdentifier"] for failure in failures}
+            first = next(
+                i
+                for i, record in enumerate(batch)
+                if record["dynamodb"]["SequenceNumber"] in failed
+            )
+            batch = batch[first:]
+        self.outbox_dead_letters.extend(batch)
+
+    def __deliver(self, handler):
+        """
+        invoke the delivery lambda back to back, each invocation
+        drains the orders queue
+        """
+        while not self._stopping.is_set():
+            try:
+                handler({}, None)
+            except Exception:
+                self.invocation_errors["delivery"] += 1
+                time.sleep(0.01)
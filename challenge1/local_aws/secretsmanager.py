@@ -0,0 +1,27 @@
+from botocore.exceptions import ClientError
+from local_aws.service import RemoteService
+
+
+class InMemorySecrets(RemoteService):
+    """
+    in-process stand-in for the secretsmanager client, `secrets`
+    maps the secret ids to their string value
+    """
+
+    def __init__(self, secrets=None, latency=0, throttle_rate=0, seed=None):
+        super().__init__(latency, throttle_rate=throttle_rate, seed=seed)
+        self.secrets = dict(secrets or {})
+
+    def get_secret_value(self, SecretId, **kwargs):
+        self._round_trip("get_secret_value", SecretId)
+        if SecretId not in self.secrets:
+            raise ClientError(
+                {
+                    "Error": {
+                        "Code": "ResourceNotFoundException",
+                        "Message": "Secrets Manager can't find the specified secret.",
+                    }
+                },
+                "GetSecretValue",
+            )
+        return {"Name": SecretId, "SecretString": self.secrets[SecretId]}
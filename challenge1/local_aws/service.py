@@ -0,0 +1,42 @@
+import time
+import random
+import threading
+from collections import Counter
+from botocore.exceptions import ClientError
+
+
+class RemoteService:
+    """
+    network behaviour shared by the stand-ins: every call is counted in
+    `calls` and takes `latency` seconds, or the latency set for its key
+    in `key_latency`. A `throttle_rate` share of the calls fail with the
+    service's throttling error, as they do once botocore's retries ran
+    out, and are counted in `throttled`
+    """
+
+    # error code of the calls throttled by the service
+    throttling_error = "ThrottlingException"
+
+    def __init__(self, latency=0, key_latency=None, throttle_rate=0, seed=None):
+        self.latency = latency
+        self.key_latency = key_latency or {}
+        self.throttle_rate = throttle_rate
+        self.calls = Counter()
+        self.throttled = Counter()
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def _round_trip(self, operation, key=None):
+        self.calls[operation] += 1
+        latency = self.key_latency.get(key, self.latency)
+        if latency:
+            time.sleep(latency)
+        if self.throttle_rate:
+            with self._random_lock:
+                throttled = self._random.random() < self.throttle_rate
+            if throttled:
+                self.throttled[operation] += 1
+                raise ClientError(
+                    {"Error": {"Code": self.throttling_error, "Message": "Rate exceeded"}},
+                    "".join(part.title() for part in operation.split("_")),
+                )
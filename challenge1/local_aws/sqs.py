@@ -0,0 +1,137 @@
+import time
+import uuid
+import threading
+from collections import deque
+from local_aws.service import RemoteService
+
+
+class InMemoryQueue(RemoteService):
+    """
+    in-process stand-in for the sqs client of a standard queue, the
+    QueueUrl of the calls is ignored.
+
+    Received messages are hidden for their visibility timeout, then
+    received again, or moved to `dead_letters` once received more than
+    `max_receive_count` times like with a redrive policy. Timeouts and
+    long polls given in seconds are multiplied by `time_scale`, so the
+    minutes long timeouts of the stack can be run by a benchmark.
+    `close` ends the long polls in progress and the following ones
+    """
+
+    def __init__(
+        self, latency=0, throttle_rate=0, seed=None, max_receive_count=None, time_scale=1
+    ):
+        super().__init__(latency, throttle_rate=throttle_rate, seed=seed)
+        self.max_receive_count = max_receive_count
+        self.time_scale = time_scale
+        self.dead_letters = []
+        # every message sent, with the time it was sent at
+        self.sent = []
+        self.closed = False
+        self._visible = deque()
+        self._in_flight = {}
+        self._condition = threading.Condition()
+
+    def send_message(self, MessageBody, QueueUrl=None, **kwargs):
+        self._round_trip("send_message")
+        message = {
+            "MessageId": str(uuid.uuid4()),
+            "Body": MessageBody,
+            "ReceiveCount": 0,
+            "SentTimestamp": time.time(),
+        }
+        with self._condition:
+            self.sent.append(message)
+            self._visible.append(message)
+            self._condition.notify()
+        return {"MessageId": message["MessageId"]}
+
+    def receive_message(
+        self,
+        QueueUrl=None,
+        MaxNumberOfMessages=1,
+        VisibilityTimeout=30,
+        WaitTimeSeconds=0,
+        **kwargs,
+    ):
+        self._round_trip("receive_message")
+        deadline = time.monotonic() + WaitTimeSeconds * self.time_scale
+        with self._condition:
+            while True:
+                self.__expire_visibility()
+                if self._visible or self.closed:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                # messages whose visibility expires don't notify
+                self._condition.wait(min(remaining, 0.01))
+            messages = []
+            hidden_until = time.monotonic() + VisibilityTimeout * self.time_scale
+            while self._visible and len(messages) < MaxNumberOfMessages:
+                message = self._visible.popleft()
+                message["ReceiveCount"] += 1
+                receipt_handle = str(uuid.uuid4())
+                self._in_flight[receipt_handle] = (message, hidden_until)
+                messages.append(
+                    {
+                        "MessageId": message["MessageId"],
+                        "ReceiptHandle": receipt_handle,
+                        "Body": message["Body"],
+                        "Attributes": {
+                            "ApproximateReceiveCount": str(message["ReceiveCount"])
+                        },
+                    }
+                )
+        return {"Messages": messages} if messages else {}
+
+    def delete_message(self, ReceiptHandle, QueueUrl=None, **kwargs):
+        self._round_trip("delete_message")
+        with self._condition:
+            self._in_flight.pop(ReceiptHandle, None)
+        return {}
+
+    def delete_message_batch(self, Entries, QueueUrl=None, **kwargs):
+        self._round_trip("delete_message_batch")
+        successful, failed = [], []
+        with self._condition:
+            for entry in Entries:
+                if self._in_flight.pop(entry["ReceiptHandle"], None) is None:
+                    failed.append(
+                        {
+                            "Id": entry["Id"],
+                            "Code": "ReceiptHandleIsInvalid",
+                            "Message": "The receipt handle has expired",
+                            "SenderFault": True,
+                        }
+                    )
+                else:
+                    successful.append({"Id": entry["Id"]})
+        return {"Successful": successful, "Failed": failed}
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def pending(self):
+        """
+        number of messages visible or in flight
+        """
+        with self._condition:
+            return len(self._visible) + len(self._in_flight)
+
+    def __expire_visibility(self):
+        # the condition's lock must be held
+        now = time.monotonic()
+        for receipt_handle, (message, hidden_until) in list(self._in_flight.items()):
+            if hidden_until > now:
+                continue
+            del self._in_flight[receipt_handle]
+            if (
+                self.max_receive_count is not None
+                and message["ReceiveCount"] >= self.max_receive_count
+            ):
+                self.dead_letters.append(message)
+            else:
+                self._visible.append(message)
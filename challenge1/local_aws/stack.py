@@ -0,0 +1,65 @@
+import os
+import sys
+import json
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAYER_PATH = os.path.join(ROOT, "src", "layers")
+
+# chalice's construct can't be synthesized by more than one cdk app
+# per process, every template is synthesized by its own interpreter
+SYNTH_SCRIPT = """
+import sys, json, aws_cdk as cdk
+from stacks.challenge1_stack import Challenge1Stack
+
+context, output = json.loads(sys.argv[1]), sys.argv[2]
+app = cdk.App(context={"aws:cdk:bundling-stacks": [], **context})
+Challenge1Stack(app, "Challenge1Stack")
+with open(output, "w") as f:
+    json.dump(app.synth().get_stack_by_name("Challenge1Stack").template, f)
+"""
+
+
+def synth(**context):
+    """
+    template of the stack synthesized with the given context,
+    assets are not bundled so docker isn't needed
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "template.json")
+        subprocess.run(
+            [sys.executable, "-c", SYNTH_SCRIPT, json.dumps(context), output],
+            cwd=ROOT,
+            # chalice imports the app, which needs the common layer
+            env={
+                "AWS_DEFAULT_REGION": "us-east-1",
+                **os.environ,
+                "PYTHONPATH": os.pathsep.join(
+                    filter(None, [os.environ.get("PYTHONPATH"), LAYER_PATH])
+                ),
+            },
+            capture_output=True,
+            check=True,
+        )
+        with open(output) as f:
+            return json.load(f)
+
+
+def state_machine_definition(template):
+    """
+    definition of the payment state machine of a synthesized template,
+    references to other resources are replaced by their logical id
+    """
+    (state_machine,) = [
+        resource
+        for resource in template["Resources"].values()
+        if resource["Type"] == "AWS::StepFunctions::StateMachine"
+    ]
+    definition = state_machine["Properties"]["DefinitionString"]
+    parts = definition["Fn::Join"][1] if isinstance(definition, dict) else [definition]
+    # {"Ref": id} or {"Fn::GetAtt": [id, attribute]}
+    logical_id = lambda part: "".join(part.get("Ref", part.get("Fn::GetAtt", [""])[:1]))
+    return json.loads(
+        "".join(part if isinstance(part, str) else logical_id(part) for part in parts)
+    )
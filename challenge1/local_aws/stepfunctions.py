@@ -0,0 +1,340 @@
+import json
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from local_aws.service import RemoteService
+from boto3.dynamodb.types import TypeSerializer, TypeDeserializer
+
+
+class TaskFailed(Exception):
+    """
+    raised by a task resource, `error` is matched against the Catch rules
+    """
+
+    def __init__(self, error, cause=""):
+        super().__init__(f"{error}: {cause}")
+        self.error = error
+        self.cause = cause
+
+
+class LocalStateMachine:
+    """
+    in-process stand-in for Step Functions Local, runs an ASL definition.
+
+    Only the states and fields generated by the stack are supported. Task
+    resources are looked up in `resources` by the end of their arn, i.e.
+    "lambda:invoke", and called with the task's resolved Parameters.
+    Wait states call `wait` with their seconds.
+    """
+
+    def __init__(self, definition, resources, wait=time.sleep):
+        self.definition = definition
+        self.resources = resources
+        self.wait = wait
+
+    def start_sync_execution(self, input):
+        """
+        run an execution to its end, like an express workflow
+        started with StartSyncExecution
+        """
+        history = []
+        try:
+            return self.__run(input, history)
+        except TaskFailed as e:
+            # runtime errors outside of tasks, i.e. a missing path
+            return _execution("FAILED", history, error=e.error, cause=e.cause)
+
+    def __run(self, data, history):
+        states = self.definition["States"]
+        name = self.definition["StartAt"]
+        while True:
+            history.append(name)
+            state = states[name]
+            kind = state["Type"]
+            if kind == "Succeed":
+                return _execution("SUCCEEDED", history, output=data)
+            if kind == "Fail":
+                return _execution(
+                    "FAILED", history, error=state.get("Error"), cause=state.get("Cause")
+                )
+            if kind == "Choice":
+                name = next(
+                    (c["Next"] for c in state["Choices"] if _evaluate(c, data)),
+                    state.get("Default"),
+                )
+                if name is None:
+                    return _execution("FAILED", history, error="States.NoChoiceMatched")
+                continue
+            if kind == "Wait":
+                self.wait(state["Seconds"])
+                result = data
+            elif kind == "Pass":
+                result = state.get("Result", _parameters(state, data))
+            elif kind == "Task":
+                try:
+                    result = self.__run_task(state, data)
+                except TaskFailed as e:
+                    catch = next(
+                        (
+                            c
+                            for c in state.get("Catch", [])
+                            if {e.error, "States.ALL"} & set(c["ErrorEquals"])
+                        ),
+                        None,
+                    )
+                    if catch is None:
+                        return _execution("FAILED", history, error=e.error, cause=e.cause)
+                    data = _set_path(
+                        data, catch.get("ResultPath", "$"), {"Error": e.error, "Cause": e.cause}
+                    )
+                    name = catch["Next"]
+                    continue
+            else:
+                raise NotImplementedError(f"Unsupported state type: {kind}")
+            if kind != "Wait":
+                data = _set_path(data, state.get("ResultPath", "$"), result)
+            data = _get_path(data, state.get("OutputPath", "$"))
+            if state.get("End"):
+                return _execution("SUCCEEDED", history, output=data)
+            name = state["Next"]
+
+    def __run_task(self, state, data):
+        resource = state["Resource"].split(":states:::")[-1]
+        if resource not in self.resources:
+            raise NotImplementedError(f"No stand-in for task resource: {resource}")
+        result = self.resources[resource](_parameters(state, data))
+        if "ResultSelector" in state:
+            result = _resolve(state["ResultSelector"], result)
+        return result
+
+
+def _execution(status, history, output=None, error=None, cause=None):
+    return {
+        "status": status,
+        "output": output,
+        "error": error,
+        "cause": cause,
+        "history": history,
+    }
+
+
+def _parameters(state, data):
+    data = _get_path(data, state.get("InputPath", "$"))
+    return _resolve(state["Parameters"], data) if "Parameters" in state else data
+
+
+def _resolve(template, data):
+    """
+    resolve the "key.$" paths and intrinsic functions of a Parameters
+    or ResultSelector template against `data`
+    """
+    if isinstance(template, dict):
+        resolved = {}
+        for key, value in template.items():
+            if key.endswith(".$"):
+                resolved[key[:-2]] = _resolve_value(value, data)
+            else:
+                resolved[key] = _resolve(value, data)
+        return resolved
+    if isinstance(template, list):
+        return [_resolve(value, data) for value in template]
+    return template
+
+
+def _resolve_value(expression, data):
+    if expression.startswith("States.StringToJson(") and expression.endswith(")"):
+        return json.loads(_get_path(data, expression[len("States.StringToJson(") : -1]))
+    if expression.startswith("States."):
+        raise NotImplementedError(f"Unsupported intrinsic function: {expression}")
+    return _get_path(data, expression)
+
+
+def _get_path(data, path):
+    """
+    value at a "$.a.b" path, raises TaskFailed like a runtime error when missing
+    """
+    if path is None:
+        return {}
+    for key in path.split(".")[1:]:
+        if not isinstance(data, dict) or key not in data:
+            raise TaskFailed("States.Runtime", f"Invalid path {path}")
+        data = data[key]
+    return data
+
+
+def _set_path(data, path, value):
+    if path is None:
+        return data
+    keys = path.split(".")[1:]
+    if not keys:
+        return value
+    data = dict(data)
+    target = data
+    for key in keys[:-1]:
+        target[key] = dict(target.get(key, {}))
+        target = target[key]
+    target[keys[-1]] = value
+    return data
+
+
+def _evaluate(rule, data):
+    if "And" in rule:
+        return all(_evaluate(r, data) for r in rule["And"])
+    if "Or" in rule:
+        return any(_evaluate(r, data) for r in rule["Or"])
+    if "Not" in rule:
+        return not _evaluate(rule["Not"], data)
+    try:
+        value = _get_path(data, rule["Variable"])
+    except TaskFailed:
+        if "IsPresent" in rule:
+            return not rule["IsPresent"]
+        raise
+    if "IsPresent" in rule:
+        return rule["IsPresent"]
+    for operator in ("StringEquals", "NumericEquals", "BooleanEquals"):
+        if operator in rule:
+            return value == rule[operator]
+    raise NotImplementedError(f"Unsupported choice rule: {rule}")
+
+
+def dynamodb_update_item(table):
+    """
+    "dynamodb:updateItem" task resource on top of an InMemoryTable,
+    taking and returning attribute values like the service integration
+    """
+    serializer, deserializer = TypeSerializer(), TypeDeserializer()
+
+    def update_item(parameters):
+        decode = lambda values: {k: deserializer.deserialize(v) for k, v in values.items()}
+        parameters = dict(parameters)
+        parameters.pop("TableName")
+        parameters["Key"] = decode(parameters["Key"])
+        if "ExpressionAttributeValues" in parameters:
+            parameters["ExpressionAttributeValues"] = decode(
+                parameters["ExpressionAttributeValues"]
+            )
+        try:
+            response = table.update_item(**parameters)
+        except ClientError as e:
+            raise TaskFailed(f"DynamoDB.{e.response['Error']['Code']}", str(e))
+        if "Attributes" in response:
+            response["Attributes"] = {
+                k: serializer.serialize(v) for k, v in response["Attributes"].items()
+            }
+        return response
+
+    return update_item
+
+
+def lambda_invoke(handler):
+    """
+    "lambda:invoke" task resource calling `handler` whatever the function,
+    the payment state machine invokes a single one. Errors raised by the
+    handler fail the task with the exception's name like the service integration
+    """
+
+    def invoke(parameters):
+        try:
+            payload = handler(parameters["Payload"], None)
+        except Exception as e:
+            raise TaskFailed(type(e).__name__, str(e))
+        return {"StatusCode": 200, "Payload": payload}
+
+    return invoke
+
+
+def sqs_send_message(queue):
+    """
+    "sqs:sendMessage" task resource on top of an InMemoryQueue, the json
+    MessageBody is sent as a string like the service integration does
+    """
+
+    def send_message(parameters):
+        body = parameters["MessageBody"]
+        try:
+            return queue.send_message(
+                MessageBody=body if isinstance(body, str) else json.dumps(body),
+                QueueUrl=parameters.get("QueueUrl"),
+            )
+        except ClientError as e:
+            raise TaskFailed(f"SQS.{e.response['Error']['Code']}", str(e))
+
+    return send_message
+
+
+class LocalStepFunctions(RemoteService):
+    """
+    in-process stand-in for the stepfunctions client starting the
+    executions of LocalStateMachines, by state machine arn.
+
+    Executions run on up to `workers` threads and are kept in
+    `executions` by name with their start/stop times. A STANDARD
+    state machine deduplicates the executions by name: starting the
+    name of a running execution with the same input returns it, any
+    other start of an existing name raises ExecutionAlreadyExists.
+    An EXPRESS one starts every execution
+    """
+
+    def __init__(
+        self,
+        state_machines,
+        type="STANDARD",
+        workers=50,
+        latency=0,
+        throttle_rate=0,
+        seed=None,
+    ):
+        super().__init__(latency, throttle_rate=throttle_rate, seed=seed)
+        self.state_machines = state_machines
+        self.type = type
+        self.executions = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._futures = []
+        self._lock = threading.Lock()
+
+    def start_execution(self, stateMachineArn, input="{}", name=None, **kwargs):
+        self._round_trip("start_execution")
+        state_machine = self.state_machines[stateMachineArn]
+        name = name or str(uuid.uuid4())
+        with self._lock:
+            existing = self.executions.get(name)
+            if existing is not None and self.type == "STANDARD":
+                if existing["input"] != input or existing["status"] != "RUNNING":
+                    raise ClientError(
+                        {
+                            "Error": {
+                                "Code": "ExecutionAlreadyExists",
+                                "Message": f"Execution already exists: {name}",
+                            }
+                        },
+                        "StartExecution",
+                    )
+                return {"executionArn": existing["executionArn"]}
+            execution = {
+                "executionArn": f"{stateMachineArn}:{name}",
+                "input": input,
+                "status": "RUNNING",
+                "startDate": time.time(),
+            }
+            # express executions of the same name are all kept by the service,
+            # only the last one is here
+            self.executions[name] = execution
+            self._futures.append(
+                self._executor.submit(self.__run, state_machine, execution)
+            )
+        return {"executionArn": execution["executionArn"]}
+
+    def __run(self, state_machine, execution):
+        result = state_machine.start_sync_execution(json.loads(execution["input"]))
+        execution.update(result, stopDate=time.time())
+
+    def shutdown(self):
+        """
+        wait for the executions started to end
+        """
+        self._executor.shutdown(wait=True)
+        for future in self._futures:
+            future.result()
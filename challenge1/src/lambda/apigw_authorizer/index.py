@@ -1,27 +1,73 @@
 import os
+import json
+import logging
+from common.errors import InvalidToken
+from common.tokens import SigningKeys, verify_token
+
+# secret holding the token signing keys as a json object {key id: key},
+# keys are rotated by adding a new key id and removing the old one once
+# the tokens it signed have expired
+AUTH_SIGNING_KEYS_SECRET_ARN = os.environ.get("AUTH_SIGNING_KEYS_SECRET_ARN")
+# seconds the keys are cached by each warm container
+AUTH_SIGNING_KEYS_TTL_SECONDS = float(os.environ.get("AUTH_SIGNING_KEYS_TTL_SECONDS", "300"))
+# claims the tokens must carry, not checked when unset
+AUTH_TOKEN_AUDIENCE = os.environ.get("AUTH_TOKEN_AUDIENCE")
+AUTH_TOKEN_ISSUER = os.environ.get("AUTH_TOKEN_ISSUER")
+
+# stdlib logging keeps the imports light, the authorizer runs before the requests it authorizes
+logger = logging.getLogger(__name__)
+
+
+def load_signing_keys():
+    """
+    read the signing keys from secrets manager, once per container
+    until they expire or a token is signed with an unknown key
+    """
+    from common.clients import get_client
+
+    secret = get_client("secretsmanager").get_secret_value(
+        SecretId=AUTH_SIGNING_KEYS_SECRET_ARN
+    )
+    return json.loads(secret["SecretString"])
+
+
+signing_keys = SigningKeys(load_signing_keys, ttl=AUTH_SIGNING_KEYS_TTL_SECONDS)
 
 
 def handler(event, context):
     """
     function to authorize user to trigger api
-    endpoint
+    endpoint.
+
+    API Gateway caches the returned policy for the token and reuses it
+    for every route, so it allows the whole stage instead of `methodArn`
     """
     methodArn = event["methodArn"]
-    auth_param_value = event['authorizationToken']
-    if auth_param_value == get_api_id(methodArn):
-        return {
-            "policyDocument": {
-                "Version": "2012-10-17",
-                "Statement": [
-                    {
-                        "Action": "execute-api:Invoke",
-                        "Effect": "Allow",
-                        "Resource": methodArn,
-                    }
-                ],
-            },
-            "context": {},
-        }
+    token = event.get("authorizationToken") or ""
+    if token.startswith("Bearer "):
+        token = token[len("Bearer ") :]
+    try:
+        claims = verify_token(
+            token, signing_keys, audience=AUTH_TOKEN_AUDIENCE, issuer=AUTH_TOKEN_ISSUER
+        )
+    except InvalidToken as e:
+        logger.warning(f"Token rejected: {e}")
+        # API Gateway answers 401 for this exact message
+        raise Exception("Unauthorized")
+    return {
+        "principalId": str(claims.get("sub", "anonymous")),
+        "policyDocument": {
+            "Version": "2012-10-17",
+            "Statement": [
+                {
+                    "Action": "execute-api:Invoke",
+                    "Effect": "Allow",
+                    "Resource": get_stage_arn(methodArn),
+                }
+            ],
+        },
+        "context": {},
+    }
 
 
 def get_api_id(method_arn):
@@ -31,3 +77,13 @@ def get_api_id(method_arn):
     api_details = method_arn.split(":")[-1]
     api_id = api_details.split("/")[0]
     return api_id
+
+
+def get_stage_arn(method_arn):
+    """
+    arn matching every method and resource of the stage of `method_arn`,
+    i.e. arn:aws:execute-api:{region}:{account}:{api-id}/{stage}/*/*
+    """
+    prefix, api_details = method_arn.rsplit(":", 1)
+    api_id, stage = api_details.split("/")[:2]
+    return f"{prefix}:{api_id}/{stage}/*/*"
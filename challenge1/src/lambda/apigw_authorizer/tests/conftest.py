@@ -0,0 +1,22 @@
+import time
+from pytest import fixture
+from unittest.mock import patch
+from common.tokens import SigningKeys, sign_token
+
+SIGNING_KEYS = {"key-1": "test-signing-key-1"}
+
+
+@fixture(autouse=True)
+def signing_keys():
+    # keys of the secret, a test can change them to rotate the keys
+    secret = dict(SIGNING_KEYS)
+    keys = SigningKeys(lambda: dict(secret), ttl=300, min_reload_interval=0)
+    keys.secret = secret
+    with patch("apigw_authorizer.index.signing_keys", keys):
+        yield keys
+
+
+class utils:
+    def token(kid="key-1", key=None, expires_in=300, **claims):
+        claims = {"sub": "dummy@dummy.com", "exp": int(time.time()) + expires_in, **claims}
+        return sign_token(claims, key or SIGNING_KEYS[kid], kid)
@@ -0,0 +1,96 @@
+import re
+import pytest
+from .conftest import utils
+from apigw_authorizer.index import handler
+
+API_ARN = "arn:aws:execute-api:us-east-1:123456789012:abcdef1234"
+ROUTES = [
+    ("GET", "/"),
+    ("POST", "/order"),
+    ("POST", "/orders/batch"),
+    ("GET", "/order/ORD0000001"),
+    ("GET", "/orders"),
+    ("PUT", "/cancel/ORD0000001"),
+]
+
+
+def authorizer_event(method, path, token=None, stage="api"):
+    return {
+        "type": "TOKEN",
+        "authorizationToken": utils.token() if token is None else token,
+        "methodArn": f"{API_ARN}/{stage}/{method}{path}",
+    }
+
+
+def allows(policy, method_arn):
+    """
+    whether `policy` lets `method_arn` through, with IAM's wildcard matching
+    """
+    return any(
+        statement["Effect"] == "Allow"
+        and re.fullmatch(re.escape(statement["Resource"]).replace(r"\*", ".*"), method_arn)
+        for statement in policy["policyDocument"]["Statement"]
+    )
+
+
+def test_cached_policy_authorizes_every_route():
+    """
+    API Gateway reuses the policy returned for the first request
+    of a token for the following requests to any route
+    """
+    policy = handler(authorizer_event("GET", "/order/ORD0000001"), None)
+
+    for method, path in ROUTES:
+        assert allows(policy, authorizer_event(method, path)["methodArn"])
+
+
+def test_policy_is_scoped_to_the_stage():
+    policy = handler(authorizer_event("GET", "/order/ORD0000001"), None)
+
+    assert not allows(policy, authorizer_event("GET", "/orders", stage="dev")["methodArn"])
+    assert not allows(policy, f"{API_ARN[:-1]}9/api/GET/orders")
+
+
+def test_principal_is_the_token_subject():
+    policy = handler(authorizer_event("GET", "/orders"), None)
+    assert policy["principalId"] == "dummy@dummy.com"
+
+
+def test_bearer_prefix_is_accepted():
+    event = authorizer_event("GET", "/orders", token=f"Bearer {utils.token()}")
+    assert handler(event, None)["principalId"] == "dummy@dummy.com"
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        "",
+        "abcdef1234",
+        utils.token(expires_in=-300),
+        utils.token(kid="key-1", key="another-key"),
+        utils.token(kid="key-2", key="test-signing-key-2"),
+    ],
+    ids=["empty", "api-id", "expired", "bad-signature", "unknown-key"],
+)
+def test_invalid_token_is_unauthorized(token, caplog):
+    # API Gateway answers 401 instead of 500 for this message
+    with pytest.raises(Exception, match="^Unauthorized$"):
+        handler(authorizer_event("POST", "/order", token=token), None)
+    assert "Token rejected" in caplog.text
+
+
+def test_missing_token_is_unauthorized():
+    event = authorizer_event("POST", "/order")
+    del event["authorizationToken"]
+
+    with pytest.raises(Exception, match="^Unauthorized$"):
+        handler(event, None)
+
+
+def test_rotated_key_is_picked_up(signing_keys):
+    handler(authorizer_event("GET", "/orders"), None)
+    signing_keys.secret["key-2"] = "test-signing-key-2"
+
+    token = utils.token(kid="key-2", key="test-signing-key-2")
+    assert handler(authorizer_event("GET", "/orders", token=token), None)
+    assert signing_keys.loads == 2
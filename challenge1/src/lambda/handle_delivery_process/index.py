@@ -1,49 +1,177 @@
 import os
 import json
-import boto3
+import time
+from common.clients import get_client
 from common.utils import ORDER_LIFE_CYCLE
-from common.dynamodb import change_order_status, get_item_by_pkey
+from common.errors import InvalidStatusTransition
+from common.dynamodb import change_order_status
 from aws_lambda_powertools.logging import Logger
 
 logger = Logger()
 sqs_url = os.environ["ORDERS_SQS_URL"]
 
-sqs_client = boto3.client("sqs")
+# messages received per call, the max allowed by sqs
+RECEIVE_BATCH_SIZE = 10
+# long poll, seconds a receive waits for messages to arrive
+RECEIVE_WAIT_SECONDS = int(os.environ.get("RECEIVE_WAIT_SECONDS", "5"))
+# stop receiving when the invocation has less time left than this,
+# enough for a long poll plus processing a batch
+MIN_REMAINING_TIME_MS = int(os.environ.get("MIN_REMAINING_TIME_MS", "10000"))
+# orders processed concurrently within a batch of messages
+PROCESSING_WORKERS = int(os.environ.get("PROCESSING_WORKERS", "10"))
+
+
+def get_sqs_client():
+    """
+    sqs client whose read timeout outlasts the long poll
+    """
+    return get_client("sqs", read_timeout=RECEIVE_WAIT_SECONDS + 10)
 
 
 def handler(event, context):
-    """ """
-    sqs_message = sqs_client.receive_message(
-        QueueUrl=sqs_url,
-        MaxNumberOfMessages=1,
-        VisibilityTimeout=30,
-        WaitTimeSeconds=1
+    """
+    move the orders of the sqs event to IN_TRANSIT when invoked by the
+    queue's event source mapping, otherwise poll the queue for them
+    """
+    if "Records" in event:
+        return handle_records(event["Records"])
+    return drain_queue(context)
+
+
+def handle_records(records):
+    """
+    process the messages delivered by the event source mapping, only the
+    failed ones are reported back so the rest of the batch isn't redelivered
+    """
+    results = process_messages([(record["body"], record["messageId"]) for record in records])
+    failures = [
+        {"itemIdentifier": record["messageId"]}
+        for record, done in zip(records, results)
+        if not done
+    ]
+    logger.info(
+        f"{len(records) - len(failures)} messages processed, {len(failures)} failed",
+        extra={
+            "messages": len(records),
+            "processed": len(records) - len(failures),
+            "failed": len(failures),
+        },
     )
+    return {"batchItemFailures": failures}
 
-    if not sqs_message.get("Messages") or len(sqs_message["Messages"]) == 0:
+
+def drain_queue(context):
+    """
+    drain the orders queue, moving the orders to IN_TRANSIT, until
+    it's empty or the invocation is about to time out
+    """
+    sqs_client = get_sqs_client()
+    started = time.monotonic()
+    receives = processed = failed = 0
+
+    while context is None or context.get_remaining_time_in_millis() > MIN_REMAINING_TIME_MS:
+        sqs_message = sqs_client.receive_message(
+            QueueUrl=sqs_url,
+            MaxNumberOfMessages=RECEIVE_BATCH_SIZE,
+            VisibilityTimeout=30,
+            WaitTimeSeconds=RECEIVE_WAIT_SECONDS,
+        )
+        receives += 1
+        messages = sqs_message.get("Messages", [])
+        if not messages:
+            break
+
+        # messages that fail stay in the queue and go to the DLQ once visible again
+        results = process_messages(
+            [(message["Body"], message.get("MessageId")) for message in messages]
+        )
+        done = [message for message, ok in zip(messages, results) if ok]
+        processed += len(done)
+        failed += len(messages) - len(done)
+        delete_messages(sqs_client, done)
+
+    if processed + failed == 0:
         logger.info("No new orders placed")
+    logger.info(
+        f"{processed} messages processed, {failed} failed in {receives} receives",
+        extra={
+            "messages": processed + failed,
+            "processed": processed,
+            "failed": failed,
+            "receives": receives,
+            "duration_ms": round((time.monotonic() - started) * 1000),
+        },
+    )
+    return {"Processed": processed, "Failed": failed}
+
+
+def process_messages(messages):
+    """
+    process a batch of (body, message id) concurrently, messages of the same
+    order are processed one after the other in the order they were received.
+    Returns whether each message was processed, in the same order
+    """
+    results = [False] * len(messages)
+    orders = {}
+    for i, (body, message_id) in enumerate(messages):
+        try:
+            # Get the message body
+            message_body = json.loads(body)
+            logger.info(f"Message received from sqs is {message_body}")
+            orders.setdefault(message_body["pkey"], []).append((i, message_id))
+        except Exception:
+            logger.exception(f"Couldn't read message {message_id}")
+
+    def process_order_messages(order_number, order_messages):
+        for i, message_id in order_messages:
+            results[i] = process_message(order_number, message_id)
+
+    if len(orders) > 1 and PROCESSING_WORKERS > 1:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=min(PROCESSING_WORKERS, len(orders))) as executor:
+            list(executor.map(process_order_messages, orders.keys(), orders.values()))
     else:
-        # Get message from the sqs event
-        message = sqs_message["Messages"][0]
-        # extract receipt handle as its required to delete the message
-        receipt_handle = message["ReceiptHandle"]
+        for order_number, order_messages in orders.items():
+            process_order_messages(order_number, order_messages)
+    return results
 
-        # Get the message body
-        message_body = json.loads(message["Body"])
-        logger.info(f"Message received from sqs is {message_body}")
 
+def process_message(order_number, message_id):
+    """
+    move the order of an sqs message to IN_TRANSIT,
+    returns False when the message has to be retried
+    """
+    try:
         # Change Order Status to IN_TRANSIT
-        order_number = message_body["pkey"]
-
-        # Check if the Order was cancelled
-        current_order_details = get_item_by_pkey(order_number)
-        if current_order_details["Status"] == ORDER_LIFE_CYCLE.CANCELLED:
-            logger.info(f"Order {order_number} was cancelled, stop further execution.")
-        else:
+        try:
             change_order_status(order_number, ORDER_LIFE_CYCLE.IN_TRANSIT)
             logger.info(f"Order {order_number} is ready for delivery")
+        except InvalidStatusTransition as e:
+            # Order was cancelled
+            logger.info(
+                f"Order {order_number} is {e.item['Status']}, stop further execution."
+            )
+        return True
+    except Exception:
+        logger.exception(f"Couldn't process message {message_id}")
+        return False
+
 
-        # Delete Message from the Queue
-        logger.info("Deleting event from the queue")
-        sqs_client.delete_message(QueueUrl=sqs_url, ReceiptHandle=receipt_handle)
-        logger.info("Message deleted successfully from SQS")
+def delete_messages(sqs_client, messages):
+    """
+    delete processed messages from the queue with a single call
+    """
+    if not messages:
+        return
+    logger.info(f"Deleting {len(messages)} events from the queue")
+    response = sqs_client.delete_message_batch(
+        QueueUrl=sqs_url,
+        Entries=[
+            {"Id": str(i), "ReceiptHandle": message["ReceiptHandle"]}
+            for i, message in enumerate(messages)
+        ],
+    )
+    # orders already moved are skipped when received again
+    for failure in response.get("Failed", []):
+        logger.warning(f"Couldn't delete message {failure['Id']}: {failure.get('Message')}")
@@ -8,15 +8,16 @@ for k, v in stub_env_var.items():
     os.environ[k] = v
 
 from pytest import fixture
+from unittest.mock import patch
 from botocore.stub import Stubber
-from common.dynamodb import db_resource
+from common.clients import get_resource
+from handle_delivery_process.index import get_sqs_client
 from boto3.dynamodb.types import TypeSerializer
-from handle_delivery_process.index import sqs_client
 
 
 @fixture(autouse=True)
 def sqs_client_stub():
-    with Stubber(sqs_client) as stubbed:
+    with Stubber(get_sqs_client()) as stubbed:
         yield stubbed
     # assert that there are no pending
     # or extra response that this client
@@ -24,9 +25,16 @@ def sqs_client_stub():
     stubbed.assert_no_pending_responses
 
 
+@fixture(autouse=True)
+def sequential_processing():
+    # stubbed responses are matched in call order
+    with patch("handle_delivery_process.index.PROCESSING_WORKERS", 1):
+        yield
+
+
 @fixture(autouse=True)
 def ddb_client_stub():
-    with Stubber(db_resource.meta.client) as stubbed:
+    with Stubber(get_resource("dynamodb").meta.client) as stubbed:
         yield stubbed
     stubbed.assert_no_pending_responses
 
@@ -0,0 +1,86 @@
+import json
+import time
+import threading
+from pytest import fixture
+from collections import Counter
+from unittest.mock import patch
+from common import dynamodb
+from local_aws.dynamodb import InMemoryTable
+from handle_delivery_process import index
+from handle_delivery_process.index import handler
+from .payload import SQS_ORDER_BODY
+
+LATENCY = 0.05
+
+
+@fixture(autouse=True)
+def concurrent_processing():
+    with patch.object(index, "PROCESSING_WORKERS", 10):
+        yield
+
+
+@fixture
+def orders_table():
+    table = InMemoryTable(latency=LATENCY)
+    with patch.object(dynamodb, "__table", table):
+        yield table
+
+
+def sqs_event(order_numbers):
+    return {
+        "Records": [
+            {
+                "messageId": str(i),
+                "body": json.dumps({**SQS_ORDER_BODY, "pkey": order_number}),
+            }
+            for i, order_number in enumerate(order_numbers)
+        ]
+    }
+
+
+def test_orders_are_processed_concurrently(orders_table):
+    order_numbers = [f"ORD{i:07d}" for i in range(1, 11)]
+    for order_number in order_numbers:
+        orders_table.items[order_number] = {**SQS_ORDER_BODY, "pkey": order_number}
+
+    started = time.monotonic()
+    response = handler(sqs_event(order_numbers), None)
+    elapsed = time.monotonic() - started
+
+    assert response == {"batchItemFailures": []}
+    assert all(item["Status"] == "IN_TRANSIT" for item in orders_table.items.values())
+    # one round trip each, done side by side
+    assert elapsed < LATENCY * len(order_numbers) / 2
+
+
+def test_messages_of_the_same_order_are_processed_in_sequence():
+    active, max_active, calls = Counter(), Counter(), []
+    lock = threading.Lock()
+
+    def change_order_status(order_number, status):
+        with lock:
+            active[order_number] += 1
+            max_active[order_number] = max(max_active[order_number], active[order_number])
+            calls.append(order_number)
+        time.sleep(0.01)
+        with lock:
+            active[order_number] -= 1
+
+    order_numbers = ["ORD0000001", "ORD0000002", "ORD0000001", "ORD0000003", "ORD0000001"]
+    with patch.object(index, "change_order_status", change_order_status):
+        response = handler(sqs_event(order_numbers), None)
+
+    assert response == {"batchItemFailures": []}
+    assert Counter(calls) == Counter(order_numbers)
+    assert max(max_active.values()) == 1
+
+
+def test_unreadable_message_fails_alone(orders_table):
+    orders_table.items["ORD0000001"] = dict(SQS_ORDER_BODY, pkey="ORD0000001")
+    event = sqs_event(["ORD0000001"])
+    event["Records"].append({"messageId": "1", "body": "not json"})
+
+    response = handler(event, None)
+
+    assert response == {"batchItemFailures": [{"itemIdentifier": "1"}]}
+    assert orders_table.items["ORD0000001"]["Status"] == "IN_TRANSIT"
@@ -5,19 +5,57 @@ from .payload import (
     SQS_QUEUE_SENDS_MESSAGE,
     DB_ORDER_STATUS_CANCELLED
 )
+import json
+from unittest.mock import Mock
 from botocore.stub import Stubber
 from handle_delivery_process.index import handler
 
 
-def test_no_message_in_the_queue(sqs_client_stub: Stubber):
-    """
-    No new orde placed in the queue
-    """
+def order_update_params(order_number):
+    return {
+        "TableName": "TEST_TABLE",
+        "Key": {"pkey": order_number},
+        "UpdateExpression": "SET #status = :to",
+        "ConditionExpression": "attribute_exists(pkey) AND #status IN (:from0)",
+        "ExpressionAttributeNames": {"#status": "Status"},
+        "ExpressionAttributeValues": {":to": "IN_TRANSIT", ":from0": "PLACED"},
+        "ReturnValues": "ALL_OLD",
+        "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+    }
+
+
+def sqs_messages(order_numbers):
+    return {
+        "Messages": [
+            {
+                "MessageId": order_number,
+                "ReceiptHandle": f"{RECEIPT_HANDLE}-{order_number}",
+                "Body": json.dumps({**SQS_ORDER_BODY, "pkey": order_number}),
+            }
+            for order_number in order_numbers
+        ]
+    }
+
+
+def stub_empty_queue(sqs_client_stub):
     sqs_client_stub.add_response(
         method="receive_message",
+        expected_params={
+            "QueueUrl": "TEST_SQS_URL",
+            "MaxNumberOfMessages": 10,
+            "VisibilityTimeout": 30,
+            "WaitTimeSeconds": 5,
+        },
         service_response={},
     )
-    handler({}, None)
+
+
+def test_no_message_in_the_queue(sqs_client_stub: Stubber):
+    """
+    No new orde placed in the queue
+    """
+    stub_empty_queue(sqs_client_stub)
+    assert handler({}, None) == {"Processed": 0, "Failed": 0}
 
 
 def test_sqs_queue_contains_cancelled_order(sqs_client_stub: Stubber, ddb_client_stub: Stubber):
@@ -30,22 +68,25 @@ def test_sqs_queue_contains_cancelled_order(sqs_client_stub: Stubber, ddb_client
         method="receive_message",
         service_response=SQS_QUEUE_SENDS_MESSAGE,
     )
-    # check order status in db
-    ddb_client_stub.add_response(
-        method="get_item",
-        expected_params={
-            "Key": {"pkey": SQS_ORDER_BODY["pkey"]},
-            "TableName": "TEST_TABLE",
-        },
-        # order got CANCELLED before it was moved to IN_TRANSIT
-        service_response={"Item": utils.serialize_py_to_db(DB_ORDER_STATUS_CANCELLED)},
+    # conditional status update fails as the order
+    # got CANCELLED before it was moved to IN_TRANSIT
+    ddb_client_stub.add_client_error(
+        method="update_item",
+        service_error_code="ConditionalCheckFailedException",
+        http_status_code=400,
+        modeled_fields={"Item": utils.serialize_py_to_db(DB_ORDER_STATUS_CANCELLED)},
     )
     # delete message from SQS
     sqs_client_stub.add_response(
-        method="delete_message",
-        expected_params={"QueueUrl": "TEST_SQS_URL", "ReceiptHandle": RECEIPT_HANDLE},
-        service_response={}
+        method="delete_message_batch",
+        expected_params={
+            "QueueUrl": "TEST_SQS_URL",
+            "Entries": [{"Id": "0", "ReceiptHandle": RECEIPT_HANDLE}],
+        },
+        service_response={"Successful": [{"Id": "0"}], "Failed": []},
     )
+    # queue is drained
+    stub_empty_queue(sqs_client_stub)
 
     # We don't explicitly do any assertion as the handler
     # doesn't return anything.
@@ -55,7 +96,6 @@ def test_sqs_queue_contains_cancelled_order(sqs_client_stub: Stubber, ddb_client
     handler({}, None)
 
 
-
 def test_sqs_queue_contains_placed_order(sqs_client_stub: Stubber, ddb_client_stub: Stubber):
     """
     sqs queue contains order which was PLACED and
@@ -66,36 +106,179 @@ def test_sqs_queue_contains_placed_order(sqs_client_stub: Stubber, ddb_client_st
         method="receive_message",
         service_response=SQS_QUEUE_SENDS_MESSAGE,
     )
-    # Get Item from DB
+    # Single conditional UpdateItem moving the order
+    # from PLACED to IN_TRANSIT, no reads before it
     ddb_client_stub.add_response(
-        method="get_item",
+        method="update_item",
+        expected_params=order_update_params(SQS_ORDER_BODY["pkey"]),
+        service_response={"Attributes": utils.serialize_py_to_db(SQS_ORDER_BODY)},
+    )
+    # Finally, delete message from SQS
+    sqs_client_stub.add_response(
+        method="delete_message_batch",
         expected_params={
-            "Key": {"pkey": SQS_ORDER_BODY["pkey"]},
-            "TableName": "TEST_TABLE",
+            "QueueUrl": "TEST_SQS_URL",
+            "Entries": [{"Id": "0", "ReceiptHandle": RECEIPT_HANDLE}],
         },
-        service_response={"Item": utils.serialize_py_to_db(SQS_ORDER_BODY)},
+        service_response={"Successful": [{"Id": "0"}], "Failed": []},
+    )
+    # queue is drained
+    stub_empty_queue(sqs_client_stub)
+    handler({}, None)
+
+
+def test_queue_is_drained_in_batches(sqs_client_stub: Stubber, ddb_client_stub: Stubber):
+    """
+    batches are received and deleted until the queue is empty
+    """
+    batches = [
+        [f"ORD{i:07d}" for i in range(1, 11)],
+        [f"ORD{i:07d}" for i in range(11, 14)],
+    ]
+    for order_numbers in batches:
+        sqs_client_stub.add_response(
+            method="receive_message",
+            service_response=sqs_messages(order_numbers),
+        )
+        for order_number in order_numbers:
+            ddb_client_stub.add_response(
+                method="update_item",
+                expected_params=order_update_params(order_number),
+                service_response={
+                    "Attributes": utils.serialize_py_to_db(
+                        {**SQS_ORDER_BODY, "pkey": order_number}
+                    )
+                },
+            )
+        sqs_client_stub.add_response(
+            method="delete_message_batch",
+            expected_params={
+                "QueueUrl": "TEST_SQS_URL",
+                "Entries": [
+                    {"Id": str(i), "ReceiptHandle": f"{RECEIPT_HANDLE}-{order_number}"}
+                    for i, order_number in enumerate(order_numbers)
+                ],
+            },
+            service_response={"Successful": [], "Failed": []},
+        )
+    stub_empty_queue(sqs_client_stub)
+
+    assert handler({}, None) == {"Processed": 13, "Failed": 0}
+    sqs_client_stub.assert_no_pending_responses()
+
+
+def test_stops_receiving_when_running_out_of_time(sqs_client_stub: Stubber, ddb_client_stub: Stubber):
+    """
+    no receive is made once the invocation is about to time out
+    """
+    context = Mock()
+    context.get_remaining_time_in_millis.side_effect = [25000, 9000]
+    sqs_client_stub.add_response(
+        method="receive_message",
+        service_response=sqs_messages(["ORD0000001"]),
     )
-    # Make another call to get Item
-    # This is done as part of change_order_status,
-    # to fetch the current data in case someone
-    # directly updates an order based on its id
     ddb_client_stub.add_response(
-        method="get_item",
-        expected_params={
-            "Key": {"pkey": SQS_ORDER_BODY["pkey"]},
-            "TableName": "TEST_TABLE",
-        },
-        service_response={"Item": utils.serialize_py_to_db(SQS_ORDER_BODY)},
+        method="update_item",
+        service_response={"Attributes": utils.serialize_py_to_db(SQS_ORDER_BODY)},
+    )
+    sqs_client_stub.add_response(
+        method="delete_message_batch",
+        service_response={"Successful": [{"Id": "0"}], "Failed": []},
+    )
+
+    assert handler({}, context) == {"Processed": 1, "Failed": 0}
+    sqs_client_stub.assert_no_pending_responses()
+
+
+def test_failed_messages_are_not_deleted(sqs_client_stub: Stubber, ddb_client_stub: Stubber):
+    """
+    a message that can't be processed stays in the queue,
+    the rest of the batch is still deleted
+    """
+    sqs_client_stub.add_response(
+        method="receive_message",
+        service_response=sqs_messages(["ORD0000001", "ORD0000002"]),
+    )
+    # first order doesn't exist
+    ddb_client_stub.add_client_error(
+        method="update_item",
+        service_error_code="ConditionalCheckFailedException",
+        http_status_code=400,
     )
-    # PutItem triggered by change_order_status
     ddb_client_stub.add_response(
-        method="put_item",
-        service_response={},
+        method="update_item",
+        expected_params=order_update_params("ORD0000002"),
+        service_response={"Attributes": utils.serialize_py_to_db(SQS_ORDER_BODY)},
     )
-    # Finally, delete message from SQS
     sqs_client_stub.add_response(
-        method="delete_message",
-        expected_params={"QueueUrl": "TEST_SQS_URL", "ReceiptHandle": RECEIPT_HANDLE},
-        service_response={}
+        method="delete_message_batch",
+        expected_params={
+            "QueueUrl": "TEST_SQS_URL",
+            "Entries": [{"Id": "0", "ReceiptHandle": f"{RECEIPT_HANDLE}-ORD0000002"}],
+        },
+        service_response={"Successful": [{"Id": "0"}], "Failed": []},
     )
-    handler({}, None)
\ No newline at end of file
+    stub_empty_queue(sqs_client_stub)
+
+    assert handler({}, None) == {"Processed": 1, "Failed": 1}
+    sqs_client_stub.assert_no_pending_responses()
+
+
+def sqs_event(order_numbers):
+    return {
+        "Records": [
+            {
+                "messageId": order_number,
+                "receiptHandle": f"{RECEIPT_HANDLE}-{order_number}",
+                "body": json.dumps({**SQS_ORDER_BODY, "pkey": order_number}),
+                "eventSource": "aws:sqs",
+            }
+            for order_number in order_numbers
+        ]
+    }
+
+
+def test_event_source_mapping_batch(sqs_client_stub: Stubber, ddb_client_stub: Stubber):
+    """
+    orders delivered by the event source mapping are processed
+    without calling sqs, nothing is reported as failed
+    """
+    for order_number in ["ORD0000001", "ORD0000002"]:
+        ddb_client_stub.add_response(
+            method="update_item",
+            expected_params=order_update_params(order_number),
+            service_response={"Attributes": utils.serialize_py_to_db(SQS_ORDER_BODY)},
+        )
+
+    response = handler(sqs_event(["ORD0000001", "ORD0000002"]), None)
+
+    assert response == {"batchItemFailures": []}
+    ddb_client_stub.assert_no_pending_responses()
+
+
+def test_event_source_mapping_partial_failure(ddb_client_stub: Stubber):
+    """
+    only the messages that couldn't be processed are reported,
+    cancelled orders are not failures
+    """
+    ddb_client_stub.add_client_error(
+        method="update_item",
+        service_error_code="ConditionalCheckFailedException",
+        http_status_code=400,
+        modeled_fields={"Item": utils.serialize_py_to_db(DB_ORDER_STATUS_CANCELLED)},
+    )
+    ddb_client_stub.add_client_error(
+        method="update_item",
+        service_error_code="ProvisionedThroughputExceededException",
+        http_status_code=400,
+    )
+    ddb_client_stub.add_response(
+        method="update_item",
+        expected_params=order_update_params("ORD0000003"),
+        service_response={"Attributes": utils.serialize_py_to_db(SQS_ORDER_BODY)},
+    )
+
+    response = handler(sqs_event(["ORD0000001", "ORD0000002", "ORD0000003"]), None)
+
+    assert response == {"batchItemFailures": [{"itemIdentifier": "ORD0000002"}]}
+    ddb_client_stub.assert_no_pending_responses()
@@ -0,0 +1,25 @@
+import os
+
+stub_env_var = {
+    "ORDERS_TABLE": "TEST_TABLE",
+}
+for k, v in stub_env_var.items():
+    os.environ[k] = v
+
+from pytest import fixture
+from botocore.stub import Stubber
+from common.clients import get_resource
+from boto3.dynamodb.types import TypeSerializer
+
+
+@fixture(autouse=True)
+def ddb_client_stub():
+    with Stubber(get_resource("dynamodb").meta.client) as stubbed:
+        yield stubbed
+    stubbed.assert_no_pending_responses()
+
+
+class utils:
+    def serialize_py_to_db(data):
+        serializer = TypeSerializer()
+        return {k: serializer.serialize(v) for k, v in data.items()}
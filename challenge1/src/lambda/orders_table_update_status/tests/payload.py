@@ -0,0 +1,12 @@
+DB_ORDER_STATUS_PROCESSING = {
+    "pkey": "ORD0000005",
+    "Item": "test_item",
+    "Status": "PROCESSING",
+    "Description": "Description for item_test",
+    "Amount": 100,
+    "OrderedBy": "dummy@dummy.com",
+}
+
+DB_ORDER_STATUS_CANCELLED = {**DB_ORDER_STATUS_PROCESSING, "Status": "CANCELLED"}
+
+STEPFUNCTION_EVENT = DB_ORDER_STATUS_PROCESSING
@@ -0,0 +1,38 @@
+from .conftest import utils
+from .payload import (
+    STEPFUNCTION_EVENT,
+    DB_ORDER_STATUS_CANCELLED,
+    DB_ORDER_STATUS_PROCESSING,
+)
+from botocore.stub import Stubber
+from orders_table_update_status.index import handler
+
+
+def test_processing_order_is_placed(ddb_client_stub: Stubber):
+    """
+    payment succeeded, order moves from PROCESSING to PLACED
+    with a single conditional update
+    """
+    ddb_client_stub.add_response(
+        method="update_item",
+        service_response={
+            "Attributes": utils.serialize_py_to_db(DB_ORDER_STATUS_PROCESSING)
+        },
+    )
+    response = handler(STEPFUNCTION_EVENT, None)
+    assert response == {**DB_ORDER_STATUS_PROCESSING, "Status": "PLACED"}
+
+
+def test_cancelled_order_is_not_placed(ddb_client_stub: Stubber):
+    """
+    order was cancelled while the payment was processed,
+    the current order is returned unchanged
+    """
+    ddb_client_stub.add_client_error(
+        method="update_item",
+        service_error_code="ConditionalCheckFailedException",
+        http_status_code=400,
+        modeled_fields={"Item": utils.serialize_py_to_db(DB_ORDER_STATUS_CANCELLED)},
+    )
+    response = handler(STEPFUNCTION_EVENT, None)
+    assert response == DB_ORDER_STATUS_CANCELLED
@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import threading
+from common.cache import LRUCache
+from common.dynamodb import OUTBOX_PKEY_PREFIX
+from common.payments import start_payment_processing
+from aws_lambda_powertools.logging import Logger
+
+logger = Logger()
+
+# executions started concurrently and per second by each invocation,
+# the stream has one invocation per shard at a time
+RELAY_WORKERS = int(os.environ.get("RELAY_WORKERS", "10"))
+RELAY_MAX_STARTS_PER_SECOND = float(os.environ.get("RELAY_MAX_STARTS_PER_SECOND", "50"))
+
+# orders whose execution this container started, a stream batch retried
+# after a failure contains records that were already relayed
+relayed_orders = LRUCache(max_size=10000, ttl=3600)
+
+
+class RateLimiter:
+    """
+    token bucket letting `rate` calls per second through, with bursts of up to `rate`
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        block until a call is allowed
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def handler(event, context):
+    """
+    start the payment processing of the orders added to the outbox, records
+    that fail are reported so the stream retries them
+    """
+    records = [record for record in event["Records"] if is_outbox_insert(record)]
+    limiter = RateLimiter(RELAY_MAX_STARTS_PER_SECOND)
+
+    def relay(record):
+        order = json.loads(record["dynamodb"]["NewImage"]["Input"]["S"])
+        if relayed_orders.get(order["pkey"]):
+            return True
+        try:
+            limiter.acquire()
+            start_payment_processing(order)
+        except Exception:
+            logger.exception(f"Couldn't start payment processing of {order['pkey']}")
+            return False
+        relayed_orders.set(order["pkey"], True)
+        return True
+
+    started = time.monotonic()
+    if len(records) > 1 and RELAY_WORKERS > 1:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=min(RELAY_WORKERS, len(records))) as executor:
+            results = list(executor.map(relay, records))
+    else:
+        results = [relay(record) for record in records]
+
+    failures = [
+        {"itemIdentifier": record["dynamodb"]["SequenceNumber"]}
+        for record, relayed in zip(records, results)
+        if not relayed
+    ]
+    logger.info(
+        f"{len(records) - len(failures)} executions started, {len(failures)} failed",
+        extra={
+            "records": len(records),
+            "failed": len(failures),
+            "duration_ms": round((time.monotonic() - started) * 1000),
+        },
+    )
+    return {"batchItemFailures": failures}
+
+
+def is_outbox_insert(record):
+    """
+    the event source mapping filters the stream already,
+    checked again in case the filter is changed
+    """
+    keys = record["dynamodb"].get("Keys", {})
+    return record["eventName"] == "INSERT" and keys.get("pkey", {}).get(
+        "S", ""
+    ).startswith(OUTBOX_PKEY_PREFIX)
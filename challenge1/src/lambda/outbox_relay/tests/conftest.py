@@ -0,0 +1,42 @@
+import os
+
+stub_env_var = {
+    "ORDERS_TABLE": "TEST_TABLE",
+    "PAYMENT_PROCESSOR_SF_ARN": "TEST_ARN",
+}
+for k, v in stub_env_var.items():
+    os.environ[k] = v
+
+from pytest import fixture
+from unittest.mock import patch
+from common.cache import LRUCache
+from boto3.dynamodb.types import TypeSerializer
+
+
+@fixture(autouse=True)
+def relayed_orders():
+    # every test starts with a cold container
+    with patch("outbox_relay.index.relayed_orders", LRUCache(100, 3600)) as cache:
+        yield cache
+
+
+@fixture
+def start_payment_processing():
+    with patch("outbox_relay.index.start_payment_processing") as patched:
+        yield patched
+
+
+class utils:
+    def stream_record(item, event_name="INSERT", sequence_number="1"):
+        """
+        stream record of a write of `item`, the stream's view type is NEW_IMAGE
+        """
+        serializer = TypeSerializer()
+        return {
+            "eventName": event_name,
+            "dynamodb": {
+                "Keys": {"pkey": serializer.serialize(item["pkey"])},
+                "NewImage": {k: serializer.serialize(v) for k, v in item.items()},
+                "SequenceNumber": sequence_number,
+            },
+        }
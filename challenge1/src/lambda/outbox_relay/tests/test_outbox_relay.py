@@ -0,0 +1,101 @@
+import os
+import time
+from .conftest import utils
+from unittest.mock import patch
+from botocore.stub import Stubber
+from common.clients import get_client
+from common.dynamodb import outbox_record
+from outbox_relay.index import handler, RateLimiter
+
+ORDERS = [
+    {
+        "pkey": f"ORD{i:07d}",
+        "Item": "test_item",
+        "Amount": 100,
+        "Status": "PROCESSING",
+        "OrderedBy": "dummy@dummy.com",
+    }
+    for i in range(1, 4)
+]
+
+
+def outbox_event(orders):
+    return {
+        "Records": [
+            utils.stream_record(outbox_record(order), sequence_number=str(i))
+            for i, order in enumerate(orders, start=1)
+        ]
+    }
+
+
+def test_payment_processing_is_started_for_each_outbox_record(start_payment_processing):
+    response = handler(outbox_event(ORDERS), None)
+
+    assert response == {"batchItemFailures": []}
+    started = sorted(call.args[0]["pkey"] for call in start_payment_processing.call_args_list)
+    assert started == [order["pkey"] for order in ORDERS]
+
+
+def test_other_stream_records_are_ignored(start_payment_processing):
+    event = {
+        "Records": [
+            # the order itself and a later update of its outbox record
+            utils.stream_record(ORDERS[0]),
+            utils.stream_record(outbox_record(ORDERS[0]), event_name="MODIFY"),
+        ]
+    }
+
+    assert handler(event, None) == {"batchItemFailures": []}
+    start_payment_processing.assert_not_called()
+
+
+def test_failed_starts_are_reported(start_payment_processing):
+    def start(order):
+        if order["pkey"] == ORDERS[1]["pkey"]:
+            raise RuntimeError("throttled")
+
+    start_payment_processing.side_effect = start
+
+    response = handler(outbox_event(ORDERS), None)
+
+    assert response == {"batchItemFailures": [{"itemIdentifier": "2"}]}
+
+
+def test_retried_batch_only_starts_failed_orders(start_payment_processing):
+    start_payment_processing.side_effect = [None, RuntimeError("throttled"), None]
+    with patch("outbox_relay.index.RELAY_WORKERS", 1):
+        handler(outbox_event(ORDERS), None)
+        start_payment_processing.reset_mock(side_effect=True)
+
+        # the stream retries the whole batch
+        assert handler(outbox_event(ORDERS), None) == {"batchItemFailures": []}
+
+    start_payment_processing.assert_called_once()
+    assert start_payment_processing.call_args.args[0]["pkey"] == ORDERS[1]["pkey"]
+
+
+def test_replayed_record_of_a_closed_execution_is_not_a_failure():
+    """
+    a batch replayed on another container, whose standard execution
+    already ran to completion
+    """
+    with Stubber(get_client("stepfunctions")) as sf_stub, patch.dict(
+        os.environ, {"PAYMENT_PROCESSOR_SF_TYPE": "STANDARD"}
+    ):
+        sf_stub.add_client_error(
+            method="start_execution", service_error_code="ExecutionAlreadyExists"
+        )
+
+        assert handler(outbox_event(ORDERS[:1]), None) == {"batchItemFailures": []}
+
+        sf_stub.assert_no_pending_responses()
+
+
+def test_rate_limiter_spaces_calls_out_once_the_burst_is_spent():
+    limiter = RateLimiter(20)
+    started = time.monotonic()
+    for _ in range(25):
+        limiter.acquire()
+
+    # 20 calls go through at once, the next 5 take 1/20s each
+    assert time.monotonic() - started >= 0.2
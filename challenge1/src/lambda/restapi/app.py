@@ -1,28 +1,74 @@
-import re
 import os
-import json
-import boto3
-from schema import SchemaError
 from aws_lambda_powertools.logging import Logger
-from chalicelib.schemas import post_order_schema
-from chalicelib.utils import generate_order_number
-from chalice import Chalice, BadRequestError, CustomAuthorizer
+from chalicelib.schemas import is_order_number, post_order_fields, validate_post_order
+from chalicelib.utils import (
+    order_etag,
+    request_hash,
+    json_response,
+    etag_matches,
+    decode_cursor,
+    encode_cursor,
+    new_order_details,
+    DEFAULT_ORDERED_BY,
+    generate_order_number,
+    generate_order_numbers,
+)
+from chalice import (
+    Chalice,
+    Response,
+    ConflictError,
+    BadRequestError,
+    CustomAuthorizer,
+    UnprocessableEntityError,
+)
 
 try:
-    from common.errors import ItemNotFound
-    from common.utils import ORDER_LIFE_CYCLE
-    from common.dynamodb import get_item_by_pkey, order_table_put_item
+    from common.utils import ORDER_LIFE_CYCLE, TERMINAL_ORDER_STATUSES
+    from common.errors import (
+        ItemNotFound,
+        IdempotencyKeyInUse,
+        IdempotencyKeyMismatch,
+        InvalidStatusTransition,
+        BatchOperationIncomplete,
+    )
+    from common.dynamodb import (
+        batch_get_orders,
+        get_item_by_pkey,
+        put_order_with_outbox,
+        put_orders_with_outbox,
+        claim_idempotency_key,
+        release_idempotency_key,
+        query_orders_by_customer,
+        transition_order_status,
+    )
 except ModuleNotFoundError:
     pass
 
 
 logger = Logger()
 app = Chalice(app_name="restapi")
-sf_client = boto3.client("stepfunctions")
 
 LAMBDA_FUNCTION_AUTHORIZER_URI = os.environ["LAMBDA_FUNCTION_AUTHORIZER_URI"]
-PAYMENT_PROCESSING_SF_ARN = os.environ["PAYMENT_PROCESSOR_SF_ARN"]
 APIGW_INVOKE_LAMBDA_ROLE_ARN = os.environ["APIGW_INVOKE_LAMBDA_ROLE_ARN"]
+# seconds API Gateway caches the authorizer policy of a token, 0 disables it
+AUTHORIZER_TTL_SECONDS = int(os.environ.get("AUTHORIZER_TTL_SECONDS", "300"))
+
+# max number of orders fetched by a single GET /orders request
+MAX_ORDERS_PER_REQUEST = 500
+# number of BatchGetItem calls made concurrently by GET /orders
+BATCH_GET_WORKERS = 4
+# default and max number of orders per page listed by GET /orders
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# max number of orders created by a single POST /orders/batch request
+MAX_ORDERS_PER_BATCH = 1000
+# max length of the Idempotency-Key header of POST /order
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+# seconds GET /order responses of orders in a terminal status can be cached,
+# the others are revalidated with their ETag
+TERMINAL_ORDER_MAX_AGE_SECONDS = int(
+    os.environ.get("TERMINAL_ORDER_MAX_AGE_SECONDS", "86400")
+)
 
 
 # custom authorizer for orders API
@@ -31,13 +77,13 @@ authorizer = CustomAuthorizer(
     authorizer_uri=LAMBDA_FUNCTION_AUTHORIZER_URI,
     invoke_role_arn=APIGW_INVOKE_LAMBDA_ROLE_ARN,
     header="authorizationToken",
-    ttl_seconds=0,
+    ttl_seconds=AUTHORIZER_TTL_SECONDS,
 )
 
 
 @app.route("/", authorizer=authorizer)
 def index():
-    return {"hello": "world"}
+    return json_response({"hello": "world"})
 
 
 @app.route("/order", methods=["POST"], authorizer=authorizer)
@@ -47,34 +93,108 @@ def create_new_order():
     """
     current_request_body = app.current_request.json_body
     try:
-        post_order_schema.validate(current_request_body)
-    except SchemaError:
+        validate_post_order(current_request_body)
+    except ValueError as e:
         raise BadRequestError(
-            f"Invalid json body. Allowed values are: {post_order_schema.schema}"
+            f"Invalid json body. Allowed values are: {post_order_fields}. {e}"
         )
 
-    # Generate a new order number
-    order_number = generate_order_number()
-    # Set pkey, skey and Order Status
-    current_request_body["pkey"] = order_number
-    current_request_body["OrderedBy"] = "dummy@dummy.com"
-    current_request_body["Status"] = ORDER_LIFE_CYCLE.PROCESSING
+    # a retried request gets the response of the first one, without
+    # allocating a number or writing the order again
+    idempotency_key = app.current_request.headers.get("Idempotency-Key")
+    if idempotency_key is not None:
+        if not 0 < len(idempotency_key) <= MAX_IDEMPOTENCY_KEY_LENGTH:
+            raise BadRequestError(
+                f"Idempotency-Key should be 1 to {MAX_IDEMPOTENCY_KEY_LENGTH} characters long."
+            )
+        body_hash = request_hash(current_request_body)
+        try:
+            response = claim_idempotency_key(idempotency_key, body_hash)
+        except IdempotencyKeyInUse:
+            raise ConflictError(
+                "A request with this Idempotency-Key is being processed, please retry later"
+            )
+        except IdempotencyKeyMismatch:
+            raise UnprocessableEntityError(
+                "Idempotency-Key was already used for a different order"
+            )
+        if response is not None:
+            return json_response(response, headers={"Idempotent-Replayed": "true"})
 
-    order_table_put_item(current_request_body)
-    logger.info(
-        f"Order: {current_request_body} added to the table, triggering step function to process payment"
-    )
+    try:
+        # Generate a new order number
+        order_number = generate_order_number()
+        # Set pkey, skey and Order Status
+        current_request_body = new_order_details(current_request_body, order_number)
+        response = {
+            "Message": f"Order received, processing payment",
+            "OrderId": order_number,
+        }
 
-    sf_client.start_execution(
-        stateMachineArn=PAYMENT_PROCESSING_SF_ARN,
-        name=f"process_payment_{order_number}",
-        input=json.dumps(current_request_body),
-    )
+        # the payment processing is started by the outbox relay
+        if idempotency_key is None:
+            put_order_with_outbox(current_request_body)
+        else:
+            put_order_with_outbox(
+                current_request_body, idempotency_key, body_hash, response
+            )
+    except Exception:
+        if idempotency_key is not None:
+            release_idempotency_key(idempotency_key)
+        raise
+    logger.info(f"Order: {current_request_body} added to the table")
 
-    return {
-        "Message": f"Order received, processing payment",
-        "OrderId": order_number,
-    }
+    return json_response(response)
+
+
+@app.route("/orders/batch", methods=["POST"], authorizer=authorizer)
+def create_new_orders():
+    """
+    method to create several orders at once, expects a json list of orders
+    and returns the result of each one in the same order
+    """
+    current_request_body = app.current_request.json_body
+    if (
+        not isinstance(current_request_body, list)
+        or not 0 < len(current_request_body) <= MAX_ORDERS_PER_BATCH
+    ):
+        raise BadRequestError(
+            f"Invalid json body. Expected a list of 1 to {MAX_ORDERS_PER_BATCH} orders."
+        )
+
+    results = [{"Index": index} for index in range(len(current_request_body))]
+    orders = []
+    for result, order in zip(results, current_request_body):
+        try:
+            validate_post_order(order)
+        except ValueError as e:
+            result["Error"] = (
+                f"Invalid json body. Allowed values are: {post_order_fields}. {e}"
+            )
+        else:
+            orders.append((result, order))
+
+    # Generate all order numbers at once
+    order_numbers = generate_order_numbers(len(orders))
+    for (result, order), order_number in zip(orders, order_numbers):
+        result["OrderId"] = order_number
+        new_order_details(order, order_number)
+
+    unprocessed = set()
+    try:
+        put_orders_with_outbox([order for _, order in orders])
+    except BatchOperationIncomplete as e:
+        unprocessed = {order["pkey"] for order in e.unprocessed}
+    received = 0
+    for result, order in orders:
+        if order["pkey"] in unprocessed:
+            result["Error"] = "Order couldn't be saved, please try again"
+        else:
+            result["Message"] = "Order received, processing payment"
+            received += 1
+
+    logger.info(f"{received} of {len(results)} orders received")
+    return json_response({"Orders": results})
 
 
 @app.route("/order/{order_number}", methods=["GET"], authorizer=authorizer)
@@ -82,7 +202,7 @@ def get_order_details(order_number):
     """
     method to get order details
     """
-    if not re.match("^ORD\d{7}$", order_number):
+    if not is_order_number(order_number):
         raise BadRequestError(
             "Order number format is invalid, should be 'ORDXXXXXXX' where X is a number."
         )
@@ -96,7 +216,93 @@ def get_order_details(order_number):
         raise BadRequestError(f"Order {order_number} doesn't exist")
 
     logger.info(f"Records found for order number {order_number}")
-    return response
+    etag = order_etag(response)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if response["Status"] in TERMINAL_ORDER_STATUSES:
+        headers["Cache-Control"] = (
+            f"public, max-age={TERMINAL_ORDER_MAX_AGE_SECONDS}, immutable"
+        )
+    # the client's copy is still current, it doesn't need the body again
+    if etag_matches(app.current_request.headers.get("If-None-Match"), etag):
+        return Response(body="", status_code=304, headers=headers)
+    return json_response(response, headers=headers)
+
+
+@app.route("/orders", methods=["GET"], authorizer=authorizer)
+def get_orders():
+    """
+    method to list orders, either the given ones i.e. /orders?ids=ORD0000001,ORD0000002
+    or a page of the customer's orders i.e. /orders?limit=20&cursor=<NextCursor>
+    """
+    query_params = app.current_request.query_params or {}
+    if "ids" in query_params:
+        return json_response(get_orders_details(query_params["ids"]))
+    return json_response(
+        list_customer_orders(query_params.get("limit"), query_params.get("cursor"))
+    )
+
+
+def get_orders_details(ids):
+    """
+    get details of several orders with BatchGetItem
+    """
+    order_numbers = list(dict.fromkeys(filter(None, ids.split(","))))
+    if not order_numbers or len(order_numbers) > MAX_ORDERS_PER_REQUEST:
+        raise BadRequestError(
+            f"Query parameter 'ids' should contain 1 to {MAX_ORDERS_PER_REQUEST} comma separated order numbers."
+        )
+    invalid_order_numbers = [i for i in order_numbers if not is_order_number(i)]
+    if invalid_order_numbers:
+        raise BadRequestError(
+            f"Order number format is invalid for {', '.join(invalid_order_numbers)}, should be 'ORDXXXXXXX' where X is a number."
+        )
+
+    unprocessed = set()
+    try:
+        orders = batch_get_orders(order_numbers, max_workers=BATCH_GET_WORKERS)
+    except BatchOperationIncomplete as e:
+        # the client retries the orders that couldn't be read
+        orders = e.processed
+        unprocessed = {key["pkey"] for key in e.unprocessed}
+    orders = {order["pkey"]: order for order in orders}
+    logger.info(f"Records found for {len(orders)} of {len(order_numbers)} order numbers")
+    details = {
+        "Orders": [orders[i] for i in order_numbers if i in orders],
+        "NotFound": [i for i in order_numbers if i not in orders and i not in unprocessed],
+    }
+    if unprocessed:
+        details["Unprocessed"] = [i for i in order_numbers if i in unprocessed]
+    return details
+
+
+def list_customer_orders(limit, cursor):
+    """
+    get a page of the orders placed by the customer from the OrderedBy-index
+    """
+    try:
+        limit = int(limit or DEFAULT_PAGE_SIZE)
+        if not 0 < limit <= MAX_PAGE_SIZE:
+            raise ValueError()
+    except ValueError:
+        raise BadRequestError(
+            f"Query parameter 'limit' should be a number between 1 and {MAX_PAGE_SIZE}."
+        )
+    try:
+        start_key = decode_cursor(cursor) if cursor else None
+        # DynamoDB rejects any other ExclusiveStartKey of the index
+        if start_key is not None and (
+            set(start_key) != {"pkey", "OrderedBy"}
+            or start_key["OrderedBy"] != DEFAULT_ORDERED_BY
+            or not is_order_number(start_key["pkey"])
+        ):
+            raise ValueError()
+    except ValueError:
+        raise BadRequestError("Query parameter 'cursor' is invalid.")
+
+    orders, last_evaluated_key = query_orders_by_customer(
+        DEFAULT_ORDERED_BY, limit, start_key
+    )
+    return {"Orders": orders, "NextCursor": encode_cursor(last_evaluated_key)}
 
 
 @app.route("/cancel/{order_number}", methods=["PUT"], authorizer=authorizer)
@@ -104,35 +310,29 @@ def cancel_order(order_number):
     """
     method to cancel existing order
     """
-    if not re.match("^ORD\d{7}$", order_number):
+    if not is_order_number(order_number):
         raise BadRequestError(
             "Order number format is invalid, should be 'ORDXXXXXXX' where X is a number."
         )
 
     try:
-        response = get_item_by_pkey(order_number)
+        response = transition_order_status(order_number, ORDER_LIFE_CYCLE.CANCELLED)
     except ItemNotFound:
         logger.error(
             f"Invalid Order number {order_number}, please try with a valid order number"
         )
         raise BadRequestError(f"Order {order_number} doesn't exist")
-
-    logger.info(f"Records found for order number {order_number}, checking its Status")
-
     # ORDER IS DELIVERED
-    if response["Status"] == ORDER_LIFE_CYCLE.COMPLETED:
-        api_response = {
-            "Message": "Product already delivered, you can opt for an exchange"
-        }
-    # ORDER IS PLACED OR IN_TRANSIT
-    elif response["Status"] in [ORDER_LIFE_CYCLE.IN_TRANSIT, ORDER_LIFE_CYCLE.PLACED]:
-        api_response = {"Message": "Order is cancelled, your refund is initiated"}
-        response["Status"] = ORDER_LIFE_CYCLE.CANCELLED
-    else:
-        api_response = {
-            "Message": "Order already cancelled or was never placed successfully"
-        }
-        response["Status"] = ORDER_LIFE_CYCLE.CANCELLED
+    except InvalidStatusTransition:
+        return json_response(
+            {"Message": "Product already delivered, you can opt for an exchange"}
+        )
+
+    logger.info(f"Order {order_number} cancelled, it was {response['Status']}")
 
-    order_table_put_item(response)
-    return api_response
+    # ORDER WAS PLACED OR IN_TRANSIT
+    if response["Status"] in [ORDER_LIFE_CYCLE.IN_TRANSIT, ORDER_LIFE_CYCLE.PLACED]:
+        return json_response({"Message": "Order is cancelled, your refund is initiated"})
+    return json_response(
+        {"Message": "Order already cancelled or was never placed successfully"}
+    )
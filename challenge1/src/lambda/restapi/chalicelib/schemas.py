@@ -1,6 +1,10 @@
-from schema import Schema, Forbidden, Optional
+import re
+from schema import Forbidden, Optional
 
-__post_order_schema_dict = {
+# order numbers are zero-padded to 7 digits and grow longer after ORD9999999
+order_number_pattern = re.compile(r"^ORD\d{7,}$")
+
+post_order_schema_dict = {
     Forbidden("pkey"): str,
     Forbidden("OrderedBy"): str,
     "Item": str,
@@ -8,4 +12,70 @@ __post_order_schema_dict = {
     Optional("Description"): str
 }
 
-post_order_schema = Schema(__post_order_schema_dict)
+
+def is_order_number(value):
+    return order_number_pattern.match(value) is not None
+
+
+def compile_schema(schema_dict):
+    """
+    validator function for a schema dict made of Forbidden, Optional and
+    required keys with a type each, accepting the same json objects as
+    `Schema(schema_dict).validate` but without interpreting the schema on
+    every call. The validator raises ValueError describing the first problem
+    """
+    required, optional, forbidden = {}, {}, set()
+    for key, rule in schema_dict.items():
+        if not isinstance(rule, type):
+            raise TypeError(f"Unsupported rule {rule!r} for key {key!r}")
+        if isinstance(key, Forbidden):
+            forbidden.add(key.schema)
+        elif isinstance(key, Optional):
+            optional[key.schema] = rule
+        else:
+            required[key] = rule
+    allowed = {**required, **optional}
+    required_count = len(required)
+
+    def validate(data):
+        if not isinstance(data, dict):
+            raise ValueError(f"Expected a json object, got {type(data).__name__}")
+        present = 0
+        for key, value in data.items():
+            rule = allowed.get(key)
+            if rule is None:
+                if key in forbidden:
+                    raise ValueError(f"Key '{key}' is not allowed")
+                raise ValueError(f"Unexpected key '{key}'")
+            # like the schema library, booleans aren't taken for ints
+            if not isinstance(value, rule) or (
+                rule is int and (value is True or value is False)
+            ):
+                raise ValueError(
+                    f"'{key}' should be of type {rule.__name__}, got {type(value).__name__}"
+                )
+            if key in required:
+                present += 1
+        if present < required_count:
+            missing = ", ".join(f"'{key}'" for key in required if key not in data)
+            raise ValueError(f"Missing key(s) {missing}")
+        return data
+
+    return validate
+
+
+def describe_schema(schema_dict):
+    """
+    allowed keys and their type, for error messages
+    """
+    return ", ".join(
+        f"{key.schema} (optional {rule.__name__})"
+        if isinstance(key, Optional)
+        else f"{key} ({rule.__name__})"
+        for key, rule in schema_dict.items()
+        if not isinstance(key, Forbidden)
+    )
+
+
+validate_post_order = compile_schema(post_order_schema_dict)
+post_order_fields = describe_schema(post_order_schema_dict)
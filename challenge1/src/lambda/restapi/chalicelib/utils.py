@@ -1,18 +1,90 @@
-from common.errors import ItemNotFound
-from common.dynamodb import get_item_by_pkey, order_table_put_item
+import json
+import base64
+import hashlib
+from chalice import Response
+from common.serializer import dumps
+from common.utils import ORDER_LIFE_CYCLE
+from common.dynamodb import allocate_order_numbers
+
+
+# orders aren't linked to authenticated users yet
+DEFAULT_ORDERED_BY = "dummy@dummy.com"
 
 
 def generate_order_number():
+    return allocate_order_numbers(1)[0]
+
+
+def generate_order_numbers(count):
+    return allocate_order_numbers(count)
+
+
+def new_order_details(order_details, order_number):
+    """
+    set pkey, OrderedBy and Order Status of a new order
+    """
+    order_details["pkey"] = order_number
+    order_details["OrderedBy"] = DEFAULT_ORDERED_BY
+    order_details["Status"] = ORDER_LIFE_CYCLE.PROCESSING
+    return order_details
+
+
+def encode_cursor(last_evaluated_key):
+    """
+    opaque pagination cursor for a LastEvaluatedKey
+    """
+    if not last_evaluated_key:
+        return None
+    data = json.dumps(last_evaluated_key, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def decode_cursor(cursor):
+    """
+    LastEvaluatedKey of a pagination cursor, raises ValueError if invalid
+    """
     try:
-        order_number_data = get_item_by_pkey("next_order")
-        order_number = order_number_data["number"] + 1
-    except ItemNotFound:
-        # First order so no record found
-        order_number = 1
-    order_table_put_item(
-        {
-            "pkey": "next_order",
-            "number": order_number,
-        }
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError(f"Invalid cursor {cursor}")
+    if not isinstance(key, dict) or not all(isinstance(v, str) for v in key.values()):
+        raise ValueError(f"Invalid cursor {cursor}")
+    return key
+
+
+def json_response(body, status_code=200, headers=None):
+    """
+    response serialized with the layer's json encoder, which handles
+    the Decimal values of the orders without copying them
+    """
+    return Response(
+        body=dumps(body),
+        status_code=status_code,
+        headers={"Content-Type": "application/json", **(headers or {})},
     )
-    return "ORD" + "0" * (7 - len(str(order_number))) + str(order_number)
+
+
+def request_hash(body):
+    """
+    hash of a request body, telling apart requests sent with the same idempotency key
+    """
+    return hashlib.sha256(dumps(body, sort_keys=True).encode()).hexdigest()
+
+
+def order_etag(order):
+    """
+    strong ETag of an order, changes whenever any of its attributes does
+    """
+    data = dumps(order, sort_keys=True)
+    return f'"{hashlib.sha1(data.encode()).hexdigest()}"'
+
+
+def etag_matches(if_none_match, etag):
+    """
+    whether an If-None-Match header lists `etag`, weak tags included
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
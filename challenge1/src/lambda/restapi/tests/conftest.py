@@ -3,7 +3,6 @@ import json
 
 # Stub environment variables
 stub_env_variables = {
-    "PAYMENT_PROCESSOR_SF_ARN": "TEST_ARN",
     "LAMBDA_FUNCTION_AUTHORIZER_URI": "TEST_URI",
     "APIGW_INVOKE_LAMBDA_ROLE_ARN": "TEST_ARN",
     "ORDERS_TABLE": "TEST_TABLE",
@@ -15,14 +14,15 @@ from restapi import app
 from pytest import fixture
 from chalice.test import Client
 from unittest.mock import patch
-from botocore.stub import Stubber
-from common.dynamodb import db_resource
+from botocore.stub import Stubber, ANY
+from common.cache import LRUCache
+from common.clients import get_client, get_resource
 from boto3.dynamodb.types import TypeSerializer
 
 
 @fixture(autouse=True)
 def ddb_client_stub():
-    with Stubber(db_resource.meta.client) as stubbed_db:
+    with Stubber(get_resource("dynamodb").meta.client) as stubbed_db:
         yield stubbed_db
     stubbed_db.assert_no_pending_responses
 
@@ -34,13 +34,26 @@ def stub_generate_order_number():
         yield patched
 
 
+@fixture(autouse=True)
+def stub_generate_order_numbers():
+    with patch("restapi.app.generate_order_numbers") as patched:
+        patched.side_effect = lambda count: [f"ORD{i:07d}" for i in range(1, count + 1)]
+        yield patched
+
+
 @fixture(autouse=True)
 def stepfunction_client_stub():
-    with Stubber(app.sf_client) as stubbed_sf:
+    with Stubber(get_client("stepfunctions")) as stubbed_sf:
         yield stubbed_sf
     stubbed_sf.assert_no_pending_responses
 
 
+@fixture(autouse=True)
+def idempotency_cache():
+    with patch("common.dynamodb.idempotency_cache", LRUCache(max_size=10, ttl=60)) as cache:
+        yield cache
+
+
 @fixture
 def stub_api_client():
     with Client(app.app) as stubbed_client:
@@ -57,3 +70,19 @@ class utils:
     def serialize_json_to_db(json_body):
         serializer = TypeSerializer()
         return {k: serializer.serialize(v) for k, v in json_body.items()}
+
+    def outbox_transaction(*orders, puts=()):
+        """
+        TransactWriteItems params writing `orders` along with their outbox records
+        """
+        return {
+            "TransactItems": [
+                {"Put": {"TableName": "TEST_TABLE", "Item": item}}
+                for order in orders
+                for item in (
+                    order,
+                    {"pkey": f"outbox#{order['pkey']}", "Input": ANY, "TTL": ANY},
+                )
+            ]
+            + [{"Put": {"TableName": "TEST_TABLE", **put}} for put in puts]
+        }
@@ -12,3 +12,13 @@ DB_PUT_ITEM_EXPECTED_PARAMS = {
 DB_GET_ITEM_ORDER_DETAILS = DB_PUT_ITEM_EXPECTED_PARAMS
 
 POST_ORDER_INPUT_JSON_INVALID = {"Item": "dummy", "Amount": "100"}
+
+DB_ORDER_STATUS_PLACED = {**DB_PUT_ITEM_EXPECTED_PARAMS, "Status": "PLACED"}
+
+DB_ORDER_STATUS_COMPLETED = {**DB_PUT_ITEM_EXPECTED_PARAMS, "Status": "COMPLETED"}
+
+POST_ORDERS_BATCH_INPUT_JSON = [
+    {"Item": "dummy", "Amount": 100},
+    {"Item": "dummy", "Amount": "100"},
+    {"Item": "dummy", "Amount": 200, "Description": "dummy"},
+]
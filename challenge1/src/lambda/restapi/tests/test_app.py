@@ -1,5 +1,8 @@
+import json
 from .conftest import utils
 from chalice.test import Client
+from chalicelib.utils import encode_cursor, request_hash
+from unittest.mock import patch
 from botocore.stub import Stubber, ANY
 from .payload import (
     TABLENAME,
@@ -7,35 +10,22 @@ from .payload import (
     POST_ORDER_INPUT_JSON_INVALID,
     DB_PUT_ITEM_EXPECTED_PARAMS,
     DB_GET_ITEM_ORDER_DETAILS,
+    DB_ORDER_STATUS_PLACED,
+    DB_ORDER_STATUS_COMPLETED,
+    POST_ORDERS_BATCH_INPUT_JSON,
 )
 
 def test_post_order_with_valid_input(
     ddb_client_stub: Stubber,
-    stepfunction_client_stub: Stubber,
     stub_api_client: Client,
 ):
-    # mock db put_item call to store new record
+    # the order and its outbox record are written in one transaction,
+    # payment processing is started by the outbox relay
     ddb_client_stub.add_response(
-        method="put_item",
-        expected_params={
-            "Item": DB_PUT_ITEM_EXPECTED_PARAMS,
-            "TableName": TABLENAME,
-        },
+        method="transact_write_items",
+        expected_params=utils.outbox_transaction(DB_PUT_ITEM_EXPECTED_PARAMS),
         service_response={},
     )
-    # mock stepfunction start_execution to trigger the next steps
-    stepfunction_client_stub.add_response(
-        method="start_execution",
-        expected_params={
-            "stateMachineArn": "TEST_ARN",
-            "name": ANY,
-            "input": ANY,
-        },
-        service_response={
-            "executionArn": "test",
-            "startDate": "2011-11-11 11:11:11",
-        },
-    )
 
     # Creating new Order
     response = stub_api_client.http.post(
@@ -67,6 +57,176 @@ def test_post_order_with_invalid_input(
     assert "Invalid json body. Allowed values are:" in response.json_body["Message"]
 
 
+def idempotency_claim(key):
+    """
+    conditional PutItem locking the idempotency `key` of the POST_ORDER_INPUT_JSON request
+    """
+    return {
+        "TableName": TABLENAME,
+        "Item": {
+            "pkey": f"idempotency#{key}",
+            "Status": "IN_PROGRESS",
+            "RequestHash": request_hash(POST_ORDER_INPUT_JSON),
+            "LockExpiry": ANY,
+            "TTL": ANY,
+        },
+        "ConditionExpression": ANY,
+        "ExpressionAttributeNames": ANY,
+        "ExpressionAttributeValues": ANY,
+        "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+    }
+
+
+def stub_idempotency_record(ddb_client_stub, key, record):
+    ddb_client_stub.add_client_error(
+        method="put_item",
+        service_error_code="ConditionalCheckFailedException",
+        expected_params=idempotency_claim(key),
+        modeled_fields={
+            "Item": utils.serialize_json_to_db({"pkey": f"idempotency#{key}", **record})
+        },
+    )
+
+
+def post_order(stub_api_client, idempotency_key):
+    return stub_api_client.http.post(
+        "/order",
+        headers={**utils.generate_headers(), "Idempotency-Key": idempotency_key},
+        body=utils.json_to_str(POST_ORDER_INPUT_JSON),
+    )
+
+
+def test_post_order_with_idempotency_key(
+    ddb_client_stub: Stubber,
+    stub_api_client: Client,
+):
+    # the key is claimed, then its response is stored with the order
+    ddb_client_stub.add_response(
+        method="put_item", expected_params=idempotency_claim("key-1"), service_response={}
+    )
+    ddb_client_stub.add_response(
+        method="transact_write_items",
+        expected_params=utils.outbox_transaction(
+            DB_PUT_ITEM_EXPECTED_PARAMS,
+            puts=[
+                {
+                    "Item": {
+                        "pkey": "idempotency#key-1",
+                        "Status": "COMPLETED",
+                        "RequestHash": request_hash(POST_ORDER_INPUT_JSON),
+                        "Response": ANY,
+                        "TTL": ANY,
+                    },
+                    "ConditionExpression": "#status = :in_progress",
+                    "ExpressionAttributeNames": {"#status": "Status"},
+                    "ExpressionAttributeValues": {":in_progress": "IN_PROGRESS"},
+                }
+            ],
+        ),
+        service_response={},
+    )
+
+    response = post_order(stub_api_client, "key-1")
+    assert response.status_code == 200
+    assert response.json_body["OrderId"] == "ORD0000001"
+
+    # the retry is answered from the container's cache
+    retry = post_order(stub_api_client, "key-1")
+    assert retry.status_code == 200
+    assert retry.json_body == response.json_body
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    ddb_client_stub.assert_no_pending_responses()
+
+
+def test_post_order_replays_the_stored_response(
+    ddb_client_stub: Stubber,
+    stub_api_client: Client,
+    stub_generate_order_number,
+):
+    stored = {"Message": "Order received, processing payment", "OrderId": "ORD0000042"}
+    stub_idempotency_record(
+        ddb_client_stub,
+        "key-1",
+        {
+            "Status": "COMPLETED",
+            "RequestHash": request_hash(POST_ORDER_INPUT_JSON),
+            "Response": json.dumps(stored),
+        },
+    )
+
+    # no order number, order or execution for a replayed request
+    response = post_order(stub_api_client, "key-1")
+    assert response.status_code == 200
+    assert response.json_body == stored
+    assert response.headers["Idempotent-Replayed"] == "true"
+    stub_generate_order_number.assert_not_called()
+    ddb_client_stub.assert_no_pending_responses()
+
+
+def test_post_order_with_idempotency_key_in_use(
+    ddb_client_stub: Stubber,
+    stub_api_client: Client,
+    stub_generate_order_number,
+):
+    stub_idempotency_record(
+        ddb_client_stub,
+        "key-1",
+        {"Status": "IN_PROGRESS", "RequestHash": request_hash(POST_ORDER_INPUT_JSON)},
+    )
+
+    response = post_order(stub_api_client, "key-1")
+    assert response.status_code == 409
+    stub_generate_order_number.assert_not_called()
+
+
+def test_post_order_with_idempotency_key_of_another_order(
+    ddb_client_stub: Stubber,
+    stub_api_client: Client,
+    stub_generate_order_number,
+):
+    stub_idempotency_record(
+        ddb_client_stub,
+        "key-1",
+        {"Status": "COMPLETED", "RequestHash": "other-hash", "Response": "{}"},
+    )
+
+    response = post_order(stub_api_client, "key-1")
+    assert response.status_code == 422
+    stub_generate_order_number.assert_not_called()
+
+
+def test_post_order_releases_the_idempotency_key_on_failure(
+    ddb_client_stub: Stubber,
+    stub_api_client: Client,
+):
+    ddb_client_stub.add_response(
+        method="put_item", expected_params=idempotency_claim("key-1"), service_response={}
+    )
+    ddb_client_stub.add_client_error(
+        method="transact_write_items", service_error_code="InternalServerError"
+    )
+    ddb_client_stub.add_response(
+        method="delete_item",
+        expected_params={
+            "TableName": TABLENAME,
+            "Key": {"pkey": "idempotency#key-1"},
+            "ConditionExpression": "#status = :in_progress",
+            "ExpressionAttributeNames": {"#status": "Status"},
+            "ExpressionAttributeValues": {":in_progress": "IN_PROGRESS"},
+        },
+        service_response={},
+    )
+
+    response = post_order(stub_api_client, "key-1")
+    assert response.status_code == 500
+    ddb_client_stub.assert_no_pending_responses()
+
+
+def test_post_order_with_invalid_idempotency_key(stub_api_client: Client):
+    response = post_order(stub_api_client, "k" * 256)
+    assert response.status_code == 400
+
+
 def test_get_order_with_valid_orderid(
     ddb_client_stub: Stubber,
     stub_api_client: Client,
@@ -93,6 +253,89 @@ def test_get_order_with_valid_orderid(
     assert response.json_body == DB_GET_ITEM_ORDER_DETAILS
 
 
+def stub_get_order(ddb_client_stub, order):
+    ddb_client_stub.add_response(
+        method="get_item",
+        expected_params={"Key": {"pkey": order["pkey"]}, "TableName": TABLENAME},
+        service_response={"Item": utils.serialize_json_to_db(order)},
+    )
+
+
+def test_get_order_returns_an_etag(ddb_client_stub: Stubber, stub_api_client: Client):
+    stub_get_order(ddb_client_stub, DB_GET_ITEM_ORDER_DETAILS)
+
+    response = stub_api_client.http.get("/order/ORD0000001", headers=utils.generate_headers())
+
+    assert response.status_code == 200
+    # dynamodb numbers are sent back as they were received
+    assert isinstance(response.json_body["Amount"], int)
+    assert response.headers["ETag"].startswith('"')
+    # the order is still processing, clients revalidate it
+    assert response.headers["Cache-Control"] == "no-cache"
+
+
+def test_get_unchanged_order_is_not_modified(
+    ddb_client_stub: Stubber,
+    stub_api_client: Client,
+):
+    stub_get_order(ddb_client_stub, DB_GET_ITEM_ORDER_DETAILS)
+    stub_get_order(ddb_client_stub, DB_GET_ITEM_ORDER_DETAILS)
+    etag = stub_api_client.http.get(
+        "/order/ORD0000001", headers=utils.generate_headers()
+    ).headers["ETag"]
+
+    response = stub_api_client.http.get(
+        "/order/ORD0000001",
+        headers={**utils.generate_headers(), "If-None-Match": f'"other", W/{etag}'},
+    )
+
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["ETag"] == etag
+
+
+def test_get_changed_order_is_returned(ddb_client_stub: Stubber, stub_api_client: Client):
+    stub_get_order(ddb_client_stub, DB_GET_ITEM_ORDER_DETAILS)
+    stub_get_order(ddb_client_stub, DB_ORDER_STATUS_PLACED)
+    etag = stub_api_client.http.get(
+        "/order/ORD0000001", headers=utils.generate_headers()
+    ).headers["ETag"]
+
+    response = stub_api_client.http.get(
+        "/order/ORD0000001",
+        headers={**utils.generate_headers(), "If-None-Match": etag},
+    )
+
+    assert response.status_code == 200
+    assert response.json_body == DB_ORDER_STATUS_PLACED
+    assert response.headers["ETag"] != etag
+
+
+def test_get_order_in_terminal_status_is_cacheable(
+    ddb_client_stub: Stubber,
+    stub_api_client: Client,
+):
+    stub_get_order(ddb_client_stub, DB_ORDER_STATUS_COMPLETED)
+
+    response = stub_api_client.http.get("/order/ORD0000001", headers=utils.generate_headers())
+
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "public, max-age=86400, immutable"
+
+
+def test_get_failed_order_is_not_cacheable(
+    ddb_client_stub: Stubber,
+    stub_api_client: Client,
+):
+    # a failed order can still be cancelled
+    stub_get_order(ddb_client_stub, {**DB_ORDER_STATUS_COMPLETED, "Status": "FAILED"})
+
+    response = stub_api_client.http.get("/order/ORD0000001", headers=utils.generate_headers())
+
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "no-cache"
+
+
 def test_get_order_with_ivalid_orderid_format(
     ddb_client_stub: Stubber,
     stub_api_client: Client,
@@ -146,42 +389,342 @@ def test_get_order_with_orderid_doesnt_exist(
 
 def test_cancel_PLACED_order(
     ddb_client_stub: Stubber,
-    stepfunction_client_stub: Stubber,
     stub_api_client: Client,
 ):
-    # mock db put_item call to store new record
+    # the order and its outbox record are written in one transaction,
+    # payment processing is started by the outbox relay
     ddb_client_stub.add_response(
-        method="put_item",
+        method="transact_write_items",
+        expected_params=utils.outbox_transaction(DB_PUT_ITEM_EXPECTED_PARAMS),
+        service_response={},
+    )
+
+    # Creating new Order
+    response = stub_api_client.http.post(
+        "/order",
+        headers=utils.generate_headers(),
+        body=utils.json_to_str(POST_ORDER_INPUT_JSON),
+    )
+
+    assert response.status_code == 200
+    assert response.json_body == {
+        "OrderId": "ORD0000001",
+        "Message": "Order received, processing payment",
+    }
+
+
+def test_cancel_order_is_a_single_conditional_update(
+    ddb_client_stub: Stubber,
+    stub_api_client: Client,
+):
+    # one UpdateItem, returning the order as it was before cancelling it
+    ddb_client_stub.add_response(
+        method="update_item",
         expected_params={
-            "Item": DB_PUT_ITEM_EXPECTED_PARAMS,
             "TableName": TABLENAME,
+            "Key": {"pkey": "ORD0000001"},
+            "UpdateExpression": "SET #status = :to",
+            "ConditionExpression": ANY,
+            "ExpressionAttributeNames": {"#status": "Status"},
+            "ExpressionAttributeValues": ANY,
+            "ReturnValues": "ALL_OLD",
+            "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
         },
-        service_response={},
+        service_response={
+            "Attributes": utils.serialize_json_to_db(DB_ORDER_STATUS_PLACED)
+        },
+    )
+
+    response = stub_api_client.http.put(
+        "/cancel/ORD0000001",
+        headers=utils.generate_headers(),
+    )
+
+    assert response.status_code == 200
+    assert response.json_body == {"Message": "Order is cancelled, your refund is initiated"}
+
+
+def test_cancel_COMPLETED_order(
+    ddb_client_stub: Stubber,
+    stub_api_client: Client,
+):
+    # condition fails, the order is returned as it is
+    ddb_client_stub.add_client_error(
+        method="update_item",
+        service_error_code="ConditionalCheckFailedException",
+        http_status_code=400,
+        modeled_fields={"Item": utils.serialize_json_to_db(DB_ORDER_STATUS_COMPLETED)},
+    )
+
+    response = stub_api_client.http.put(
+        "/cancel/ORD0000001",
+        headers=utils.generate_headers(),
+    )
+
+    assert response.status_code == 200
+    assert response.json_body == {
+        "Message": "Product already delivered, you can opt for an exchange"
+    }
+
+
+def test_cancel_order_doesnt_exist(
+    ddb_client_stub: Stubber,
+    stub_api_client: Client,
+):
+    ddb_client_stub.add_client_error(
+        method="update_item",
+        service_error_code="ConditionalCheckFailedException",
+        http_status_code=400,
     )
-    # mock stepfunction start_execution to trigger the next steps
-    stepfunction_client_stub.add_response(
-        method="start_execution",
+
+    response = stub_api_client.http.put(
+        "/cancel/ORD0000001",
+        headers=utils.generate_headers(),
+    )
+
+    assert response.status_code == 400
+    assert response.json_body["Message"] == "Order ORD0000001 doesn't exist"
+
+
+def test_get_several_orders(
+    ddb_client_stub: Stubber,
+    stub_api_client: Client,
+):
+    # single BatchGetItem for up to 100 orders
+    ddb_client_stub.add_response(
+        method="batch_get_item",
         expected_params={
-            "stateMachineArn": "TEST_ARN",
-            "name": ANY,
-            "input": ANY,
+            "RequestItems": {
+                TABLENAME: {"Keys": [{"pkey": "ORD0000001"}, {"pkey": "ORD0000002"}]}
+            }
         },
         service_response={
-            "executionArn": "test",
-            "startDate": "2011-11-11 11:11:11",
+            "Responses": {TABLENAME: [utils.serialize_json_to_db(DB_ORDER_STATUS_PLACED)]}
         },
     )
 
-    # Creating new Order
-    response = stub_api_client.http.post(
-        "/order",
+    response = stub_api_client.http.get(
+        "/orders?ids=ORD0000001,ORD0000002",
         headers=utils.generate_headers(),
-        body=utils.json_to_str(POST_ORDER_INPUT_JSON),
     )
 
     assert response.status_code == 200
     assert response.json_body == {
+        "Orders": [DB_ORDER_STATUS_PLACED],
+        "NotFound": ["ORD0000002"],
+    }
+
+
+def test_get_several_orders_with_unprocessed_keys(
+    ddb_client_stub: Stubber,
+    stub_api_client: Client,
+):
+    # ORD0000002 is still unprocessed by the last attempt
+    for attempt in range(6):
+        ddb_client_stub.add_response(
+            method="batch_get_item",
+            service_response={
+                "Responses": {
+                    TABLENAME: [utils.serialize_json_to_db(DB_ORDER_STATUS_PLACED)]
+                    if attempt == 0
+                    else []
+                },
+                "UnprocessedKeys": {TABLENAME: {"Keys": [{"pkey": {"S": "ORD0000002"}}]}},
+            },
+        )
+
+    with patch("common.dynamodb.time.sleep"):
+        response = stub_api_client.http.get(
+            "/orders?ids=ORD0000001,ORD0000002,ORD0000003",
+            headers=utils.generate_headers(),
+        )
+
+    assert response.status_code == 200
+    assert response.json_body == {
+        "Orders": [DB_ORDER_STATUS_PLACED],
+        "NotFound": ["ORD0000003"],
+        "Unprocessed": ["ORD0000002"],
+    }
+
+
+def test_get_several_orders_with_invalid_orderid_format(
+    stub_api_client: Client,
+):
+    # no db call as BadRequest Exception is raised
+    response = stub_api_client.http.get(
+        "/orders?ids=ORD0000001,12345",
+        headers=utils.generate_headers(),
+    )
+
+    assert response.status_code == 400
+    assert "12345" in response.json_body["Message"]
+
+
+def test_post_orders_batch_with_an_invalid_order(
+    ddb_client_stub: Stubber,
+    stub_api_client: Client,
+):
+    # valid orders are written with their outbox records in a single transaction
+    ddb_client_stub.add_response(
+        method="transact_write_items",
+        expected_params=utils.outbox_transaction(
+            {**DB_PUT_ITEM_EXPECTED_PARAMS, "pkey": "ORD0000001"},
+            {
+                **DB_PUT_ITEM_EXPECTED_PARAMS,
+                "pkey": "ORD0000002",
+                "Amount": 200,
+                "Description": "dummy",
+            },
+        ),
+        service_response={},
+    )
+
+    response = stub_api_client.http.post(
+        "/orders/batch",
+        headers=utils.generate_headers(),
+        body=utils.json_to_str(POST_ORDERS_BATCH_INPUT_JSON),
+    )
+
+    assert response.status_code == 200
+    orders = response.json_body["Orders"]
+    assert orders[0] == {
+        "Index": 0,
         "OrderId": "ORD0000001",
         "Message": "Order received, processing payment",
     }
+    assert "Invalid json body" in orders[1]["Error"]
+    assert orders[2] == {
+        "Index": 2,
+        "OrderId": "ORD0000002",
+        "Message": "Order received, processing payment",
+    }
+
+
+def test_post_orders_batch_with_unsaved_orders(
+    ddb_client_stub: Stubber,
+    stub_api_client: Client,
+):
+    # the transaction is cancelled by every attempt
+    for _ in range(6):
+        ddb_client_stub.add_client_error(
+            method="transact_write_items",
+            service_error_code="TransactionCanceledException",
+        )
+
+    with patch("common.dynamodb.time.sleep"):
+        response = stub_api_client.http.post(
+            "/orders/batch",
+            headers=utils.generate_headers(),
+            body=utils.json_to_str([POST_ORDER_INPUT_JSON, POST_ORDER_INPUT_JSON]),
+        )
+
+    orders = response.json_body["Orders"]
+    assert orders[0]["Error"] == "Order couldn't be saved, please try again"
+    assert orders[1]["Error"] == "Order couldn't be saved, please try again"
+
+
+def test_post_orders_batch_with_a_rejected_transaction(
+    ddb_client_stub: Stubber,
+    stub_api_client: Client,
+):
+    # i.e. an order too large, the client gets the result of each order
+    ddb_client_stub.add_client_error(
+        method="transact_write_items",
+        service_error_code="ValidationException",
+    )
+
+    response = stub_api_client.http.post(
+        "/orders/batch",
+        headers=utils.generate_headers(),
+        body=utils.json_to_str([POST_ORDER_INPUT_JSON]),
+    )
+
+    assert response.status_code == 200
+    orders = response.json_body["Orders"]
+    assert orders[0]["Error"] == "Order couldn't be saved, please try again"
+
 
+def test_list_orders_returns_a_cursor_to_the_next_page(
+    ddb_client_stub: Stubber,
+    stub_api_client: Client,
+):
+    last_evaluated_key = {"pkey": "ORD0000001", "OrderedBy": "dummy@dummy.com"}
+    ddb_client_stub.add_response(
+        method="query",
+        expected_params={
+            "TableName": TABLENAME,
+            "IndexName": "OrderedBy-index",
+            "KeyConditionExpression": ANY,
+            "ExpressionAttributeNames": ANY,
+            "ExpressionAttributeValues": {":ordered_by": "dummy@dummy.com"},
+            "Limit": 1,
+        },
+        service_response={
+            "Items": [utils.serialize_json_to_db(DB_ORDER_STATUS_PLACED)],
+            "LastEvaluatedKey": utils.serialize_json_to_db(last_evaluated_key),
+        },
+    )
+    response = stub_api_client.http.get(
+        "/orders?limit=1",
+        headers=utils.generate_headers(),
+    )
+    assert response.status_code == 200
+    assert response.json_body["Orders"] == [DB_ORDER_STATUS_PLACED]
+    cursor = response.json_body["NextCursor"]
+
+    # next page starts after the last order of the previous one
+    ddb_client_stub.add_response(
+        method="query",
+        expected_params={
+            "TableName": TABLENAME,
+            "IndexName": "OrderedBy-index",
+            "KeyConditionExpression": ANY,
+            "ExpressionAttributeNames": ANY,
+            "ExpressionAttributeValues": ANY,
+            "Limit": 1,
+            "ExclusiveStartKey": last_evaluated_key,
+        },
+        service_response={"Items": []},
+    )
+    response = stub_api_client.http.get(
+        f"/orders?limit=1&cursor={cursor}",
+        headers=utils.generate_headers(),
+    )
+    assert response.status_code == 200
+    assert response.json_body == {"Orders": [], "NextCursor": None}
+
+
+def test_list_orders_with_invalid_cursor_or_limit(
+    stub_api_client: Client,
+):
+    # no db call as BadRequest Exception is raised
+    response = stub_api_client.http.get(
+        "/orders?cursor=not-a-cursor",
+        headers=utils.generate_headers(),
+    )
+    assert response.status_code == 400
+    assert response.json_body["Message"] == "Query parameter 'cursor' is invalid."
+
+    response = stub_api_client.http.get(
+        "/orders?limit=1000",
+        headers=utils.generate_headers(),
+    )
+    assert response.status_code == 400
+
+
+def test_list_orders_with_a_cursor_that_is_not_a_key_of_the_index(
+    stub_api_client: Client,
+):
+    # no db call, DynamoDB would reject them as ExclusiveStartKey
+    for key in (
+        {"OrderedBy": "dummy@dummy.com"},
+        {"pkey": "ORD0000001"},
+        {"pkey": "ORD0000001", "OrderedBy": "dummy@dummy.com", "Status": "PLACED"},
+        {"pkey": "12345", "OrderedBy": "dummy@dummy.com"},
+    ):
+        response = stub_api_client.http.get(
+            f"/orders?cursor={encode_cursor(key)}",
+            headers=utils.generate_headers(),
+        )
+        assert response.status_code == 400
+        assert response.json_body["Message"] == "Query parameter 'cursor' is invalid."
@@ -0,0 +1,98 @@
+import re
+import random
+import pytest
+from schema import Schema, SchemaError
+from chalicelib.schemas import (
+    compile_schema,
+    is_order_number,
+    validate_post_order,
+    post_order_schema_dict,
+)
+
+post_order_schema = Schema(post_order_schema_dict)
+
+VALUES = ["dummy", "", 100, 0, -1, True, 1.5, None, [], {}, ["dummy"], {"a": 1}]
+KEYS = ["Item", "Amount", "Description", "pkey", "OrderedBy", "Status", ""]
+
+BODIES = [
+    {"Item": "dummy", "Amount": 100},
+    {"Item": "dummy", "Amount": 100, "Description": "dummy"},
+    {"Item": "dummy", "Amount": True},
+    {"Item": "dummy", "Amount": "100"},
+    {"Item": "dummy", "Amount": 100.0},
+    {"Item": "dummy"},
+    {"Amount": 100},
+    {},
+    {"Item": "dummy", "Amount": 100, "Description": None},
+    {"Item": "dummy", "Amount": 100, "pkey": "ORD0000001"},
+    {"Item": "dummy", "Amount": 100, "pkey": 1},
+    {"Item": "dummy", "Amount": 100, "OrderedBy": "dummy@dummy.com"},
+    {"Item": "dummy", "Amount": 100, "Status": "PLACED"},
+    None,
+    "dummy",
+    100,
+    [{"Item": "dummy", "Amount": 100}],
+]
+
+
+def random_bodies(count, seed=0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        keys = rng.sample(KEYS, rng.randint(0, len(KEYS)))
+        yield {key: rng.choice(VALUES) for key in keys}
+
+
+def schema_accepts(body):
+    try:
+        post_order_schema.validate(body)
+    except SchemaError:
+        return False
+    return True
+
+
+def compiled_accepts(body):
+    try:
+        validate_post_order(body)
+    except ValueError:
+        return False
+    return True
+
+
+@pytest.mark.parametrize("body", BODIES)
+def test_compiled_validator_matches_the_schema_library(body):
+    assert compiled_accepts(body) == schema_accepts(body)
+
+
+def test_compiled_validator_matches_the_schema_library_on_random_bodies():
+    mismatches = [
+        body for body in random_bodies(5000) if compiled_accepts(body) != schema_accepts(body)
+    ]
+    assert mismatches == []
+
+
+@pytest.mark.parametrize(
+    "body, message",
+    [
+        ({"Item": "dummy", "Amount": "100"}, "'Amount' should be of type int, got str"),
+        ({"Item": "dummy", "Amount": True}, "'Amount' should be of type int, got bool"),
+        ({"Item": "dummy", "Amount": 100, "pkey": "ORD0000001"}, "Key 'pkey' is not allowed"),
+        ({"Item": "dummy", "Amount": 100, "Status": "PLACED"}, "Unexpected key 'Status'"),
+        ({"Description": "dummy"}, "Missing key(s) 'Item', 'Amount'"),
+        (["dummy"], "Expected a json object, got list"),
+    ],
+)
+def test_errors_point_at_the_invalid_key(body, message):
+    with pytest.raises(ValueError, match=re.escape(message)):
+        validate_post_order(body)
+
+
+def test_unsupported_rules_are_rejected_at_compile_time():
+    with pytest.raises(TypeError):
+        compile_schema({"Amount": lambda amount: amount > 0})
+
+
+@pytest.mark.parametrize(
+    "order_number", ["ORD0000001", "ORD12345678", "ORD000001", "ord0000001", "12345", ""]
+)
+def test_order_number_pattern_matches_the_previous_regex(order_number):
+    assert is_order_number(order_number) == bool(re.match(r"^ORD\d{7,}$", order_number))
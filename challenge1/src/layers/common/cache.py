@@ -0,0 +1,82 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    bounded, thread safe LRU cache whose entries expire `ttl` seconds
+    after they were set, a `max_size` of 0 disables it.
+
+    Values read from a remote store should be added with `set_if_unchanged`
+    using the `stamp` taken before the read, so a read racing with a local
+    write can never overwrite the value that write cached.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stamp = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def get(self, key):
+        """
+        get the value cached for `key`, None if missing or expired
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        """
+        cache the value written for `key`
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.stamp += 1
+            self.__store(key, value)
+
+    def set_if_unchanged(self, key, value, stamp):
+        """
+        cache a value read for `key` unless something was written since `stamp`
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if stamp == self.stamp:
+                self.__store(key, value)
+
+    def invalidate(self, key):
+        with self._lock:
+            self.stamp += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.stamp += 1
+            self._entries.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    def __store(self, key, value):
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
@@ -0,0 +1,61 @@
+import os
+import threading
+from functools import lru_cache
+
+# boto3/botocore are only imported when the first client is created,
+# keeping them out of the import time of the lambda handlers
+
+# connection pool per client, should cover the threads a lambda runs
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get("AWS_MAX_POOL_CONNECTIONS", "25"))
+AWS_CONNECT_TIMEOUT = float(os.environ.get("AWS_CONNECT_TIMEOUT", "2"))
+AWS_READ_TIMEOUT = float(os.environ.get("AWS_READ_TIMEOUT", "10"))
+# same variables botocore reads, with adaptive retries by default
+AWS_RETRY_MODE = os.environ.get("AWS_RETRY_MODE", "adaptive")
+AWS_MAX_ATTEMPTS = int(os.environ.get("AWS_MAX_ATTEMPTS", "5"))
+
+# boto3's default session isn't thread safe, clients are created one at a time
+__create_lock = threading.Lock()
+
+
+def client_config(**overrides):
+    """
+    botocore config shared by all clients, `overrides` replace any option
+    i.e. a longer read_timeout for sqs long polling, `max_attempts`
+    replaces the number of attempts made by the retries
+    """
+    max_attempts = overrides.pop("max_attempts", AWS_MAX_ATTEMPTS)
+    options = {
+        "max_pool_connections": AWS_MAX_POOL_CONNECTIONS,
+        "connect_timeout": AWS_CONNECT_TIMEOUT,
+        "read_timeout": AWS_READ_TIMEOUT,
+        "tcp_keepalive": True,
+        "retries": {"mode": AWS_RETRY_MODE, "total_max_attempts": max_attempts},
+    }
+    options.update(overrides)
+    from botocore.config import Config
+
+    return Config(**options)
+
+
+@lru_cache(maxsize=None)
+def get_client(service, **overrides):
+    """
+    boto3 client for `service`, created on first use and
+    then reused by every invocation of the container
+    """
+    import boto3
+
+    with __create_lock:
+        return boto3.client(service, config=client_config(**overrides))
+
+
+@lru_cache(maxsize=None)
+def get_resource(service, **overrides):
+    """
+    boto3 resource for `service`, created on first use and
+    then reused by every invocation of the container
+    """
+    import boto3
+
+    with __create_lock:
+        return boto3.resource(service, config=client_config(**overrides))
@@ -0,0 +1,166 @@
+from decimal import Decimal
+from boto3.dynamodb.types import TypeSerializer, TypeDeserializer
+
+# attributes of an order item and their dynamodb type
+ORDER_ITEM_SCHEMA = {
+    "pkey": "S",
+    "Item": "S",
+    "Description": "S",
+    "Status": "S",
+    "OrderedBy": "S",
+    "Amount": "N",
+}
+
+__serializer = TypeSerializer()
+__deserializer = TypeDeserializer()
+
+
+def encode_value(value):
+    """
+    python value -> dynamodb attribute value, strings and ints are
+    encoded directly, anything else goes through boto3's TypeSerializer
+    """
+    value_type = type(value)
+    if value_type is str:
+        return {"S": value}
+    if value_type is int:
+        return {"N": str(value)}
+    return __serializer.serialize(value)
+
+
+def decode_value(value):
+    """
+    dynamodb attribute value -> python value, same types as boto3's TypeDeserializer
+    """
+    if "S" in value:
+        return value["S"]
+    if "N" in value:
+        return Decimal(value["N"])
+    return __deserializer.deserialize(value)
+
+
+def encode_order_item(item):
+    """
+    encode an order item, attributes outside of the order
+    schema or of an unexpected type use the generic encoder
+    """
+    encoded = {}
+    for key, value in item.items():
+        expected = ORDER_ITEM_SCHEMA.get(key)
+        if expected == "S" and type(value) is str:
+            encoded[key] = {"S": value}
+        elif expected == "N" and type(value) is int:
+            encoded[key] = {"N": str(value)}
+        else:
+            encoded[key] = encode_value(value)
+    return encoded
+
+
+def decode_order_item(item):
+    """
+    decode an order item, attributes outside of the order
+    schema or of an unexpected type use the generic decoder
+    """
+    decoded = {}
+    for key, value in item.items():
+        expected = ORDER_ITEM_SCHEMA.get(key)
+        if expected is not None and expected in value:
+            decoded[key] = value["S"] if expected == "S" else Decimal(value["N"])
+        else:
+            decoded[key] = decode_value(value)
+    return decoded
+
+
+def encode_values(values):
+    return {k: encode_value(v) for k, v in values.items()}
+
+
+class CodecTable:
+    """
+    the subset of the boto3 Table resource used by the common layer,
+    implemented with the low-level client and the order item codec
+    instead of the resource's generic (de)serialization.
+
+    Also provides batch_get_item/transact_write_items
+    with the items in python types, like the resource's client.
+    """
+
+    def __init__(self, client, table_name):
+        self.client = client
+        self.name = table_name
+
+    def get_item(self, Key, **kwargs):
+        response = self.client.get_item(
+            TableName=self.name, Key=encode_values(Key), **kwargs
+        )
+        if "Item" in response:
+            response["Item"] = decode_order_item(response["Item"])
+        return response
+
+    def put_item(self, Item, **kwargs):
+        self.__encode_expression_values(kwargs)
+        return self.client.put_item(
+            TableName=self.name, Item=encode_order_item(Item), **kwargs
+        )
+
+    def delete_item(self, Key, **kwargs):
+        self.__encode_expression_values(kwargs)
+        return self.client.delete_item(
+            TableName=self.name, Key=encode_values(Key), **kwargs
+        )
+
+    def update_item(self, Key, **kwargs):
+        self.__encode_expression_values(kwargs)
+        response = self.client.update_item(
+            TableName=self.name, Key=encode_values(Key), **kwargs
+        )
+        if "Attributes" in response:
+            response["Attributes"] = decode_order_item(response["Attributes"])
+        return response
+
+    def query(self, **kwargs):
+        self.__encode_expression_values(kwargs)
+        if "ExclusiveStartKey" in kwargs:
+            kwargs["ExclusiveStartKey"] = encode_values(kwargs["ExclusiveStartKey"])
+        response = self.client.query(TableName=self.name, **kwargs)
+        response["Items"] = [decode_order_item(i) for i in response["Items"]]
+        if "LastEvaluatedKey" in response:
+            response["LastEvaluatedKey"] = decode_order_item(response["LastEvaluatedKey"])
+        return response
+
+    def batch_get_item(self, RequestItems):
+        request = {
+            table: {**keys, "Keys": [encode_values(key) for key in keys["Keys"]]}
+            for table, keys in RequestItems.items()
+        }
+        response = self.client.batch_get_item(RequestItems=request)
+        response["Responses"] = {
+            table: [decode_order_item(i) for i in items]
+            for table, items in response["Responses"].items()
+        }
+        if response.get("UnprocessedKeys"):
+            response["UnprocessedKeys"] = {
+                table: {**keys, "Keys": [decode_order_item(k) for k in keys["Keys"]]}
+                for table, keys in response["UnprocessedKeys"].items()
+            }
+        return response
+
+    def transact_write_items(self, TransactItems):
+        request = []
+        for action in TransactItems:
+            ((operation, params),) = action.items()
+            params = dict(params)
+            self.__encode_expression_values(params)
+            if "Item" in params:
+                params["Item"] = encode_order_item(params["Item"])
+            if "Key" in params:
+                params["Key"] = encode_values(params["Key"])
+            request.append({operation: params})
+        return self.client.transact_write_items(TransactItems=request)
+
+    @staticmethod
+    def __encode_expression_values(kwargs):
+        if "ExpressionAttributeValues" in kwargs:
+            kwargs["ExpressionAttributeValues"] = encode_values(
+                kwargs["ExpressionAttributeValues"]
+            )
@@ -1,50 +1,550 @@
 import os
-import boto3
-from common.errors import ItemNotFound
+import json
+import time
+import random
+import threading
+from common.cache import LRUCache
+from common.serializer import dumps
+from common.clients import get_client, get_resource
+from common.utils import ORDER_STATUS_TRANSITIONS
+from common.errors import (
+    ItemNotFound,
+    IdempotencyKeyInUse,
+    IdempotencyKeyMismatch,
+    InvalidStatusTransition,
+    BatchOperationIncomplete,
+)
 from aws_lambda_powertools.logging import Logger
 
 __table = None
+__table_lock = threading.Lock()
+# boto3 resources aren't thread safe, each thread gets its own Table
+__thread_tables = threading.local()
 logger = Logger()
-orders_table = os.environ["ORDERS_TABLE"]
 
-db_resource = boto3.resource("dynamodb")
+ORDER_NUMBER_PREFIX = "ORD"
+ORDER_NUMBER_MIN_DIGITS = 7
+ORDER_COUNTER_PKEY = "next_order"
+ORDER_NUMBER_BLOCK_SIZE = int(os.environ.get("ORDER_NUMBER_BLOCK_SIZE", "50"))
+ORDER_COUNTER_SHARDS = int(os.environ.get("ORDER_COUNTER_SHARDS", "1"))
+
+BATCH_GET_MAX_KEYS = 100
+BATCH_MAX_ATTEMPTS = 6
+BATCH_RETRY_BASE_DELAY = 0.05
+# orders written per TransactWriteItems, each along with its outbox record
+TRANSACT_MAX_ORDERS = 50
+
+# outbox records are written with their order and relayed from the table's
+# stream to the payment state machine, they expire once relayed
+OUTBOX_PKEY_PREFIX = "outbox#"
+OUTBOX_TTL_SECONDS = int(os.environ.get("OUTBOX_TTL_SECONDS", "86400"))
+# an outbox record is marked while its express execution is started, a
+# mark left by a relay that couldn't remove it can be taken over after
+# EXECUTION_START_CLAIM_SECONDS, longer than a relay invocation
+EXECUTION_START_CLAIM_SECONDS = int(os.environ.get("EXECUTION_START_CLAIM_SECONDS", "60"))
+
+# POST /order requests sent with an Idempotency-Key get the response of the
+# first request with that key for IDEMPOTENCY_TTL_SECONDS. A key is locked
+# while its request is processed, the lock is released after
+# IDEMPOTENCY_LOCK_SECONDS if the lambda dies meanwhile
+IDEMPOTENCY_PKEY_PREFIX = "idempotency#"
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get("IDEMPOTENCY_LOCK_SECONDS", "60"))
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "1000"))
+IDEMPOTENCY_IN_PROGRESS = "IN_PROGRESS"
+IDEMPOTENCY_COMPLETED = "COMPLETED"
+
+# orders cached by each warm container, disabled by default
+ORDERS_CACHE_SIZE = int(os.environ.get("ORDERS_CACHE_SIZE", "0"))
+ORDERS_CACHE_TTL_SECONDS = float(os.environ.get("ORDERS_CACHE_TTL_SECONDS", "5"))
+
+# GSI on OrderedBy and the attributes it projects: ALL, KEYS_ONLY or INCLUDE
+ORDERED_BY_INDEX = "OrderedBy-index"
+ORDERS_INDEX_PROJECTION = os.environ.get("ORDERS_INDEX_PROJECTION", "ALL")
+
+# use the low-level client and the order item codec instead of the Table resource
+ORDERS_LOW_LEVEL_CLIENT = os.environ.get("ORDERS_LOW_LEVEL_CLIENT", "false") == "true"
+
+orders_cache = LRUCache(ORDERS_CACHE_SIZE, ORDERS_CACHE_TTL_SECONDS)
+# completed idempotency records, they don't change until they expire
+idempotency_cache = LRUCache(IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL_SECONDS)
+
+
+def __orders_table_name():
+    return os.environ["ORDERS_TABLE"]
 
 
 def __get_orders_table():
     global __table
-    if __table is None:
-        __table = db_resource.Table(orders_table)
-    return __table
+    if __table is not None:
+        return __table
+    if ORDERS_LOW_LEVEL_CLIENT:
+        # first use may come from several threads at once
+        with __table_lock:
+            if __table is None:
+                from common.codec import CodecTable
 
+                # clients are thread safe, the CodecTable is shared
+                __table = CodecTable(get_client("dynamodb"), __orders_table_name())
+        return __table
+    table = getattr(__thread_tables, "table", None)
+    if table is None:
+        # the Tables share the resource's client, which is thread safe
+        with __table_lock:
+            table = get_resource("dynamodb").Table(__orders_table_name())
+        __thread_tables.table = table
+    return table
 
-def get_item_by_pkey(value, pkey="pkey"):
+
+def __get_batch_client():
+    """
+    client for batch operations, taking and returning python types
+    """
+    if ORDERS_LOW_LEVEL_CLIENT:
+        return __get_orders_table()
+    # the resource's client is thread safe and still (de)serializes values
+    return get_resource("dynamodb").meta.client
+
+
+def __projection(fields):
     """
-    get order details for a given order number
+    ProjectionExpression fetching only `fields`, attribute names are
+    aliased as some (i.e. Status) are dynamodb reserved words
     """
+    names = {f"#f{i}": field for i, field in enumerate(fields)}
+    return {
+        "ProjectionExpression": ", ".join(names),
+        "ExpressionAttributeNames": names,
+    }
+
+
+def get_item_by_pkey(
+    value, pkey="pkey", bypass_cache=False, fields=None, consistent_read=False
+):
+    """
+    get order details for a given order number.
+
+    `fields` limits the attributes fetched, `consistent_read` makes a strongly
+    consistent read. Reads are served from the orders cache when enabled,
+    unless `bypass_cache` or `consistent_read` is set.
+    """
+    cacheable = pkey == "pkey"
+    if cacheable and not (bypass_cache or consistent_read):
+        cached = orders_cache.get(value)
+        if cached is not None:
+            if fields:
+                return {k: cached[k] for k in fields if k in cached}
+            return dict(cached)
+    stamp = orders_cache.stamp
     table = __get_orders_table()
-    details = table.get_item(Key={pkey: value})
+    params = {"Key": {pkey: value}}
+    if fields:
+        params.update(__projection(fields))
+    if consistent_read:
+        params["ConsistentRead"] = True
+    details = table.get_item(**params)
     try:
-        return details["Item"]
+        item = details["Item"]
     except KeyError:
         raise ItemNotFound()
+    # partial items are never cached
+    if cacheable and not fields:
+        orders_cache.set_if_unchanged(value, dict(item), stamp)
+    return item
 
 
-def change_order_status(order_number, new_status):
+def cache_stats():
+    """
+    hits, misses and size of the orders cache
     """
-    change order status
+    return orders_cache.stats()
+
+
+def query_orders_by_customer(ordered_by, limit=None, start_key=None):
+    """
+    get one page of the orders placed by `ordered_by` from the OrderedBy-index,
+    returns the orders and the key to start the next page from (None on the
+    last page). Orders are fetched from the table when the index doesn't
+    project all their attributes
     """
     table = __get_orders_table()
-    order_details = table.get_item(Key={"pkey": order_number})
+    params = {
+        "IndexName": ORDERED_BY_INDEX,
+        "KeyConditionExpression": "#ordered_by = :ordered_by",
+        "ExpressionAttributeNames": {"#ordered_by": "OrderedBy"},
+        "ExpressionAttributeValues": {":ordered_by": ordered_by},
+    }
+    if limit:
+        params["Limit"] = limit
+    if start_key:
+        params["ExclusiveStartKey"] = start_key
+    response = table.query(**params)
+    orders = response["Items"]
+    if ORDERS_INDEX_PROJECTION != "ALL" and orders:
+        keys = [order["pkey"] for order in orders]
+        details = {order["pkey"]: order for order in batch_get_orders(keys)}
+        orders = [details[key] for key in keys if key in details]
+    return orders, response.get("LastEvaluatedKey")
+
+
+def iter_orders_by_customer(ordered_by, page_size=100):
+    """
+    generator going through all the orders placed by `ordered_by`,
+    one page of the OrderedBy-index at a time
+    """
+    start_key = None
+    while True:
+        orders, start_key = query_orders_by_customer(ordered_by, page_size, start_key)
+        yield from orders
+        if not start_key:
+            return
+
+
+def __backoff(attempt):
+    """
+    sleep before retrying unprocessed keys/items, exponential with full jitter
+    """
+    time.sleep(random.uniform(0, BATCH_RETRY_BASE_DELAY * 2**attempt))
+
+
+def __batch_get_chunk(keys):
+    """
+    BatchGetItem up to 100 keys, retrying the unprocessed ones.
+    Returns the items and the keys still unprocessed after all retries
+    """
+    client = __get_batch_client()
+    orders_table = __orders_table_name()
+    request = {orders_table: {"Keys": keys}}
+    items = []
+    for attempt in range(BATCH_MAX_ATTEMPTS):
+        if attempt:
+            __backoff(attempt)
+        response = client.batch_get_item(RequestItems=request)
+        items.extend(response["Responses"].get(orders_table, []))
+        request = response.get("UnprocessedKeys")
+        if not request:
+            return items, []
+    return items, request[orders_table]["Keys"]
+
+
+def batch_get_orders(keys, pkey="pkey", max_workers=1):
+    """
+    get orders for the given order numbers with BatchGetItem, chunks are
+    fetched concurrently when `max_workers` > 1. Orders that don't exist
+    are left out and the returned orders are in no particular order.
+    Raises BatchOperationIncomplete listing the keys still unprocessed
+    after all retries, along with the orders fetched
+    """
+    keys = [{pkey: key} for key in dict.fromkeys(keys)]
+    chunks = [
+        keys[i : i + BATCH_GET_MAX_KEYS] for i in range(0, len(keys), BATCH_GET_MAX_KEYS)
+    ]
+    if max_workers > 1 and len(chunks) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+            results = list(executor.map(__batch_get_chunk, chunks))
+    else:
+        results = [__batch_get_chunk(chunk) for chunk in chunks]
+    orders = [item for items, _ in results for item in items]
+    unprocessed = [key for _, keys in results for key in keys]
+    if unprocessed:
+        raise BatchOperationIncomplete(unprocessed, processed=orders)
+    return orders
+
+
+def outbox_record(order):
+    """
+    outbox record asking the relay to start the payment processing of `order`,
+    `Input` is the execution input
+    """
+    return {
+        "pkey": f"{OUTBOX_PKEY_PREFIX}{order['pkey']}",
+        "Input": dumps(order),
+        "TTL": int(time.time()) + OUTBOX_TTL_SECONDS,
+    }
+
+
+def claim_execution_start(order_number):
+    """
+    mark the outbox record of `order_number` before its execution is
+    started, returns False when it was marked already, by an earlier
+    delivery of the record, less than EXECUTION_START_CLAIM_SECONDS ago
+    """
+    from botocore.exceptions import ClientError
+
+    now = int(time.time())
     try:
-        order = order_details["Item"]
-    except KeyError:
-        raise ItemNotFound()
-    if order["Status"] == new_status:
+        __get_orders_table().update_item(
+            Key={"pkey": f"{OUTBOX_PKEY_PREFIX}{order_number}"},
+            UpdateExpression="SET ExecutionStarted = :now",
+            ConditionExpression=(
+                "(attribute_exists(pkey) AND attribute_not_exists(ExecutionStarted)) OR "
+                "ExecutionStarted < :expired"
+            ),
+            ExpressionAttributeValues={
+                ":now": now,
+                ":expired": now - EXECUTION_START_CLAIM_SECONDS,
+            },
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return False
+    return True
+
+
+def release_execution_start(order_number):
+    """
+    unmark the outbox record of an order whose execution failed to start,
+    so a retry of the record starts it
+    """
+    __get_orders_table().update_item(
+        Key={"pkey": f"{OUTBOX_PKEY_PREFIX}{order_number}"},
+        UpdateExpression="REMOVE ExecutionStarted",
+        ConditionExpression="attribute_exists(pkey)",
+    )
+
+
+def __transact_put_orders(orders, puts=()):
+    """
+    write `orders` and their outbox records in a single TransactWriteItems,
+    along with the other `puts` actions
+    """
+    client = __get_batch_client()
+    orders_table = __orders_table_name()
+    client.transact_write_items(
+        TransactItems=[
+            {"Put": {"TableName": orders_table, "Item": item}}
+            for order in orders
+            for item in (order, outbox_record(order))
+        ]
+        + [{"Put": {"TableName": orders_table, **put}} for put in puts]
+    )
+
+
+def put_order_with_outbox(
+    item_details, idempotency_key=None, request_hash=None, response=None
+):
+    """
+    add a new order to the table along with its outbox record,
+    both are written or none is.
+
+    With an `idempotency_key` claimed by claim_idempotency_key, `response`
+    is stored as the response to the key in the same transaction
+    """
+    logger.info(f"Adding item: {item_details} and its outbox record to the table")
+    puts = ()
+    if idempotency_key is not None:
+        puts = [__complete_idempotency_record(idempotency_key, request_hash, response)]
+    __transact_put_orders([item_details], puts)
+    orders_cache.set(item_details["pkey"], dict(item_details))
+    if idempotency_key is not None:
+        idempotency_cache.set(idempotency_key, (request_hash, response))
+
+
+def __transact_put_chunk(orders):
+    """
+    __transact_put_orders retrying the transactions cancelled by
+    conflicts, returns whether the orders were written
+    """
+    from botocore.exceptions import ClientError
+
+    for attempt in range(BATCH_MAX_ATTEMPTS):
+        if attempt:
+            __backoff(attempt)
+        try:
+            __transact_put_orders(orders)
+            return True
+        except ClientError as e:
+            # conflicts with another transaction are retried, other
+            # errors (i.e. a transaction over the size limits) are not
+            if e.response["Error"]["Code"] != "TransactionCanceledException":
+                logger.exception(f"Couldn't add {len(orders)} orders to the table")
+                return False
+    return False
+
+
+def put_orders_with_outbox(items):
+    """
+    add new orders along with their outbox records, 50 orders per transaction.
+    Raises BatchOperationIncomplete listing the orders of the transactions
+    still cancelled after all retries or that failed otherwise, the other
+    transactions are committed either way
+    """
+    logger.info(f"Adding {len(items)} items and their outbox records to the table")
+    unprocessed = []
+    for i in range(0, len(items), TRANSACT_MAX_ORDERS):
+        chunk = items[i : i + TRANSACT_MAX_ORDERS]
+        if not __transact_put_chunk(chunk):
+            unprocessed.extend(chunk)
+            continue
+        for item in chunk:
+            orders_cache.set(item["pkey"], dict(item))
+    if unprocessed:
+        raise BatchOperationIncomplete(unprocessed)
+
+
+def __condition_check_item(error):
+    """
+    item returned by a ConditionalCheckFailedException with
+    ReturnValuesOnConditionCheckFailure, the Table resource
+    doesn't deserialize it
+    """
+    from common.codec import decode_order_item
+
+    return decode_order_item(error.response["Item"])
+
+
+def claim_idempotency_key(idempotency_key, request_hash):
+    """
+    lock `idempotency_key` for a new request with a conditional write, returns
+    the response stored for the key instead when its request was completed.
+
+    Raises IdempotencyKeyInUse while another request holds the key and
+    IdempotencyKeyMismatch when the key was used for a different request
+    """
+    from botocore.exceptions import ClientError
+
+    cached = idempotency_cache.get(idempotency_key)
+    if cached is not None:
+        cached_hash, response = cached
+        if cached_hash != request_hash:
+            raise IdempotencyKeyMismatch(idempotency_key)
+        return response
+
+    now = int(time.time())
+    table = __get_orders_table()
+    try:
+        table.put_item(
+            Item={
+                "pkey": f"{IDEMPOTENCY_PKEY_PREFIX}{idempotency_key}",
+                "Status": IDEMPOTENCY_IN_PROGRESS,
+                "RequestHash": request_hash,
+                "LockExpiry": now + IDEMPOTENCY_LOCK_SECONDS,
+                "TTL": now + IDEMPOTENCY_TTL_SECONDS,
+            },
+            # records expired but not yet deleted by the ttl are ignored, a
+            # lock left by a lambda that died can be taken over
+            ConditionExpression=(
+                "attribute_not_exists(pkey) OR #ttl < :now OR "
+                "(#status = :in_progress AND LockExpiry < :now)"
+            ),
+            ExpressionAttributeNames={"#status": "Status", "#ttl": "TTL"},
+            ExpressionAttributeValues={":in_progress": IDEMPOTENCY_IN_PROGRESS, ":now": now},
+            ReturnValuesOnConditionCheckFailure="ALL_OLD",
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        record = __condition_check_item(e)
+        if record["RequestHash"] != request_hash:
+            raise IdempotencyKeyMismatch(idempotency_key)
+        if record["Status"] != IDEMPOTENCY_COMPLETED:
+            raise IdempotencyKeyInUse(idempotency_key)
+        response = json.loads(record["Response"])
+        idempotency_cache.set(idempotency_key, (request_hash, response))
+        logger.info(f"Idempotency key {idempotency_key} already completed")
+        return response
+    return None
+
+
+def release_idempotency_key(idempotency_key):
+    """
+    unlock a key whose request failed so it can be retried right away
+    """
+    from botocore.exceptions import ClientError
+
+    try:
+        __get_orders_table().delete_item(
+            Key={"pkey": f"{IDEMPOTENCY_PKEY_PREFIX}{idempotency_key}"},
+            ConditionExpression="#status = :in_progress",
+            ExpressionAttributeNames={"#status": "Status"},
+            ExpressionAttributeValues={":in_progress": IDEMPOTENCY_IN_PROGRESS},
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+
+
+def __complete_idempotency_record(idempotency_key, request_hash, response):
+    """
+    Put action storing `response` on a key locked by claim_idempotency_key
+    """
+    return {
+        "Item": {
+            "pkey": f"{IDEMPOTENCY_PKEY_PREFIX}{idempotency_key}",
+            "Status": IDEMPOTENCY_COMPLETED,
+            "RequestHash": request_hash,
+            "Response": dumps(response),
+            "TTL": int(time.time()) + IDEMPOTENCY_TTL_SECONDS,
+        },
+        "ConditionExpression": "#status = :in_progress",
+        "ExpressionAttributeNames": {"#status": "Status"},
+        "ExpressionAttributeValues": {":in_progress": IDEMPOTENCY_IN_PROGRESS},
+    }
+
+
+def __compile_status_transition(new_status):
+    """
+    build the conditional UpdateItem arguments moving an order to `new_status`
+    from any of the statuses it is allowed to be moved from
+    """
+    allowed = ORDER_STATUS_TRANSITIONS[new_status]
+    placeholders = [f":from{i}" for i in range(len(allowed))]
+    return {
+        "UpdateExpression": "SET #status = :to",
+        "ConditionExpression": (
+            f"attribute_exists(pkey) AND #status IN ({', '.join(placeholders)})"
+        ),
+        "ExpressionAttributeNames": {"#status": "Status"},
+        "ExpressionAttributeValues": {":to": new_status, **dict(zip(placeholders, allowed))},
+        "ReturnValues": "ALL_OLD",
+        "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+    }
+
+
+__status_transitions = {
+    status: __compile_status_transition(status) for status in ORDER_STATUS_TRANSITIONS
+}
+
+
+def transition_order_status(order_number, new_status):
+    """
+    move an order to `new_status` with a single conditional write,
+    returns the order as it was before the change
+    """
+    from botocore.exceptions import ClientError
+
+    table = __get_orders_table()
+    try:
+        response = table.update_item(
+            Key={"pkey": order_number}, **__status_transitions[new_status]
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        if "Item" not in e.response:
+            orders_cache.invalidate(order_number)
+            raise ItemNotFound()
+        order = __condition_check_item(e)
+        orders_cache.set(order_number, dict(order))
+        if order["Status"] != new_status:
+            raise InvalidStatusTransition(order_number, new_status, order)
         logger.info(f"Order Status of {order_number} already set to {new_status}")
-    else:
-        logger.info(f"Updating order Status of {order_number} to {new_status}")
-        order["Status"] = new_status
-        table.put_item(Item=order)
+        return order
+    logger.info(f"Updated order Status of {order_number} to {new_status}")
+    orders_cache.set(order_number, {**response["Attributes"], "Status": new_status})
+    return response["Attributes"]
+
+
+def change_order_status(order_number, new_status):
+    """
+    change order status, returns the updated order
+    """
+    order = transition_order_status(order_number, new_status)
+    order["Status"] = new_status
+    return order
 
 
 def order_table_put_item(item_details):
@@ -54,6 +554,88 @@ def order_table_put_item(item_details):
     table = __get_orders_table()
     logger.info(f"Adding item: {item_details} to the table")
     table.put_item(Item=item_details)
+    if "pkey" in item_details:
+        orders_cache.set(item_details["pkey"], dict(item_details))
+
+
+def lease_order_number_block(size, counter_pkey=ORDER_COUNTER_PKEY):
+    """
+    atomically reserve `size` numbers on the order counter, returns the
+    first number of the block and the number right after its last one
+    """
+    table = __get_orders_table()
+    response = table.update_item(
+        Key={"pkey": counter_pkey},
+        UpdateExpression="ADD #number :block",
+        ExpressionAttributeNames={"#number": "number"},
+        ExpressionAttributeValues={":block": size},
+        ReturnValues="UPDATED_NEW",
+    )
+    last_number = int(response["Attributes"]["number"])
+    return last_number - size + 1, last_number + 1
+
 
+def format_order_number(number):
+    """
+    convert a sequence number to its order number i.e. 1 -> ORD0000001,
+    numbers above 9999999 simply get more digits
+    """
+    return f"{ORDER_NUMBER_PREFIX}{number:0{ORDER_NUMBER_MIN_DIGITS}d}"
 
 
+class OrderNumberAllocator:
+    """
+    hands out order numbers from blocks leased off the atomic order counter,
+    so only one in `block_size` orders costs a round trip to the table.
+
+    With `shards` > 1 every allocator leases from one of `shards` counter
+    items (next_order#<shard>) and interleaves its numbers with the others,
+    i.e. sequence n of shard k is order number n * shards + k. The number of
+    shards must therefore never change once orders were created with it.
+    Numbers left in a block when a container is recycled are never used.
+    """
+
+    def __init__(
+        self, block_size=ORDER_NUMBER_BLOCK_SIZE, shards=ORDER_COUNTER_SHARDS, shard=None
+    ):
+        self.block_size = block_size
+        self.shards = shards
+        self.shard = random.randrange(shards) if shard is None else shard
+        self.round_trips = 0
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    @property
+    def counter_pkey(self):
+        if self.shards == 1:
+            return ORDER_COUNTER_PKEY
+        return f"{ORDER_COUNTER_PKEY}#{self.shard}"
+
+    def allocate(self, count=1):
+        """
+        reserve `count` unique order numbers
+        """
+        sequence = []
+        with self._lock:
+            while len(sequence) < count:
+                if self._next == self._end:
+                    missing = count - len(sequence)
+                    self._next, self._end = lease_order_number_block(
+                        max(self.block_size, missing), self.counter_pkey
+                    )
+                    self.round_trips += 1
+                taken = min(count - len(sequence), self._end - self._next)
+                sequence.extend(range(self._next, self._next + taken))
+                self._next += taken
+        return [format_order_number(n * self.shards + self.shard) for n in sequence]
+
+
+order_number_allocator = OrderNumberAllocator()
+
+
+def allocate_order_numbers(count):
+    """
+    reserve `count` new order numbers
+    """
+    return order_number_allocator.allocate(count)
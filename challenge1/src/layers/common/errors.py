@@ -2,4 +2,58 @@ class ItemNotFound(Exception):
     """
     raised when Item is not found
     """
-    pass
\ No newline at end of file
+    pass
+
+
+class InvalidStatusTransition(Exception):
+    """
+    raised when an order can't be moved from its current status
+    to the requested one, `item` holds the order as it is
+    """
+
+    def __init__(self, order_number, new_status, item):
+        super().__init__(
+            f"Order {order_number} can't move from {item['Status']} to {new_status}"
+        )
+        self.item = item
+
+
+class BatchOperationIncomplete(Exception):
+    """
+    raised when a batch operation still has unprocessed
+    keys or items after all retries, `processed` holds the
+    results of the others when the operation returns some
+    """
+
+    def __init__(self, unprocessed, processed=None):
+        super().__init__(f"{len(unprocessed)} keys/items left unprocessed")
+        self.unprocessed = unprocessed
+        self.processed = processed or []
+
+
+class InvalidToken(Exception):
+    """
+    raised when a token is malformed, expired, badly
+    signed or doesn't carry the expected claims
+    """
+    pass
+
+
+class IdempotencyKeyInUse(Exception):
+    """
+    raised while the request that claimed an idempotency key is processed
+    """
+
+    def __init__(self, idempotency_key):
+        super().__init__(f"Idempotency key {idempotency_key} is in use")
+        self.idempotency_key = idempotency_key
+
+
+class IdempotencyKeyMismatch(Exception):
+    """
+    raised when an idempotency key is reused for a different request
+    """
+
+    def __init__(self, idempotency_key):
+        super().__init__(f"Idempotency key {idempotency_key} was used for another request")
+        self.idempotency_key = idempotency_key
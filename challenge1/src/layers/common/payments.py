@@ -0,0 +1,80 @@
+import os
+import time
+import random
+from common.clients import get_client
+from common.serializer import dumps
+from aws_lambda_powertools.logging import Logger
+
+logger = Logger()
+
+# attempts to start an express execution, see start_payment_processing
+EXPRESS_START_ATTEMPTS = 5
+EXPRESS_START_RETRY_BASE_DELAY = 0.05
+
+
+def start_payment_processing(order):
+    """
+    trigger the step function processing the payment of a new order
+    """
+    execution = {
+        "stateMachineArn": os.environ["PAYMENT_PROCESSOR_SF_ARN"],
+        "name": f"process_payment_{order['pkey']}",
+        "input": dumps(order),
+    }
+    if os.environ.get("PAYMENT_PROCESSOR_SF_TYPE", "STANDARD") != "EXPRESS":
+        from botocore.exceptions import ClientError
+
+        # standard executions are deduplicated by name, retries are safe.
+        # Starting a name whose execution already closed fails instead, the
+        # payment of a replayed outbox record was started already
+        try:
+            get_client("stepfunctions").start_execution(**execution)
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ExecutionAlreadyExists":
+                raise
+            logger.info(f"Payment processing of {order['pkey']} was already started")
+        return
+
+    # express executions aren't, the outbox record is marked before the
+    # start so a replayed record doesn't start a second execution
+    from common.dynamodb import claim_execution_start, release_execution_start
+
+    if not claim_execution_start(order["pkey"]):
+        logger.info(f"Payment processing of {order['pkey']} was already started")
+        return
+    try:
+        __start_express_execution(execution)
+    except Exception:
+        # the start may still have gone through on an ambiguous error,
+        # a retry of the record then starts a second execution
+        try:
+            release_execution_start(order["pkey"])
+        except Exception:
+            # the mark expires, a later retry of the record takes it over
+            logger.exception(f"Outbox record of {order['pkey']} couldn't be unmarked")
+        raise
+
+
+def __start_express_execution(execution):
+    """
+    a start is only retried when the error guarantees no execution was started
+    """
+    from botocore.exceptions import (
+        ClientError,
+        ConnectTimeoutError,
+        EndpointConnectionError,
+    )
+
+    sf_client = get_client("stepfunctions", max_attempts=1)
+    for attempt in range(1, EXPRESS_START_ATTEMPTS + 1):
+        try:
+            sf_client.start_execution(**execution)
+            return
+        except ClientError as e:
+            throttled = e.response["Error"]["Code"] == "ThrottlingException"
+            if not throttled or attempt == EXPRESS_START_ATTEMPTS:
+                raise
+        except (ConnectTimeoutError, EndpointConnectionError):
+            if attempt == EXPRESS_START_ATTEMPTS:
+                raise
+        time.sleep(random.uniform(0, EXPRESS_START_RETRY_BASE_DELAY * 2**attempt))
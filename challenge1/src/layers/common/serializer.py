@@ -0,0 +1,46 @@
+import json
+import datetime
+from decimal import Decimal
+
+# orjson is shipped with the layer, the standard library encoder is
+# used where it isn't installed
+try:
+    import orjson
+except ModuleNotFoundError:
+    orjson = None
+
+
+def to_json_compatible(value):
+    """
+    json value of the types dynamodb and the orders use but json doesn't
+    know, called by the encoder for those only so items aren't copied
+    """
+    if isinstance(value, Decimal):
+        # dynamodb numbers, Amount is an int
+        if value == value.to_integral_value():
+            return int(value)
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        # string and number sets, sorted so the output is stable
+        return sorted(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# encoders are reused, json.dumps creates a new one per call when given options
+__encoder = json.JSONEncoder(separators=(",", ":"), default=to_json_compatible)
+__sorted_encoder = json.JSONEncoder(
+    separators=(",", ":"), sort_keys=True, default=to_json_compatible
+)
+
+
+def dumps(value, sort_keys=False):
+    """
+    compact json of an order, a list of orders or any response body
+    """
+    if orjson is not None:
+        # non-str keys are turned into strings like the standard library does
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(value, default=to_json_compatible, option=option).decode()
+    return (__sorted_encoder if sort_keys else __encoder).encode(value)
@@ -0,0 +1,128 @@
+import hmac
+import json
+import time
+import base64
+import hashlib
+import threading
+from common.errors import InvalidToken
+
+# HMAC algorithms a token can be signed with, "alg" header of the JWT
+ALGORITHMS = {
+    "HS256": hashlib.sha256,
+    "HS384": hashlib.sha384,
+    "HS512": hashlib.sha512,
+}
+# seconds of clock drift tolerated on the exp/nbf/iat claims
+CLOCK_SKEW_SECONDS = 30
+
+
+class SigningKeys:
+    """
+    thread safe cache of the signing keys by key id, loaded with `load` on
+    first use and reloaded every `ttl` seconds.
+
+    A token signed with an unknown key id also triggers a reload, so a
+    rotated key is picked up right away, but at most once every
+    `min_reload_interval` seconds so bogus key ids can't flood the key store
+    """
+
+    def __init__(self, load, ttl=300, min_reload_interval=10):
+        self.load = load
+        self.ttl = ttl
+        self.min_reload_interval = min_reload_interval
+        self.loads = 0
+        self._keys = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def get(self, kid):
+        """
+        key for `kid`, None if it doesn't exist
+        """
+        now = time.monotonic()
+        keys = self._keys
+        if keys is None or now - self._loaded_at > self.ttl:
+            keys = self.__reload(now, keys)
+        elif kid not in keys and now - self._loaded_at > self.min_reload_interval:
+            keys = self.__reload(now, keys)
+        return keys.get(kid)
+
+    def __reload(self, now, seen):
+        with self._lock:
+            # another thread may have reloaded the keys meanwhile
+            if self._keys is seen:
+                self._keys = {
+                    kid: key.encode() if isinstance(key, str) else key
+                    for kid, key in self.load().items()
+                }
+                self._loaded_at = now
+                self.loads += 1
+            return self._keys
+
+
+def _b64decode(segment):
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def sign_token(claims, key, kid, algorithm="HS256"):
+    """
+    JWT carrying `claims` signed with `key`, as issued to the API clients
+    """
+    header = {"alg": algorithm, "typ": "JWT", "kid": kid}
+    signing_input = ".".join(
+        _b64encode(json.dumps(part, separators=(",", ":")).encode())
+        for part in (header, claims)
+    )
+    key = key.encode() if isinstance(key, str) else key
+    signature = hmac.new(key, signing_input.encode(), ALGORITHMS[algorithm]).digest()
+    return f"{signing_input}.{_b64encode(signature)}"
+
+
+def verify_token(token, signing_keys, audience=None, issuer=None):
+    """
+    claims of `token` once its signature, expiry and claims are checked,
+    raises InvalidToken otherwise. No remote call is made unless the
+    signing keys need to be (re)loaded
+    """
+    try:
+        header_segment, claims_segment, signature_segment = token.split(".")
+        header = json.loads(_b64decode(header_segment))
+        digest = ALGORITHMS[header["alg"]]
+        key = signing_keys.get(header["kid"])
+        signature = _b64decode(signature_segment)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise InvalidToken("Malformed token")
+    if key is None:
+        raise InvalidToken(f"Unknown signing key {header['kid']}")
+
+    signing_input = f"{header_segment}.{claims_segment}".encode()
+    if not hmac.compare_digest(hmac.new(key, signing_input, digest).digest(), signature):
+        raise InvalidToken("Invalid signature")
+
+    try:
+        claims = json.loads(_b64decode(claims_segment))
+        expires_at = float(claims["exp"])
+        not_before = float(claims.get("nbf", 0))
+    except (ValueError, KeyError, TypeError):
+        raise InvalidToken("Malformed claims")
+    now = time.time()
+    if expires_at < now - CLOCK_SKEW_SECONDS:
+        raise InvalidToken("Token expired")
+    if not_before > now + CLOCK_SKEW_SECONDS:
+        raise InvalidToken("Token not valid yet")
+    if audience is not None and audience not in _as_list(claims.get("aud")):
+        raise InvalidToken("Invalid audience")
+    if issuer is not None and claims.get("iss") != issuer:
+        raise InvalidToken("Invalid issuer")
+    return claims
+
+
+def _as_list(value):
+    # "aud" is either a string or a list of strings
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
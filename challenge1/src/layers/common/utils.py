@@ -4,4 +4,27 @@ class ORDER_LIFE_CYCLE:
     FAILED = "FAILED"
     IN_TRANSIT = "IN_TRANSIT"
     COMPLETED = "COMPLETED"
-    CANCELLED = "CANCELLED"
\ No newline at end of file
+    CANCELLED = "CANCELLED"
+
+
+# statuses an order can be moved to, mapped to the statuses it can be moved from
+ORDER_STATUS_TRANSITIONS = {
+    ORDER_LIFE_CYCLE.PLACED: (ORDER_LIFE_CYCLE.PROCESSING,),
+    ORDER_LIFE_CYCLE.FAILED: (ORDER_LIFE_CYCLE.PROCESSING,),
+    ORDER_LIFE_CYCLE.IN_TRANSIT: (ORDER_LIFE_CYCLE.PLACED,),
+    ORDER_LIFE_CYCLE.COMPLETED: (ORDER_LIFE_CYCLE.IN_TRANSIT,),
+    ORDER_LIFE_CYCLE.CANCELLED: (
+        ORDER_LIFE_CYCLE.PROCESSING,
+        ORDER_LIFE_CYCLE.PLACED,
+        ORDER_LIFE_CYCLE.IN_TRANSIT,
+        ORDER_LIFE_CYCLE.FAILED,
+        ORDER_LIFE_CYCLE.CANCELLED,
+    ),
+}
+
+# statuses an order never leaves, responses showing them can be cached
+# by the clients and CDNs. FAILED orders can still be cancelled
+TERMINAL_ORDER_STATUSES = (
+    ORDER_LIFE_CYCLE.COMPLETED,
+    ORDER_LIFE_CYCLE.CANCELLED,
+)
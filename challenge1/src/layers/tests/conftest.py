@@ -0,0 +1,36 @@
+import os
+
+stub_env_var = {
+    "ORDERS_TABLE": "TEST_TABLE",
+}
+for k, v in stub_env_var.items():
+    os.environ[k] = v
+
+from pytest import fixture
+from unittest.mock import patch
+from botocore.stub import Stubber
+from common import dynamodb
+from common.clients import get_resource
+from local_aws.dynamodb import InMemoryTable
+from boto3.dynamodb.types import TypeSerializer
+
+
+@fixture
+def ddb_client_stub():
+    with Stubber(get_resource("dynamodb").meta.client) as stubbed:
+        yield stubbed
+    stubbed.assert_no_pending_responses()
+
+
+@fixture
+def in_memory_table():
+    # replace the cached boto3 Table with an in-process one
+    table = InMemoryTable()
+    with patch.object(dynamodb, "__table", table):
+        yield table
+
+
+class utils:
+    def serialize_py_to_db(data):
+        serializer = TypeSerializer()
+        return {k: serializer.serialize(v) for k, v in data.items()}
@@ -0,0 +1,7 @@
+DB_ORDER = {
+    "pkey": "ORD0000005",
+    "Item": "test_item",
+    "Description": "Description for item_test",
+    "Amount": 100,
+    "OrderedBy": "dummy@dummy.com",
+}
@@ -0,0 +1,98 @@
+import pytest
+from conftest import utils
+from payload import DB_ORDER
+from unittest.mock import patch
+from botocore.stub import Stubber
+from common.dynamodb import batch_get_orders
+from common.errors import BatchOperationIncomplete
+
+
+def order_numbers(start, stop):
+    return [f"ORD{i:07d}" for i in range(start, stop)]
+
+
+def db_orders(order_numbers):
+    return [utils.serialize_py_to_db({**DB_ORDER, "pkey": i}) for i in order_numbers]
+
+
+def batch_get_request(order_numbers):
+    return {"TEST_TABLE": {"Keys": [{"pkey": i} for i in order_numbers]}}
+
+
+@pytest.fixture(autouse=True)
+def no_backoff():
+    with patch("common.dynamodb.time.sleep") as patched:
+        yield patched
+
+
+def test_keys_are_chunked_by_100(ddb_client_stub: Stubber):
+    keys = order_numbers(1, 151)
+    ddb_client_stub.add_response(
+        method="batch_get_item",
+        expected_params={"RequestItems": batch_get_request(keys[:100])},
+        service_response={"Responses": {"TEST_TABLE": db_orders(keys[:100])}},
+    )
+    ddb_client_stub.add_response(
+        method="batch_get_item",
+        expected_params={"RequestItems": batch_get_request(keys[100:])},
+        service_response={"Responses": {"TEST_TABLE": db_orders(keys[100:])}},
+    )
+
+    orders = batch_get_orders(keys + keys[:10])
+
+    assert sorted(order["pkey"] for order in orders) == keys
+
+
+def test_unprocessed_keys_are_retried(ddb_client_stub: Stubber, no_backoff):
+    keys = order_numbers(1, 4)
+    ddb_client_stub.add_response(
+        method="batch_get_item",
+        expected_params={"RequestItems": batch_get_request(keys)},
+        service_response={
+            "Responses": {"TEST_TABLE": db_orders(keys[:1])},
+            "UnprocessedKeys": {
+                "TEST_TABLE": {"Keys": [{"pkey": {"S": i}} for i in keys[1:]]}
+            },
+        },
+    )
+    ddb_client_stub.add_response(
+        method="batch_get_item",
+        expected_params={"RequestItems": batch_get_request(keys[1:])},
+        service_response={"Responses": {"TEST_TABLE": db_orders(keys[1:])}},
+    )
+
+    orders = batch_get_orders(keys)
+
+    assert sorted(order["pkey"] for order in orders) == keys
+    assert no_backoff.call_count == 1
+
+
+def test_unprocessed_keys_after_all_retries(ddb_client_stub: Stubber):
+    keys = order_numbers(1, 3)
+    for attempt in range(6):
+        ddb_client_stub.add_response(
+            method="batch_get_item",
+            service_response={
+                "Responses": {"TEST_TABLE": db_orders(keys[1:]) if attempt == 0 else []},
+                "UnprocessedKeys": {"TEST_TABLE": {"Keys": [{"pkey": {"S": keys[0]}}]}},
+            },
+        )
+
+    with pytest.raises(BatchOperationIncomplete) as e:
+        batch_get_orders(keys)
+    assert e.value.unprocessed == [{"pkey": keys[0]}]
+    # the orders fetched meanwhile aren't lost
+    assert sorted(order["pkey"] for order in e.value.processed) == keys[1:]
+
+
+def test_chunks_are_fetched_concurrently(ddb_client_stub: Stubber):
+    keys = order_numbers(1, 301)
+    for i in range(0, 300, 100):
+        ddb_client_stub.add_response(
+            method="batch_get_item",
+            service_response={"Responses": {"TEST_TABLE": db_orders(keys[i : i + 100])}},
+        )
+
+    orders = batch_get_orders(keys, max_workers=3)
+
+    assert sorted(order["pkey"] for order in orders) == keys
@@ -0,0 +1,23 @@
+from common.clients import get_client, get_resource
+
+
+def test_clients_are_created_once_per_service():
+    assert get_client("sqs") is get_client("sqs")
+    assert get_client("sqs") is not get_client("stepfunctions")
+    assert get_resource("dynamodb") is get_resource("dynamodb")
+
+
+def test_clients_are_tuned():
+    config = get_client("sqs").meta.config
+    assert config.max_pool_connections == 25
+    assert config.tcp_keepalive is True
+    assert config.connect_timeout == 2
+    assert config.read_timeout == 10
+    assert config.retries == {"mode": "adaptive", "total_max_attempts": 5}
+
+
+def test_config_overrides():
+    client = get_client("sqs", read_timeout=25)
+    assert client is not get_client("sqs")
+    assert client.meta.config.read_timeout == 25
+    assert client.meta.config.tcp_keepalive is True
@@ -0,0 +1,97 @@
+import boto3
+import pytest
+from decimal import Decimal
+from payload import DB_ORDER
+from unittest.mock import patch
+from botocore.stub import Stubber, ANY
+from boto3.dynamodb.types import Binary, TypeSerializer, TypeDeserializer
+from common import dynamodb
+from common.codec import (
+    CodecTable,
+    decode_order_item,
+    encode_order_item,
+)
+from common.dynamodb import get_item_by_pkey, put_order_with_outbox
+
+serializer = TypeSerializer()
+deserializer = TypeDeserializer()
+
+dataset_items = [
+    pytest.param({**DB_ORDER, "Status": "PLACED"}, id="order"),
+    pytest.param({"pkey": "ORD0000001", "Amount": Decimal("10.25")}, id="decimal_amount"),
+    pytest.param({"pkey": "ORD0000001", "Amount": -3}, id="negative_amount"),
+    pytest.param({"pkey": "next_order", "number": 42}, id="counter"),
+    pytest.param({"pkey": "ORD0000001", "Description": ""}, id="empty_string"),
+    pytest.param(
+        {
+            "pkey": "ORD0000001",
+            "Tags": {"a", "b"},
+            "Sizes": {1, 2},
+            "Gift": True,
+            "Note": None,
+            "Lines": [{"Item": "x", "Amount": 1}],
+            "Blob": Binary(b"\x00\x01"),
+            "TTL": 1700000000,
+        },
+        id="unknown_attributes",
+    ),
+    pytest.param({"pkey": "ORD0000001", "Amount": "100"}, id="amount_of_unexpected_type"),
+]
+
+
+@pytest.mark.parametrize("item", dataset_items)
+def test_encode_matches_type_serializer(item):
+    assert encode_order_item(item) == {k: serializer.serialize(v) for k, v in item.items()}
+
+
+@pytest.mark.parametrize("item", dataset_items)
+def test_decode_matches_type_deserializer(item):
+    wire = {k: serializer.serialize(v) for k, v in item.items()}
+    assert decode_order_item(wire) == {k: deserializer.deserialize(v) for k, v in wire.items()}
+
+
+@pytest.mark.parametrize("item", dataset_items)
+def test_round_trip(item):
+    decoded = decode_order_item(encode_order_item(item))
+    assert decoded == {
+        k: deserializer.deserialize(serializer.serialize(v)) for k, v in item.items()
+    }
+
+
+def test_floats_are_rejected_like_type_serializer():
+    with pytest.raises(TypeError):
+        encode_order_item({"pkey": "ORD0000001", "Amount": 1.5})
+
+
+@pytest.fixture
+def low_level_client_stub():
+    client = boto3.client("dynamodb")
+    with patch.object(dynamodb, "__table", CodecTable(client, "TEST_TABLE")), patch.object(
+        dynamodb, "ORDERS_LOW_LEVEL_CLIENT", True
+    ), Stubber(client) as stubbed:
+        yield stubbed
+        stubbed.assert_no_pending_responses()
+
+
+def test_layer_reads_with_the_low_level_client(low_level_client_stub: Stubber):
+    low_level_client_stub.add_response(
+        method="get_item",
+        expected_params={"TableName": "TEST_TABLE", "Key": {"pkey": {"S": DB_ORDER["pkey"]}}},
+        service_response={"Item": encode_order_item(DB_ORDER)},
+    )
+    assert get_item_by_pkey(DB_ORDER["pkey"]) == DB_ORDER
+
+
+def test_layer_transact_writes_with_the_low_level_client(low_level_client_stub: Stubber):
+    low_level_client_stub.add_response(
+        method="transact_write_items",
+        expected_params={
+            "TransactItems": [
+                {"Put": {"TableName": "TEST_TABLE", "Item": encode_order_item(DB_ORDER)}},
+                # the outbox record
+                {"Put": {"TableName": "TEST_TABLE", "Item": ANY}},
+            ]
+        },
+        service_response={},
+    )
+    put_order_with_outbox(DB_ORDER)
\ No newline at end of file
@@ -0,0 +1,74 @@
+import pytest
+from conftest import utils
+from payload import DB_ORDER
+from unittest.mock import patch
+from botocore.stub import Stubber
+from common import dynamodb
+from common.cache import LRUCache
+from common.errors import ItemNotFound
+from common.dynamodb import get_item_by_pkey
+
+DB_ORDER_STATUS_PLACED = {**DB_ORDER, "Status": "PLACED"}
+
+
+def test_get_only_some_fields(ddb_client_stub: Stubber):
+    ddb_client_stub.add_response(
+        method="get_item",
+        expected_params={
+            "TableName": "TEST_TABLE",
+            "Key": {"pkey": DB_ORDER["pkey"]},
+            "ProjectionExpression": "#f0, #f1",
+            "ExpressionAttributeNames": {"#f0": "pkey", "#f1": "Status"},
+        },
+        service_response={
+            "Item": utils.serialize_py_to_db({"pkey": DB_ORDER["pkey"], "Status": "PLACED"})
+        },
+    )
+    order = get_item_by_pkey(DB_ORDER["pkey"], fields=["pkey", "Status"])
+    assert order == {"pkey": DB_ORDER["pkey"], "Status": "PLACED"}
+
+
+def test_strongly_consistent_read(ddb_client_stub: Stubber):
+    ddb_client_stub.add_response(
+        method="get_item",
+        expected_params={
+            "TableName": "TEST_TABLE",
+            "Key": {"pkey": DB_ORDER["pkey"]},
+            "ConsistentRead": True,
+        },
+        service_response={"Item": utils.serialize_py_to_db(DB_ORDER_STATUS_PLACED)},
+    )
+    assert get_item_by_pkey(DB_ORDER["pkey"], consistent_read=True) == DB_ORDER_STATUS_PLACED
+
+
+def test_get_missing_order(ddb_client_stub: Stubber):
+    ddb_client_stub.add_response(method="get_item", service_response={})
+    with pytest.raises(ItemNotFound):
+        get_item_by_pkey(DB_ORDER["pkey"], fields=["Status"])
+
+
+def test_cached_order_serves_projected_reads_but_not_consistent_ones(
+    ddb_client_stub: Stubber,
+):
+    with patch.object(dynamodb, "orders_cache", LRUCache(10, 60)):
+        ddb_client_stub.add_response(
+            method="get_item",
+            service_response={"Item": utils.serialize_py_to_db(DB_ORDER_STATUS_PLACED)},
+        )
+        get_item_by_pkey(DB_ORDER["pkey"])
+        assert get_item_by_pkey(DB_ORDER["pkey"], fields=["Status"]) == {"Status": "PLACED"}
+
+        ddb_client_stub.add_response(
+            method="get_item",
+            expected_params={
+                "TableName": "TEST_TABLE",
+                "Key": {"pkey": DB_ORDER["pkey"]},
+                "ProjectionExpression": "#f0",
+                "ExpressionAttributeNames": {"#f0": "Status"},
+                "ConsistentRead": True,
+            },
+            service_response={"Item": utils.serialize_py_to_db({"Status": "CANCELLED"})},
+        )
+        order = get_item_by_pkey(DB_ORDER["pkey"], fields=["Status"], consistent_read=True)
+        assert order == {"Status": "CANCELLED"}
+        ddb_client_stub.assert_no_pending_responses()
@@ -0,0 +1,162 @@
+import json
+import pytest
+import threading
+from payload import DB_ORDER
+from unittest.mock import patch
+from common import dynamodb
+from common.cache import LRUCache
+from common.errors import IdempotencyKeyInUse, IdempotencyKeyMismatch
+from common.dynamodb import (
+    put_order_with_outbox,
+    claim_idempotency_key,
+    release_idempotency_key,
+)
+
+ORDER = {**DB_ORDER, "Status": "PROCESSING"}
+RESPONSE = {"Message": "Order received, processing payment", "OrderId": ORDER["pkey"]}
+
+
+@pytest.fixture(autouse=True)
+def idempotency_cache():
+    cache = LRUCache(max_size=10, ttl=60)
+    with patch.object(dynamodb, "idempotency_cache", cache):
+        yield cache
+
+
+@pytest.fixture
+def table(in_memory_table):
+    # transactions go through the same in-process table
+    with patch.object(dynamodb, "__get_batch_client", lambda: in_memory_table):
+        yield in_memory_table
+
+
+@pytest.fixture
+def now():
+    with patch("common.dynamodb.time") as patched:
+        patched.time.return_value = 1700000000
+        yield patched.time
+
+
+def create_order(key, request_hash="hash"):
+    """
+    what POST /order does with an Idempotency-Key
+    """
+    response = claim_idempotency_key(key, request_hash)
+    if response is None:
+        put_order_with_outbox(ORDER, key, request_hash, RESPONSE)
+        response = RESPONSE
+    return response
+
+
+def test_first_request_claims_the_key(table, now):
+    assert claim_idempotency_key("key-1", "hash") is None
+
+    assert table.items["idempotency#key-1"] == {
+        "pkey": "idempotency#key-1",
+        "Status": "IN_PROGRESS",
+        "RequestHash": "hash",
+        "LockExpiry": 1700000000 + 60,
+        "TTL": 1700000000 + 86400,
+    }
+
+
+def test_response_is_stored_with_the_order(table, now):
+    claim_idempotency_key("key-1", "hash")
+    put_order_with_outbox(ORDER, "key-1", "hash", RESPONSE)
+
+    assert table.calls["transact_write_items"] == 1
+    assert ORDER["pkey"] in table.items
+    record = table.items["idempotency#key-1"]
+    assert record["Status"] == "COMPLETED"
+    assert json.loads(record["Response"]) == RESPONSE
+
+
+def test_repeated_request_gets_the_stored_response(table, idempotency_cache):
+    create_order("key-1")
+    # another container, without the key cached
+    idempotency_cache.clear()
+
+    assert create_order("key-1") == RESPONSE
+    assert table.calls["transact_write_items"] == 1
+
+
+def test_repeated_request_is_served_from_the_cache(table):
+    create_order("key-1")
+    calls = dict(table.calls)
+
+    assert create_order("key-1") == RESPONSE
+    assert table.calls == calls
+
+
+def test_key_reused_for_another_request_is_rejected(table, idempotency_cache):
+    create_order("key-1", "hash")
+
+    with pytest.raises(IdempotencyKeyMismatch):
+        claim_idempotency_key("key-1", "other-hash")
+    idempotency_cache.clear()
+    with pytest.raises(IdempotencyKeyMismatch):
+        claim_idempotency_key("key-1", "other-hash")
+
+
+def test_key_is_in_use_until_its_request_completes(table, now):
+    claim_idempotency_key("key-1", "hash")
+
+    with pytest.raises(IdempotencyKeyInUse):
+        claim_idempotency_key("key-1", "hash")
+
+
+def test_lock_of_a_dead_request_is_taken_over(table, now):
+    claim_idempotency_key("key-1", "hash")
+    now.return_value += 61
+
+    assert claim_idempotency_key("key-1", "hash") is None
+
+
+def test_expired_record_is_ignored(table, now, idempotency_cache):
+    create_order("key-1", "hash")
+    idempotency_cache.clear()
+    now.return_value += 86401
+
+    # the key can be used again, for any request
+    assert claim_idempotency_key("key-1", "other-hash") is None
+
+
+def test_released_key_can_be_claimed_again(table, now):
+    claim_idempotency_key("key-1", "hash")
+    release_idempotency_key("key-1")
+
+    assert "idempotency#key-1" not in table.items
+    assert claim_idempotency_key("key-1", "hash") is None
+
+
+def test_completed_key_is_not_released(table):
+    create_order("key-1")
+    release_idempotency_key("key-1")
+
+    assert table.items["idempotency#key-1"]["Status"] == "COMPLETED"
+
+
+def test_concurrent_duplicates_create_a_single_order(table):
+    # every thread sends the same request at once
+    barrier = threading.Barrier(8)
+    results, errors = [], []
+
+    def send():
+        barrier.wait()
+        try:
+            results.append(create_order("key-1"))
+        except IdempotencyKeyInUse as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=send) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # one request creates the order, the others are told to retry
+    # or get its response if it completed meanwhile
+    assert results and all(result == RESPONSE for result in results)
+    assert len(results) + len(errors) == 8
+    assert table.calls["transact_write_items"] == 1
+    assert [record["eventName"] for record in table.stream].count("INSERT") == 3
@@ -0,0 +1,66 @@
+from threading import Thread
+from botocore.stub import Stubber
+from common.dynamodb import OrderNumberAllocator, format_order_number
+
+
+def test_allocator_leases_one_block_per_round_trip(ddb_client_stub: Stubber):
+    """
+    a block is reserved with a single atomic counter update
+    and then handed out locally
+    """
+    ddb_client_stub.add_response(
+        method="update_item",
+        expected_params={
+            "TableName": "TEST_TABLE",
+            "Key": {"pkey": "next_order"},
+            "UpdateExpression": "ADD #number :block",
+            "ExpressionAttributeNames": {"#number": "number"},
+            "ExpressionAttributeValues": {":block": 3},
+            "ReturnValues": "UPDATED_NEW",
+        },
+        service_response={"Attributes": {"number": {"N": "13"}}},
+    )
+    allocator = OrderNumberAllocator(block_size=3)
+
+    assert allocator.allocate() == ["ORD0000011"]
+    assert allocator.allocate(2) == ["ORD0000012", "ORD0000013"]
+    assert allocator.round_trips == 1
+
+
+def test_order_numbers_are_not_capped_at_seven_digits():
+    assert format_order_number(7) == "ORD0000007"
+    assert format_order_number(12345678) == "ORD12345678"
+
+
+def test_concurrent_allocators_never_hand_out_duplicates(in_memory_table):
+    """
+    several warm containers, each with several threads,
+    allocate from the same counter
+    """
+    allocators = [OrderNumberAllocator(block_size=7) for _ in range(4)]
+    allocated = []
+
+    def allocate(allocator):
+        for _ in range(250):
+            allocated.extend(allocator.allocate())
+
+    threads = [
+        Thread(target=allocate, args=(allocator,))
+        for allocator in allocators
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(allocated) == 3000
+    assert len(set(allocated)) == 3000
+
+
+def test_sharded_allocators_never_hand_out_duplicates(in_memory_table):
+    allocators = [OrderNumberAllocator(block_size=5, shards=3, shard=i) for i in range(3)]
+    allocated = [n for allocator in allocators for n in allocator.allocate(40)]
+
+    assert len(set(allocated)) == 120
+    assert set(in_memory_table.items) == {"next_order#0", "next_order#1", "next_order#2"}
@@ -0,0 +1,112 @@
+import pytest
+from threading import Thread
+from conftest import utils
+from payload import DB_ORDER
+from botocore.stub import Stubber
+from common import dynamodb
+from common.utils import ORDER_STATUS_TRANSITIONS
+from common.errors import ItemNotFound, InvalidStatusTransition
+from common.dynamodb import change_order_status, transition_order_status
+
+dataset_allowed_transitions = [
+    pytest.param(current, new, id=f"{current}->{new}")
+    for new, allowed in ORDER_STATUS_TRANSITIONS.items()
+    for current in allowed
+]
+
+
+@pytest.mark.parametrize("current, new", dataset_allowed_transitions)
+def test_transition_is_a_single_update_item(ddb_client_stub: Stubber, current, new):
+    """
+    every allowed transition costs exactly one dynamodb call,
+    the stubber fails on any additional one
+    """
+    ddb_client_stub.add_response(
+        method="update_item",
+        service_response={
+            "Attributes": utils.serialize_py_to_db({**DB_ORDER, "Status": current})
+        },
+    )
+    previous = transition_order_status(DB_ORDER["pkey"], new)
+    assert previous["Status"] == current
+    ddb_client_stub.assert_no_pending_responses()
+
+
+def test_change_order_status_returns_updated_order(ddb_client_stub: Stubber):
+    ddb_client_stub.add_response(
+        method="update_item",
+        expected_params={
+            "TableName": "TEST_TABLE",
+            "Key": {"pkey": DB_ORDER["pkey"]},
+            "UpdateExpression": "SET #status = :to",
+            "ConditionExpression": "attribute_exists(pkey) AND #status IN (:from0)",
+            "ExpressionAttributeNames": {"#status": "Status"},
+            "ExpressionAttributeValues": {":to": "PLACED", ":from0": "PROCESSING"},
+            "ReturnValues": "ALL_OLD",
+            "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+        },
+        service_response={
+            "Attributes": utils.serialize_py_to_db({**DB_ORDER, "Status": "PROCESSING"})
+        },
+    )
+    assert change_order_status(DB_ORDER["pkey"], "PLACED") == {
+        **DB_ORDER,
+        "Status": "PLACED",
+    }
+
+
+def test_transition_not_allowed_from_current_status(ddb_client_stub: Stubber):
+    ddb_client_stub.add_client_error(
+        method="update_item",
+        service_error_code="ConditionalCheckFailedException",
+        http_status_code=400,
+        modeled_fields={
+            "Item": utils.serialize_py_to_db({**DB_ORDER, "Status": "COMPLETED"})
+        },
+    )
+    with pytest.raises(InvalidStatusTransition) as e:
+        transition_order_status(DB_ORDER["pkey"], "CANCELLED")
+    assert e.value.item["Status"] == "COMPLETED"
+
+
+def test_transition_to_current_status_is_a_no_op(ddb_client_stub: Stubber):
+    """
+    redelivered messages or retried tasks find
+    the order already in the requested status
+    """
+    ddb_client_stub.add_client_error(
+        method="update_item",
+        service_error_code="ConditionalCheckFailedException",
+        http_status_code=400,
+        modeled_fields={
+            "Item": utils.serialize_py_to_db({**DB_ORDER, "Status": "IN_TRANSIT"})
+        },
+    )
+    assert change_order_status(DB_ORDER["pkey"], "IN_TRANSIT")["Status"] == "IN_TRANSIT"
+
+
+def test_transition_of_missing_order(ddb_client_stub: Stubber):
+    ddb_client_stub.add_client_error(
+        method="update_item",
+        service_error_code="ConditionalCheckFailedException",
+        http_status_code=400,
+    )
+    with pytest.raises(ItemNotFound):
+        transition_order_status(DB_ORDER["pkey"], "CANCELLED")
+
+
+def test_concurrent_transitions_use_a_table_per_thread():
+    """
+    i.e. the delivery lambda's workers, boto3 resources aren't thread safe
+    """
+    get_orders_table = getattr(dynamodb, "__get_orders_table")
+    tables = []
+    threads = [Thread(target=lambda: tables.append(get_orders_table())) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert tables[0] is not tables[1]
+    assert tables[0].meta.client is tables[1].meta.client
+    assert get_orders_table() is get_orders_table()
@@ -0,0 +1,83 @@
+from conftest import utils
+from payload import DB_ORDER
+from unittest.mock import patch
+from botocore.stub import Stubber
+from common.dynamodb import iter_orders_by_customer, query_orders_by_customer
+
+ORDERS = [{**DB_ORDER, "pkey": f"ORD{i:07d}", "Status": "PLACED"} for i in range(1, 6)]
+
+
+def query_params(**kwargs):
+    return {
+        "TableName": "TEST_TABLE",
+        "IndexName": "OrderedBy-index",
+        "KeyConditionExpression": "#ordered_by = :ordered_by",
+        "ExpressionAttributeNames": {"#ordered_by": "OrderedBy"},
+        "ExpressionAttributeValues": {":ordered_by": DB_ORDER["OrderedBy"]},
+        **kwargs,
+    }
+
+
+def last_key(order):
+    return {"pkey": order["pkey"], "OrderedBy": order["OrderedBy"]}
+
+
+def test_iter_orders_pages_through_the_index(ddb_client_stub: Stubber):
+    ddb_client_stub.add_response(
+        method="query",
+        expected_params=query_params(Limit=3),
+        service_response={
+            "Items": [utils.serialize_py_to_db(i) for i in ORDERS[:3]],
+            "LastEvaluatedKey": utils.serialize_py_to_db(last_key(ORDERS[2])),
+        },
+    )
+    ddb_client_stub.add_response(
+        method="query",
+        expected_params=query_params(Limit=3, ExclusiveStartKey=last_key(ORDERS[2])),
+        service_response={"Items": [utils.serialize_py_to_db(i) for i in ORDERS[3:]]},
+    )
+
+    assert list(iter_orders_by_customer(DB_ORDER["OrderedBy"], page_size=3)) == ORDERS
+
+
+def test_iter_orders_is_lazy(ddb_client_stub: Stubber):
+    ddb_client_stub.add_response(
+        method="query",
+        service_response={
+            "Items": [utils.serialize_py_to_db(i) for i in ORDERS[:3]],
+            "LastEvaluatedKey": utils.serialize_py_to_db(last_key(ORDERS[2])),
+        },
+    )
+    orders = iter_orders_by_customer(DB_ORDER["OrderedBy"], page_size=3)
+
+    # the second page is never requested
+    assert next(orders) == ORDERS[0]
+    ddb_client_stub.assert_no_pending_responses()
+
+
+def test_keys_only_index_orders_are_fetched_from_the_table(ddb_client_stub: Stubber):
+    ddb_client_stub.add_response(
+        method="query",
+        expected_params=query_params(Limit=2),
+        service_response={
+            "Items": [utils.serialize_py_to_db(last_key(i)) for i in ORDERS[:2]],
+        },
+    )
+    ddb_client_stub.add_response(
+        method="batch_get_item",
+        expected_params={
+            "RequestItems": {
+                "TEST_TABLE": {"Keys": [{"pkey": i["pkey"]} for i in ORDERS[:2]]}
+            }
+        },
+        # BatchGetItem doesn't keep the order of the keys
+        service_response={
+            "Responses": {"TEST_TABLE": [utils.serialize_py_to_db(i) for i in ORDERS[1::-1]]}
+        },
+    )
+
+    with patch("common.dynamodb.ORDERS_INDEX_PROJECTION", "KEYS_ONLY"):
+        orders, start_key = query_orders_by_customer(DB_ORDER["OrderedBy"], limit=2)
+
+    assert orders == ORDERS[:2]
+    assert start_key is None
@@ -0,0 +1,113 @@
+import pytest
+from conftest import utils
+from payload import DB_ORDER
+from unittest.mock import patch
+from botocore.stub import Stubber
+from common import dynamodb
+from common.cache import LRUCache
+from common.dynamodb import (
+    cache_stats,
+    get_item_by_pkey,
+    change_order_status,
+    order_table_put_item,
+)
+
+DB_ORDER_STATUS_PROCESSING = {**DB_ORDER, "Status": "PROCESSING"}
+
+
+@pytest.fixture(autouse=True)
+def orders_cache():
+    cache = LRUCache(max_size=10, ttl=60)
+    with patch.object(dynamodb, "orders_cache", cache):
+        yield cache
+
+
+def stub_get_item(ddb_client_stub, item):
+    ddb_client_stub.add_response(
+        method="get_item",
+        expected_params={"Key": {"pkey": item["pkey"]}, "TableName": "TEST_TABLE"},
+        service_response={"Item": utils.serialize_py_to_db(item)},
+    )
+
+
+def test_reads_are_served_from_the_cache(ddb_client_stub: Stubber):
+    # a single get_item for both reads
+    stub_get_item(ddb_client_stub, DB_ORDER_STATUS_PROCESSING)
+
+    assert get_item_by_pkey(DB_ORDER["pkey"]) == DB_ORDER_STATUS_PROCESSING
+    assert get_item_by_pkey(DB_ORDER["pkey"]) == DB_ORDER_STATUS_PROCESSING
+    assert cache_stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_strong_reads_bypass_the_cache(ddb_client_stub: Stubber):
+    stub_get_item(ddb_client_stub, DB_ORDER_STATUS_PROCESSING)
+    stub_get_item(ddb_client_stub, {**DB_ORDER, "Status": "PLACED"})
+
+    get_item_by_pkey(DB_ORDER["pkey"])
+    assert get_item_by_pkey(DB_ORDER["pkey"], bypass_cache=True)["Status"] == "PLACED"
+    # the fresher item replaced the cached one
+    assert get_item_by_pkey(DB_ORDER["pkey"])["Status"] == "PLACED"
+
+
+def test_status_change_updates_the_cache(ddb_client_stub: Stubber):
+    stub_get_item(ddb_client_stub, DB_ORDER_STATUS_PROCESSING)
+    ddb_client_stub.add_response(
+        method="update_item",
+        service_response={"Attributes": utils.serialize_py_to_db(DB_ORDER_STATUS_PROCESSING)},
+    )
+
+    get_item_by_pkey(DB_ORDER["pkey"])
+    change_order_status(DB_ORDER["pkey"], "PLACED")
+
+    # no get_item stubbed, the stubber fails if the table is read
+    assert get_item_by_pkey(DB_ORDER["pkey"])["Status"] == "PLACED"
+
+
+def test_put_item_updates_the_cache(ddb_client_stub: Stubber):
+    ddb_client_stub.add_response(method="put_item", service_response={})
+
+    order_table_put_item(dict(DB_ORDER_STATUS_PROCESSING))
+
+    assert get_item_by_pkey(DB_ORDER["pkey"]) == DB_ORDER_STATUS_PROCESSING
+
+
+def test_cached_orders_cant_be_modified_by_callers(ddb_client_stub: Stubber):
+    stub_get_item(ddb_client_stub, DB_ORDER_STATUS_PROCESSING)
+
+    get_item_by_pkey(DB_ORDER["pkey"])["Status"] = "CANCELLED"
+
+    assert get_item_by_pkey(DB_ORDER["pkey"])["Status"] == "PROCESSING"
+
+
+def test_read_racing_with_a_local_write_doesnt_overwrite_it(orders_cache):
+    # stamp taken before reading the table,
+    # the status is changed while the read is in flight
+    stamp = orders_cache.stamp
+    orders_cache.set(DB_ORDER["pkey"], {**DB_ORDER, "Status": "CANCELLED"})
+    orders_cache.set_if_unchanged(DB_ORDER["pkey"], DB_ORDER_STATUS_PROCESSING, stamp)
+
+    assert orders_cache.get(DB_ORDER["pkey"])["Status"] == "CANCELLED"
+
+
+def test_entries_expire_and_are_evicted():
+    cache = LRUCache(max_size=2, ttl=5)
+    with patch("common.cache.time.monotonic", return_value=100):
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        # b was the least recently used
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+    with patch("common.cache.time.monotonic", return_value=106):
+        assert cache.get("a") is None
+
+
+def test_cache_is_disabled_by_default(ddb_client_stub: Stubber):
+    with patch.object(dynamodb, "orders_cache", LRUCache(0, 5)):
+        stub_get_item(ddb_client_stub, DB_ORDER_STATUS_PROCESSING)
+        stub_get_item(ddb_client_stub, DB_ORDER_STATUS_PROCESSING)
+
+        get_item_by_pkey(DB_ORDER["pkey"])
+        get_item_by_pkey(DB_ORDER["pkey"])
+        ddb_client_stub.assert_no_pending_responses()
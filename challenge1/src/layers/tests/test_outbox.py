@@ -0,0 +1,97 @@
+import json
+import pytest
+from payload import DB_ORDER
+from unittest.mock import patch
+from botocore.stub import Stubber
+from common.errors import BatchOperationIncomplete
+from common.dynamodb import (
+    outbox_record,
+    put_order_with_outbox,
+    put_orders_with_outbox,
+)
+
+ORDERS = [{**DB_ORDER, "pkey": f"ORD{i:07d}", "Status": "PROCESSING"} for i in range(1, 61)]
+
+
+def transact_items(orders):
+    return [
+        {"Put": {"TableName": "TEST_TABLE", "Item": item}}
+        for order in orders
+        for item in (order, outbox_record(order))
+    ]
+
+
+@pytest.fixture(autouse=True)
+def frozen_time():
+    # fixes the TTL of the outbox records and skips the backoff
+    with patch("common.dynamodb.time") as patched:
+        patched.time.return_value = 1700000000
+        yield patched
+
+
+def test_outbox_record_holds_the_execution_input():
+    record = outbox_record(ORDERS[0])
+
+    assert record["pkey"] == "outbox#ORD0000001"
+    assert json.loads(record["Input"]) == ORDERS[0]
+    assert record["TTL"] == 1700000000 + 86400
+
+
+def test_order_and_outbox_record_are_written_together(ddb_client_stub: Stubber):
+    ddb_client_stub.add_response(
+        method="transact_write_items",
+        expected_params={"TransactItems": transact_items(ORDERS[:1])},
+        service_response={},
+    )
+    put_order_with_outbox(ORDERS[0])
+    ddb_client_stub.assert_no_pending_responses()
+
+
+def test_orders_are_chunked_by_50(ddb_client_stub: Stubber):
+    for orders in (ORDERS[:50], ORDERS[50:]):
+        ddb_client_stub.add_response(
+            method="transact_write_items",
+            expected_params={"TransactItems": transact_items(orders)},
+            service_response={},
+        )
+    put_orders_with_outbox(ORDERS)
+    ddb_client_stub.assert_no_pending_responses()
+
+
+def test_cancelled_transactions_are_retried_then_reported(ddb_client_stub: Stubber):
+    ddb_client_stub.add_response(
+        method="transact_write_items",
+        expected_params={"TransactItems": transact_items(ORDERS[:50])},
+        service_response={},
+    )
+    for _ in range(6):
+        ddb_client_stub.add_client_error(
+            method="transact_write_items",
+            service_error_code="TransactionCanceledException",
+            expected_params={"TransactItems": transact_items(ORDERS[50:])},
+        )
+
+    with pytest.raises(BatchOperationIncomplete) as e:
+        put_orders_with_outbox(ORDERS)
+    assert e.value.unprocessed == ORDERS[50:]
+
+
+def test_failed_transactions_are_reported_and_the_others_written(ddb_client_stub: Stubber):
+    """
+    i.e. a transaction over the 4MB limit, the other orders of the batch
+    are still written
+    """
+    ddb_client_stub.add_client_error(
+        method="transact_write_items",
+        service_error_code="ValidationException",
+        expected_params={"TransactItems": transact_items(ORDERS[:50])},
+    )
+    ddb_client_stub.add_response(
+        method="transact_write_items",
+        expected_params={"TransactItems": transact_items(ORDERS[50:])},
+        service_response={},
+    )
+
+    with pytest.raises(BatchOperationIncomplete) as e:
+        put_orders_with_outbox(ORDERS)
+    assert e.value.unprocessed == ORDERS[:50]
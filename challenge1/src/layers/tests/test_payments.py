@@ -0,0 +1,139 @@
+import os
+import time
+import pytest
+from unittest.mock import patch
+from botocore.stub import Stubber, ANY
+from common.clients import get_client
+from botocore.exceptions import ClientError
+from common.dynamodb import outbox_record
+from common.payments import start_payment_processing
+
+ORDER = {"pkey": "ORD0000001"}
+EXECUTION = {
+    "stateMachineArn": "TEST_ARN",
+    "name": "process_payment_ORD0000001",
+    "input": ANY,
+}
+EXECUTION_RESPONSE = {"executionArn": "test", "startDate": "2011-11-11 11:11:11"}
+
+
+@pytest.fixture
+def state_machine_type(request):
+    env = {"PAYMENT_PROCESSOR_SF_ARN": "TEST_ARN", "PAYMENT_PROCESSOR_SF_TYPE": request.param}
+    with patch.dict(os.environ, env):
+        yield request.param
+
+
+@pytest.fixture
+def outbox(in_memory_table):
+    record = outbox_record(ORDER)
+    in_memory_table.items[record["pkey"]] = record
+    # the record as it is in the table
+    return lambda: in_memory_table.items[record["pkey"]]
+
+
+@pytest.mark.parametrize("state_machine_type", ["STANDARD"], indirect=True)
+def test_standard_execution_is_started(state_machine_type):
+    with Stubber(get_client("stepfunctions")) as sf_stub:
+        sf_stub.add_response(
+            method="start_execution",
+            expected_params=EXECUTION,
+            service_response=EXECUTION_RESPONSE,
+        )
+        start_payment_processing(ORDER)
+        sf_stub.assert_no_pending_responses()
+
+
+@pytest.mark.parametrize("state_machine_type", ["EXPRESS"], indirect=True)
+def test_express_execution_start_is_retried_when_throttled(state_machine_type, outbox):
+    """
+    express executions aren't deduplicated by name, a start is only
+    retried on throttling, when no execution was started
+    """
+    sf_client = get_client("stepfunctions", max_attempts=1)
+    with Stubber(sf_client) as sf_stub, patch("common.payments.time.sleep") as sleep:
+        sf_stub.add_client_error(
+            method="start_execution", service_error_code="ThrottlingException"
+        )
+        sf_stub.add_response(
+            method="start_execution",
+            expected_params=EXECUTION,
+            service_response=EXECUTION_RESPONSE,
+        )
+
+        start_payment_processing(ORDER)
+
+        sf_stub.assert_no_pending_responses()
+        assert sleep.call_count == 1
+
+
+@pytest.mark.parametrize("state_machine_type", ["EXPRESS"], indirect=True)
+def test_express_execution_start_is_not_retried_on_server_errors(state_machine_type, outbox):
+    """
+    the execution may have started when the service failed
+    """
+    sf_client = get_client("stepfunctions", max_attempts=1)
+    with Stubber(sf_client) as sf_stub:
+        sf_stub.add_client_error(
+            method="start_execution", service_error_code="InternalError", http_status_code=500
+        )
+
+        with pytest.raises(ClientError):
+            start_payment_processing(ORDER)
+
+    # the relay's retry of the record starts it again
+    assert "ExecutionStarted" not in outbox()
+
+
+@pytest.mark.parametrize("state_machine_type", ["EXPRESS"], indirect=True)
+def test_replayed_express_execution_is_not_started_again(state_machine_type, outbox):
+    """
+    a replay of the outbox record, i.e. on another container
+    """
+    sf_client = get_client("stepfunctions", max_attempts=1)
+    with Stubber(sf_client) as sf_stub:
+        sf_stub.add_response(
+            method="start_execution",
+            expected_params=EXECUTION,
+            service_response=EXECUTION_RESPONSE,
+        )
+
+        start_payment_processing(ORDER)
+        start_payment_processing(ORDER)
+
+        sf_stub.assert_no_pending_responses()
+    assert "ExecutionStarted" in outbox()
+
+
+@pytest.mark.parametrize("state_machine_type", ["EXPRESS"], indirect=True)
+def test_express_execution_start_and_release_fail(state_machine_type, outbox):
+    """
+    the start's error is raised, the mark left on the outbox record
+    is taken over by a retry of the record once expired
+    """
+    sf_client = get_client("stepfunctions", max_attempts=1)
+    with Stubber(sf_client) as sf_stub:
+        sf_stub.add_client_error(
+            method="start_execution", service_error_code="InternalError", http_status_code=500
+        )
+        sf_stub.add_response(
+            method="start_execution",
+            expected_params=EXECUTION,
+            service_response=EXECUTION_RESPONSE,
+        )
+
+        with patch(
+            "common.dynamodb.release_execution_start",
+            side_effect=ClientError({"Error": {"Code": "ThrottlingException"}}, "UpdateItem"),
+        ):
+            with pytest.raises(ClientError) as e:
+                start_payment_processing(ORDER)
+        assert e.value.response["Error"]["Code"] == "InternalError"
+        assert "ExecutionStarted" in outbox()
+
+        # a retry before the mark expired skips the record
+        start_payment_processing(ORDER)
+        with patch("common.dynamodb.time.time", return_value=time.time() + 61):
+            start_payment_processing(ORDER)
+
+        sf_stub.assert_no_pending_responses()
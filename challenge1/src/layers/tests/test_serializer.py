@@ -0,0 +1,57 @@
+import json
+import pytest
+import datetime
+from decimal import Decimal
+from unittest.mock import patch
+from payload import DB_ORDER
+from common import serializer
+from common.serializer import dumps
+
+
+@pytest.fixture(autouse=True, params=["orjson", "json"])
+def encoder(request):
+    # the layer ships orjson, the standard library encoder is the fallback
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+        yield request.param
+    else:
+        with patch.object(serializer, "orjson", None):
+            yield request.param
+
+
+def test_order_numbers_keep_their_type():
+    order = {**DB_ORDER, "Amount": Decimal("100"), "Rate": Decimal("1.5")}
+
+    assert json.loads(dumps(order)) == {**DB_ORDER, "Amount": 100, "Rate": 1.5}
+    assert '"Amount":100,' in dumps(order)
+
+
+def test_sets_and_datetimes_are_serialized():
+    value = {
+        "Tags": {"b", "a"},
+        "Numbers": frozenset([Decimal(2), Decimal(1)]),
+        "CreatedAt": datetime.datetime(2023, 1, 2, 3, 4, 5),
+        "Day": datetime.date(2023, 1, 2),
+    }
+
+    assert json.loads(dumps(value)) == {
+        "Tags": ["a", "b"],
+        "Numbers": [1, 2],
+        "CreatedAt": "2023-01-02T03:04:05",
+        "Day": "2023-01-02",
+    }
+
+
+def test_lists_of_orders_are_serialized_compactly():
+    orders = {"Orders": [{**DB_ORDER, "Amount": Decimal(100)}] * 2, "NextCursor": None}
+
+    assert dumps(orders) == json.dumps(orders, separators=(",", ":"), default=int)
+
+
+def test_keys_can_be_sorted():
+    assert dumps({"b": 1, "a": 2}, sort_keys=True) == '{"a":2,"b":1}'
+
+
+def test_unknown_types_are_rejected():
+    with pytest.raises(TypeError):
+        dumps({"value": object()})
@@ -0,0 +1,104 @@
+import time
+import pytest
+from unittest.mock import patch
+from common.errors import InvalidToken
+from common.tokens import SigningKeys, sign_token, verify_token
+
+KEYS = {"key-1": "test-signing-key-1"}
+
+
+@pytest.fixture
+def signing_keys():
+    return SigningKeys(lambda: dict(KEYS), ttl=300, min_reload_interval=10)
+
+
+def claims(expires_in=300, **extra):
+    return {"sub": "dummy@dummy.com", "exp": int(time.time()) + expires_in, **extra}
+
+
+@pytest.mark.parametrize("algorithm", ["HS256", "HS384", "HS512"])
+def test_valid_token_claims_are_returned(signing_keys, algorithm):
+    token = sign_token(claims(), KEYS["key-1"], "key-1", algorithm)
+    assert verify_token(token, signing_keys)["sub"] == "dummy@dummy.com"
+
+
+def test_expired_token_is_rejected(signing_keys):
+    # past the tolerated clock skew
+    token = sign_token(claims(expires_in=-60), KEYS["key-1"], "key-1")
+    with pytest.raises(InvalidToken, match="expired"):
+        verify_token(token, signing_keys)
+
+
+def test_token_not_valid_yet_is_rejected(signing_keys):
+    token = sign_token(claims(nbf=int(time.time()) + 60), KEYS["key-1"], "key-1")
+    with pytest.raises(InvalidToken, match="not valid yet"):
+        verify_token(token, signing_keys)
+
+
+def test_tampered_token_is_rejected(signing_keys):
+    token = sign_token(claims(), KEYS["key-1"], "key-1")
+    header, _, signature = token.split(".")
+    forged = sign_token(claims(sub="admin"), "another-key", "key-1").split(".")[1]
+
+    with pytest.raises(InvalidToken, match="signature"):
+        verify_token(f"{header}.{forged}.{signature}", signing_keys)
+
+
+@pytest.mark.parametrize(
+    "token", ["", "a.b", "a.b.c", "not-base64!.e30.e30", sign_token({}, "k", "key-1")[:-2]]
+)
+def test_malformed_token_is_rejected(signing_keys, token):
+    with pytest.raises(InvalidToken):
+        verify_token(token, signing_keys)
+
+
+def test_unsupported_algorithm_is_rejected(signing_keys):
+    token = sign_token(claims(), KEYS["key-1"], "key-1")
+    # {"alg":"none","kid":"key-1"}
+    header = "eyJhbGciOiJub25lIiwia2lkIjoia2V5LTEifQ"
+    with pytest.raises(InvalidToken):
+        verify_token(header + token[token.index(".") :], signing_keys)
+
+
+def test_audience_and_issuer_are_checked(signing_keys):
+    token = sign_token(claims(aud=["orders-api"], iss="auth"), KEYS["key-1"], "key-1")
+
+    assert verify_token(token, signing_keys, audience="orders-api", issuer="auth")
+    with pytest.raises(InvalidToken, match="audience"):
+        verify_token(token, signing_keys, audience="another-api")
+    with pytest.raises(InvalidToken, match="issuer"):
+        verify_token(token, signing_keys, issuer="someone-else")
+
+
+def test_keys_are_loaded_once_per_ttl(signing_keys):
+    token = sign_token(claims(), KEYS["key-1"], "key-1")
+    for _ in range(10):
+        verify_token(token, signing_keys)
+    assert signing_keys.loads == 1
+
+    with patch("common.tokens.time.monotonic", return_value=time.monotonic() + 301):
+        verify_token(token, signing_keys)
+    assert signing_keys.loads == 2
+
+
+def test_rotated_key_is_loaded_on_first_use():
+    secret = dict(KEYS)
+    signing_keys = SigningKeys(lambda: dict(secret), ttl=300, min_reload_interval=10)
+    verify_token(sign_token(claims(), KEYS["key-1"], "key-1"), signing_keys)
+
+    # key-2 is added to the secret and signs the new tokens
+    secret["key-2"] = "test-signing-key-2"
+    token = sign_token(claims(), "test-signing-key-2", "key-2")
+    with pytest.raises(InvalidToken, match="Unknown signing key"):
+        # keys were loaded less than min_reload_interval ago
+        verify_token(token, signing_keys)
+    with patch("common.tokens.time.monotonic", return_value=time.monotonic() + 11):
+        assert verify_token(token, signing_keys)
+    assert signing_keys.loads == 2
+
+
+def test_unknown_key_ids_dont_flood_the_key_store(signing_keys):
+    signing_keys.get("key-1")
+    for i in range(100):
+        assert signing_keys.get(f"bogus-{i}") is None
+    assert signing_keys.loads == 1
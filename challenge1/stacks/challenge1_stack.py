@@ -5,12 +5,15 @@ from aws_cdk import (
     aws_lambda,
     aws_iam as iam,
     aws_sqs as sqs,
+    aws_logs as logs,
     BundlingOptions,
     aws_events as events,
     aws_stepfunctions as sf,
     aws_dynamodb as dynamodb,
+    aws_secretsmanager as secretsmanager,
     aws_events_targets as event_target,
     aws_stepfunctions_tasks as sf_tasks,
+    aws_lambda_event_sources as event_sources,
 )
 from chalice.cdk import Chalice
 from constructs import Construct
@@ -27,6 +30,8 @@ class Challenge1Stack(Stack):
             table_name="users-orders-table",
             deletion_protection=True,
             time_to_live_attribute="TTL",
+            # relays the outbox records to the payment state machine
+            stream=dynamodb.StreamViewType.NEW_IMAGE,
             partition_key=dynamodb.Attribute(
                 name="pkey",
                 type=dynamodb.AttributeType.STRING,
@@ -35,12 +40,20 @@ class Challenge1Stack(Stack):
 
         # Add orderedby as secondary index to fetch orders
         # based on who ordered it.
+        # KEYS_ONLY/INCLUDE cut the index storage and write costs,
+        # orders listed from it are then fetched from the table.
+        self.orders_index_projection = (
+            self.node.try_get_context("orders_index_projection") or "ALL"
+        )
         self.orders_table.add_global_secondary_index(
             partition_key=dynamodb.Attribute(
                 name="OrderedBy", type=dynamodb.AttributeType.STRING
             ),
             index_name="OrderedBy-index",
-            projection_type=dynamodb.ProjectionType.ALL,
+            projection_type=dynamodb.ProjectionType[self.orders_index_projection],
+            non_key_attributes=(
+                ["Status"] if self.orders_index_projection == "INCLUDE" else None
+            ),
         )
 
         # DLQ to receive orders with processing errors
@@ -132,10 +145,7 @@ class Challenge1Stack(Stack):
                     statements=[
                         iam.PolicyStatement(
                             effect=iam.Effect.ALLOW,
-                            actions=[
-                                "dynamodb:GetItem",
-                                "dynamodb:PutItem",
-                            ],
+                            actions=["dynamodb:UpdateItem"],
                             resources=[self.orders_table.table_arn],
                         )
                     ]
@@ -169,14 +179,31 @@ class Challenge1Stack(Stack):
             handler="index.handler",
         )
 
-        # Eventbridge Rule to trigger delivery handler every min
-        self.delivery_handler_eb_trigger = events.Rule(
-            self,
-            id="DeliveryHandlerCronJob",
-            rule_name="order-delivery-handler-cron",
-            schedule=events.Schedule.rate(Duration.minutes(1)),
-            targets=[event_target.LambdaFunction(handler=self.handle_delivery_lambda)],
-        )
+        # The delivery handler either polls the queue every min (schedule)
+        # or is invoked by lambda with batches of messages (sqs)
+        self.delivery_trigger = self.node.try_get_context("delivery_trigger") or "schedule"
+        if self.delivery_trigger == "sqs":
+            self.handle_delivery_lambda.add_event_source(
+                event_sources.SqsEventSource(
+                    self.sqs_new_orders,
+                    batch_size=int(
+                        self.node.try_get_context("delivery_batch_size") or 10
+                    ),
+                    max_batching_window=Duration.seconds(
+                        int(self.node.try_get_context("delivery_batching_window") or 0)
+                    ),
+                    report_batch_item_failures=True,
+                )
+            )
+        else:
+            # Eventbridge Rule to trigger delivery handler every min
+            self.delivery_handler_eb_trigger = events.Rule(
+                self,
+                id="DeliveryHandlerCronJob",
+                rule_name="order-delivery-handler-cron",
+                schedule=events.Schedule.rate(Duration.minutes(1)),
+                targets=[event_target.LambdaFunction(handler=self.handle_delivery_lambda)],
+            )
 
         # IAM role for rest api
         self.api_handler_role = iam.Role(
@@ -211,61 +238,100 @@ class Challenge1Stack(Stack):
             )
         )
 
-        # IAM role for lambda to update order details
-        self.iam_role_lambda_update_role = iam.Role(
-            self,
-            id="UpdateOrderTable",
-            role_name="update-orders",
-            assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
-            inline_policies={
-                "policies": iam.PolicyDocument(
-                    statements=[
-                        iam.PolicyStatement(
-                            effect=iam.Effect.ALLOW, actions=["logs:*"], resources=["*"]
-                        ),
-                        iam.PolicyStatement(
-                            effect=iam.Effect.ALLOW,
-                            actions=[
-                                "dynamodb:GetItem",
-                                "dynamodb:PutItem",
-                            ],
-                            resources=[self.orders_table.table_arn],
-                        ),
-                    ]
-                )
-            },
+        # The payment state machine moves the order from PROCESSING to PLACED
+        # either with the update-order lambda or with a DynamoDB UpdateItem
+        # task, which saves the lambda invocation. Both put the order in $.Payload
+        self.order_status_update = (
+            self.node.try_get_context("order_status_update") or "lambda"
         )
+        if self.order_status_update == "dynamodb":
+            sf_update_status_to_ordered_task = sf_tasks.DynamoUpdateItem(
+                self,
+                id="Update Order Status",
+                table=self.orders_table,
+                key={
+                    "pkey": sf_tasks.DynamoAttributeValue.from_string(
+                        sf.JsonPath.string_at("$.pkey")
+                    )
+                },
+                update_expression="SET #status = :to",
+                condition_expression="attribute_exists(pkey) AND #status = :from",
+                expression_attribute_names={"#status": "Status"},
+                expression_attribute_values={
+                    ":to": sf_tasks.DynamoAttributeValue.from_string("PLACED"),
+                    ":from": sf_tasks.DynamoAttributeValue.from_string("PROCESSING"),
+                },
+                return_values=sf_tasks.DynamoReturnValues.ALL_NEW,
+                # only the attributes every order has are forwarded, a path to
+                # a missing one (i.e. Description) would fail the execution.
+                # The delivery message is therefore smaller than with the lambda
+                result_selector={
+                    "pkey.$": "$.Attributes.pkey.S",
+                    "Item.$": "$.Attributes.Item.S",
+                    "Amount.$": "States.StringToJson($.Attributes.Amount.N)",
+                    "Status.$": "$.Attributes.Status.S",
+                    "OrderedBy.$": "$.Attributes.OrderedBy.S",
+                },
+                result_path="$.Payload",
+            )
+            # Order was cancelled or doesn't exist
+            sf_update_status_to_ordered_task.add_catch(
+                sf.Fail(self, id="Order Not Processing"),
+                errors=["DynamoDB.ConditionalCheckFailedException"],
+            )
+        else:
+            # IAM role for lambda to update order details
+            self.iam_role_lambda_update_role = iam.Role(
+                self,
+                id="UpdateOrderTable",
+                role_name="update-orders",
+                assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
+                inline_policies={
+                    "policies": iam.PolicyDocument(
+                        statements=[
+                            iam.PolicyStatement(
+                                effect=iam.Effect.ALLOW, actions=["logs:*"], resources=["*"]
+                            ),
+                            iam.PolicyStatement(
+                                effect=iam.Effect.ALLOW,
+                                actions=["dynamodb:UpdateItem"],
+                                resources=[self.orders_table.table_arn],
+                            ),
+                        ]
+                    )
+                },
+            )
 
-        # Lambda function to update order details
-        self.lambda_update_order_status = aws_lambda.Function(
-            self,
-            id="UpdateOrderDetailsLambda",
-            function_name="update-order-lambda",
-            role=self.iam_role_lambda_update_role,
-            runtime=aws_lambda.Runtime.PYTHON_3_9,
-            timeout=Duration.seconds(30),
-            layers=[self.common_lambda_layer],
-            code=aws_lambda.Code.from_asset(
-                path=os.path.join(
-                    os.path.dirname(__file__),
-                    "..",
-                    "src",
-                    "lambda",
-                    "orders_table_update_status",
-                )
-            ),
-            handler="index.handler",
-            environment={
-                # fix me
-                "ORDERS_TABLE": self.orders_table.table_name
-            },
-        )
+            # Lambda function to update order details
+            self.lambda_update_order_status = aws_lambda.Function(
+                self,
+                id="UpdateOrderDetailsLambda",
+                function_name="update-order-lambda",
+                role=self.iam_role_lambda_update_role,
+                runtime=aws_lambda.Runtime.PYTHON_3_9,
+                timeout=Duration.seconds(30),
+                layers=[self.common_lambda_layer],
+                code=aws_lambda.Code.from_asset(
+                    path=os.path.join(
+                        os.path.dirname(__file__),
+                        "..",
+                        "src",
+                        "lambda",
+                        "orders_table_update_status",
+                    )
+                ),
+                handler="index.handler",
+                environment={
+                    # fix me
+                    "ORDERS_TABLE": self.orders_table.table_name
+                },
+            )
 
-        sf_update_status_to_ordered_task = sf_tasks.LambdaInvoke(
-            self,
-            id="Update Order Status",
-            lambda_function=self.lambda_update_order_status,
-        )
+            sf_update_status_to_ordered_task = sf_tasks.LambdaInvoke(
+                self,
+                id="Update Order Status",
+                lambda_function=self.lambda_update_order_status,
+            )
 
         sf_send_event_to_sqs = sf_tasks.SqsSendMessage(
             self,
@@ -275,10 +341,15 @@ class Challenge1Stack(Stack):
             message_body=sf.TaskInput.from_json_path_at("$.Payload"),
         )
 
+        # seconds the mocked payment takes, 0 for load tests
+        payment_wait_seconds = self.node.try_get_context("payment_wait_seconds")
+        self.payment_wait_seconds = int(
+            30 if payment_wait_seconds is None else payment_wait_seconds
+        )
         sf_wait_30s_task = sf.Wait(
             self,
             id="Mock Payment Process (Wait 1 min)",
-            time=sf.WaitTime.duration(Duration.seconds(30)),
+            time=sf.WaitTime.duration(Duration.seconds(self.payment_wait_seconds)),
             comment="Mocking payment process",
         )
 
@@ -320,6 +391,21 @@ class Challenge1Stack(Stack):
             },
         )
 
+        # Keys signing the API tokens as {key id: key}, keys are rotated by
+        # adding a new key id, the authorizer caches them
+        self.api_signing_keys_secret = secretsmanager.Secret(
+            self,
+            id="ApiSigningKeys",
+            secret_name="orders-api-signing-keys",
+            generate_secret_string=secretsmanager.SecretStringGenerator(
+                secret_string_template="{}",
+                generate_string_key="key-1",
+                password_length=64,
+                exclude_punctuation=True,
+            ),
+        )
+        self.api_signing_keys_secret.grant_read(self.lambda_authorizer_role)
+
         # Lambda function to authorized API requests
         self.api_authorizer_lambda = aws_lambda.Function(
             self,
@@ -338,6 +424,9 @@ class Challenge1Stack(Stack):
             ),
             handler="index.handler",
             layers=[self.common_lambda_layer],
+            environment={
+                "AUTH_SIGNING_KEYS_SECRET_ARN": self.api_signing_keys_secret.secret_arn,
+            },
             timeout=Duration.seconds(10),
             runtime=aws_lambda.Runtime.PYTHON_3_9,
         )
@@ -347,12 +436,132 @@ class Challenge1Stack(Stack):
         # Note: This is a very basic function, the idea is to
         # show how different tasks can be orchestrated based
         # on actual requirements.
+        # STANDARD or EXPRESS, express executions are cheaper and have higher
+        # start rate quotas, their history is only available in the logs
+        self.payment_state_machine_type = (
+            self.node.try_get_context("payment_state_machine_type") or "STANDARD"
+        )
+        state_machine_options = {}
+        if self.payment_state_machine_type == "EXPRESS":
+            state_machine_options["logs"] = sf.LogOptions(
+                destination=logs.LogGroup(
+                    self,
+                    id="ProcessNewOrdersLogs",
+                    log_group_name="/aws/vendedlogs/states/process-new-order-payment",
+                    retention=logs.RetentionDays.ONE_WEEK,
+                ),
+                level=sf.LogLevel.ALL,
+                include_execution_data=False,
+            )
         self.stepfunction_process_order_payments = sf.StateMachine(
             self,
             id="ProcessNewOrders",
             definition_body=sf_definition_body_process_order_payment,
             state_machine_name="process-new-order-payment",
-            timeout=Duration.seconds(70),
+            state_machine_type=sf.StateMachineType[self.payment_state_machine_type],
+            timeout=Duration.seconds(self.payment_wait_seconds + 40),
+            **state_machine_options,
+        )
+
+        # DLQ to receive outbox records whose execution couldn't be started
+        self.sqs_outbox_dlq = sqs.Queue(
+            self,
+            id="OutboxDLQ",
+            queue_name="orders-outbox-dl-queue",
+        )
+
+        # Lambda role to start the payment processing of new orders
+        self.lambda_outbox_relay_role = iam.Role(
+            self,
+            id="LambdaOutboxRelayRole",
+            role_name="order-outbox-relay-role",
+            assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
+            inline_policies={
+                "logging": iam.PolicyDocument(
+                    statements=[
+                        iam.PolicyStatement(
+                            effect=iam.Effect.ALLOW, actions=["logs:*"], resources=["*"]
+                        )
+                    ]
+                ),
+                "stepfunctions": iam.PolicyDocument(
+                    statements=[
+                        iam.PolicyStatement(
+                            effect=iam.Effect.ALLOW,
+                            actions=["states:StartExecution"],
+                            resources=[
+                                self.stepfunction_process_order_payments.state_machine_arn
+                            ],
+                        )
+                    ]
+                ),
+                # express starts are recorded on the outbox records
+                "dynamodb": iam.PolicyDocument(
+                    statements=[
+                        iam.PolicyStatement(
+                            effect=iam.Effect.ALLOW,
+                            actions=["dynamodb:UpdateItem"],
+                            resources=[self.orders_table.table_arn],
+                        )
+                    ]
+                ),
+            },
+        )
+
+        # lambda function relaying the outbox records of the orders table
+        self.outbox_relay_lambda = aws_lambda.Function(
+            self,
+            id="OutboxRelayLambda",
+            function_name="orders-outbox-relay",
+            role=self.lambda_outbox_relay_role,
+            timeout=Duration.seconds(30),
+            layers=[self.common_lambda_layer],
+            runtime=aws_lambda.Runtime.PYTHON_3_9,
+            description="Lambda to start the payment processing of new orders",
+            code=aws_lambda.Code.from_asset(
+                path=os.path.join(
+                    os.path.dirname(__file__),
+                    "..",
+                    "src",
+                    "lambda",
+                    "outbox_relay",
+                )
+            ),
+            environment={
+                "ORDERS_TABLE": self.orders_table.table_name,
+                "PAYMENT_PROCESSOR_SF_ARN": self.stepfunction_process_order_payments.state_machine_arn,
+                "PAYMENT_PROCESSOR_SF_TYPE": self.payment_state_machine_type,
+                # keeps the relay under the StartExecution quota
+                "RELAY_MAX_STARTS_PER_SECOND": str(
+                    self.node.try_get_context("relay_max_starts_per_second") or 50
+                ),
+            },
+            handler="index.handler",
+        )
+
+        # Only new outbox records invoke the relay, records still failing
+        # after the retries are sent to the DLQ
+        self.outbox_relay_lambda.add_event_source(
+            event_sources.DynamoEventSource(
+                self.orders_table,
+                starting_position=aws_lambda.StartingPosition.TRIM_HORIZON,
+                batch_size=100,
+                filters=[
+                    aws_lambda.FilterCriteria.filter(
+                        {
+                            "eventName": aws_lambda.FilterRule.is_equal("INSERT"),
+                            "dynamodb": {
+                                "Keys": {
+                                    "pkey": {"S": aws_lambda.FilterRule.begins_with("outbox#")}
+                                }
+                            },
+                        }
+                    )
+                ],
+                report_batch_item_failures=True,
+                retry_attempts=5,
+                on_failure=event_sources.SqsDlq(self.sqs_outbox_dlq),
+            )
         )
 
         # IAM Role for API Gateway Authorization
@@ -398,17 +607,10 @@ class Challenge1Stack(Stack):
                         iam.PolicyStatement(
                             effect=iam.Effect.ALLOW,
                             actions=["dynamodb:*"],
-                            resources=[self.orders_table.table_arn],
-                        )
-                    ]
-                ),
-                "stepfunctions": iam.PolicyDocument(
-                    statements=[
-                        iam.PolicyStatement(
-                            effect=iam.Effect.ALLOW,
-                            actions=["states:StartExecution"],
+                            # GET /orders queries the OrderedBy-index
                             resources=[
-                                self.stepfunction_process_order_payments.state_machine_arn
+                                self.orders_table.table_arn,
+                                f"{self.orders_table.table_arn}/index/*",
                             ],
                         )
                     ]
@@ -416,15 +618,22 @@ class Challenge1Stack(Stack):
             },
         )
 
+        # seconds API Gateway caches the authorizer decisions, 0 disables it
+        authorizer_ttl_seconds = self.node.try_get_context("authorizer_ttl_seconds")
+        self.authorizer_ttl_seconds = int(
+            300 if authorizer_ttl_seconds is None else authorizer_ttl_seconds
+        )
+
         chalice_environment = {
             "ORDERS_TABLE": self.orders_table.table_name,
+            "ORDERS_INDEX_PROJECTION": self.orders_index_projection,
             "ORDERS_SQS_URL": self.sqs_new_orders.queue_url,
-            "PAYMENT_PROCESSOR_SF_ARN": self.stepfunction_process_order_payments.state_machine_arn,
             "LAMBDA_FUNCTION_AUTHORIZER_URI": (
                 f"arn:aws:apigateway:{self.region}:lambda:path/2015-03-31"
                 f"/functions/{self.api_authorizer_lambda.function_arn}/invocations"
             ),
             "APIGW_INVOKE_LAMBDA_ROLE_ARN": self.gw_lambda_invocation_role.role_arn,
+            "AUTHORIZER_TTL_SECONDS": str(self.authorizer_ttl_seconds),
         }
 
         chalice_stage_config = {
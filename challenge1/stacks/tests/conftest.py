@@ -0,0 +1,18 @@
+from local_aws import stack
+from aws_cdk.assertions import Template
+
+
+class utils:
+    def synth(**context):
+        """
+        template of the stack synthesized with the given context,
+        assets are not bundled so docker isn't needed
+        """
+        return Template.from_json(stack.synth(**context))
+
+    def state_machine_definition(template):
+        """
+        definition of the payment state machine, references
+        to other resources are replaced by their logical id
+        """
+        return stack.state_machine_definition(template.to_json())
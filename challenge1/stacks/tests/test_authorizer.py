@@ -0,0 +1,59 @@
+import pytest
+from .conftest import utils
+
+
+@pytest.fixture(scope="module")
+def template():
+    return utils.synth()
+
+
+def authorizer_ttls(template):
+    """
+    authorizerResultTtlInSeconds of every authorizer of the rest api definition
+    """
+    (api,) = template.find_resources("AWS::Serverless::Api").values()
+    security_schemes = api["Properties"]["DefinitionBody"]["securityDefinitions"]
+    return [
+        scheme["x-amazon-apigateway-authorizer"]["authorizerResultTtlInSeconds"]
+        for scheme in security_schemes.values()
+    ]
+
+
+def test_authorizer_decisions_are_cached_by_default(template):
+    assert authorizer_ttls(template) == [300]
+
+
+def test_authorizer_cache_can_be_disabled():
+    assert authorizer_ttls(utils.synth(authorizer_ttl_seconds="0")) == [0]
+
+
+def test_authorizer_reads_the_signing_keys(template):
+    (secret_id,) = template.find_resources(
+        "AWS::SecretsManager::Secret", {"Properties": {"Name": "orders-api-signing-keys"}}
+    )
+    template.has_resource_properties(
+        "AWS::Lambda::Function",
+        {
+            "FunctionName": "lambda-authorizer-function",
+            "Environment": {
+                "Variables": {"AUTH_SIGNING_KEYS_SECRET_ARN": {"Ref": secret_id}}
+            },
+        },
+    )
+    template.has_resource_properties(
+        "AWS::IAM::Policy",
+        {
+            "PolicyDocument": {
+                "Statement": [
+                    {
+                        "Action": [
+                            "secretsmanager:GetSecretValue",
+                            "secretsmanager:DescribeSecret",
+                        ],
+                        "Effect": "Allow",
+                        "Resource": {"Ref": secret_id},
+                    }
+                ]
+            }
+        },
+    )
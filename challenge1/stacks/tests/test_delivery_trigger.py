@@ -0,0 +1,45 @@
+import pytest
+from .conftest import utils
+from aws_cdk.assertions import Match
+
+
+@pytest.fixture(scope="module")
+def schedule_template():
+    return utils.synth()
+
+
+@pytest.fixture(scope="module")
+def sqs_template():
+    return utils.synth(
+        delivery_trigger="sqs", delivery_batch_size="5", delivery_batching_window="3"
+    )
+
+
+def test_delivery_handler_runs_on_a_schedule_by_default(schedule_template):
+    schedule_template.has_resource_properties(
+        "AWS::Events::Rule", {"ScheduleExpression": "rate(1 minute)"}
+    )
+    # the only event source mapping is the outbox relay's
+    assert not schedule_template.find_resources(
+        "AWS::Lambda::EventSourceMapping",
+        {
+            "Properties": {
+                "EventSourceArn": {
+                    "Fn::GetAtt": [Match.string_like_regexp("NewOrdersSQS"), "Arn"]
+                }
+            }
+        },
+    )
+
+
+def test_delivery_handler_is_invoked_by_the_queue(sqs_template):
+    sqs_template.resource_count_is("AWS::Events::Rule", 0)
+    sqs_template.has_resource_properties(
+        "AWS::Lambda::EventSourceMapping",
+        {
+            "EventSourceArn": {"Fn::GetAtt": [Match.string_like_regexp("NewOrdersSQS"), "Arn"]},
+            "BatchSize": 5,
+            "MaximumBatchingWindowInSeconds": 3,
+            "FunctionResponseTypes": ["ReportBatchItemFailures"],
+        },
+    )
@@ -0,0 +1,57 @@
+import pytest
+from .conftest import utils
+
+
+@pytest.fixture(scope="module")
+def lambda_template():
+    return utils.synth()
+
+
+@pytest.fixture(scope="module")
+def dynamodb_template():
+    return utils.synth(order_status_update="dynamodb")
+
+
+def test_order_status_is_updated_by_lambda_by_default(lambda_template):
+    lambda_template.has_resource_properties(
+        "AWS::Lambda::Function", {"FunctionName": "update-order-lambda"}
+    )
+    states = utils.state_machine_definition(lambda_template)["States"]
+    assert states["Update Order Status"]["Resource"].endswith(":states:::lambda:invoke")
+    assert states["Update Order Status"]["Next"] == "Order Completed?"
+
+
+def test_order_status_is_updated_by_dynamodb_task(dynamodb_template):
+    functions = dynamodb_template.find_resources(
+        "AWS::Lambda::Function", {"Properties": {"FunctionName": "update-order-lambda"}}
+    )
+    assert functions == {}
+
+    states = utils.state_machine_definition(dynamodb_template)["States"]
+    update = states["Update Order Status"]
+    assert update["Resource"].endswith(":states:::dynamodb:updateItem")
+    assert update["Parameters"]["Key"] == {"pkey": {"S.$": "$.pkey"}}
+    assert update["Parameters"]["UpdateExpression"] == "SET #status = :to"
+    assert update["Parameters"]["ConditionExpression"] == (
+        "attribute_exists(pkey) AND #status = :from"
+    )
+    assert update["Parameters"]["ExpressionAttributeValues"] == {
+        ":to": {"S": "PLACED"},
+        ":from": {"S": "PROCESSING"},
+    }
+    assert update["ResultPath"] == "$.Payload"
+    assert update["ResultSelector"]["Status.$"] == "$.Attributes.Status.S"
+    # cancelled orders fail the condition
+    assert update["Catch"] == [
+        {
+            "ErrorEquals": ["DynamoDB.ConditionalCheckFailedException"],
+            "Next": "Order Not Processing",
+        }
+    ]
+    assert states["Order Completed?"]["Choices"] == [
+        {
+            "Variable": "$.Payload.Status",
+            "StringEquals": "PLACED",
+            "Next": "Send Message to Order Queue",
+        }
+    ]
@@ -0,0 +1,95 @@
+import pytest
+from .conftest import utils
+from aws_cdk.assertions import Match
+
+
+@pytest.fixture(scope="module")
+def template():
+    return utils.synth(relay_max_starts_per_second="20")
+
+
+def test_orders_table_streams_new_images(template):
+    template.has_resource_properties(
+        "AWS::DynamoDB::Table",
+        {"StreamSpecification": {"StreamViewType": "NEW_IMAGE"}},
+    )
+
+
+def test_relay_only_receives_new_outbox_records(template):
+    template.has_resource_properties(
+        "AWS::Lambda::EventSourceMapping",
+        {
+            "EventSourceArn": {
+                "Fn::GetAtt": [Match.string_like_regexp("OrdersTable"), "StreamArn"]
+            },
+            "FilterCriteria": {
+                "Filters": [
+                    {
+                        "Pattern": '{"eventName":["INSERT"],"dynamodb":{"Keys":{"pkey":{"S":[{"prefix":"outbox#"}]}}}}'
+                    }
+                ]
+            },
+            "FunctionResponseTypes": ["ReportBatchItemFailures"],
+            "MaximumRetryAttempts": 5,
+            "DestinationConfig": {
+                "OnFailure": {
+                    "Destination": {
+                        "Fn::GetAtt": [Match.string_like_regexp("OutboxDLQ"), "Arn"]
+                    }
+                }
+            },
+        },
+    )
+
+
+def test_only_the_relay_starts_executions(template):
+    template.has_resource_properties(
+        "AWS::Lambda::Function",
+        {
+            "FunctionName": "orders-outbox-relay",
+            "Environment": {
+                "Variables": Match.object_like({"RELAY_MAX_STARTS_PER_SECOND": "20"})
+            },
+        },
+    )
+    statements = [
+        statement
+        for role in template.find_resources("AWS::IAM::Role").values()
+        for policy in role["Properties"].get("Policies", [])
+        for statement in policy["PolicyDocument"]["Statement"]
+        if statement["Action"] == "states:StartExecution"
+        and role["Properties"]["RoleName"] == "order-restapi-role"
+    ]
+    assert statements == []
+
+
+def test_relay_can_mark_the_outbox_records(template):
+    template.has_resource_properties(
+        "AWS::IAM::Role",
+        {
+            "RoleName": "order-outbox-relay-role",
+            "Policies": Match.array_with(
+                [
+                    {
+                        "PolicyName": "dynamodb",
+                        "PolicyDocument": {
+                            "Statement": [
+                                Match.object_like(
+                                    {
+                                        "Action": "dynamodb:UpdateItem",
+                                        "Resource": {
+                                            "Fn::GetAtt": [
+                                                Match.string_like_regexp("OrdersTable"),
+                                                "Arn",
+                                            ]
+                                        },
+                                    }
+                                )
+                            ],
+                            "Version": "2012-10-17",
+                        },
+                    }
+                ]
+            ),
+        },
+    )
@@ -0,0 +1,103 @@
+import os
+import pytest
+from unittest.mock import patch
+from .conftest import utils
+from aws_cdk.assertions import Match
+from local_aws.dynamodb import InMemoryTable
+from local_aws.stepfunctions import LocalStateMachine, dynamodb_update_item
+
+os.environ.setdefault("ORDERS_TABLE", "TEST_TABLE")
+
+ORDER = {
+    "pkey": "ORD0000001",
+    "Item": "test_item",
+    "Amount": 100,
+    "Status": "PROCESSING",
+    "OrderedBy": "dummy@dummy.com",
+}
+
+
+@pytest.fixture(scope="module", params=["lambda", "dynamodb"])
+def express_template(request):
+    return utils.synth(
+        payment_state_machine_type="EXPRESS",
+        payment_wait_seconds=0,
+        order_status_update=request.param,
+    )
+
+
+@pytest.fixture
+def orders_table():
+    from common import dynamodb
+
+    table = InMemoryTable()
+    with patch.object(dynamodb, "__table", table):
+        yield table
+
+
+@pytest.fixture
+def state_machine(express_template, orders_table):
+    from orders_table_update_status.index import handler
+
+    messages = []
+
+    def invoke_lambda(parameters):
+        return {"StatusCode": 200, "Payload": handler(parameters["Payload"], None)}
+
+    def send_message(parameters):
+        messages.append(parameters["MessageBody"])
+        return {"MessageId": str(len(messages))}
+
+    state_machine = LocalStateMachine(
+        utils.state_machine_definition(express_template),
+        resources={
+            "lambda:invoke": invoke_lambda,
+            "dynamodb:updateItem": dynamodb_update_item(orders_table),
+            "sqs:sendMessage": send_message,
+        },
+        wait=lambda seconds: None,
+    )
+    state_machine.messages = messages
+    return state_machine
+
+
+def test_express_state_machine_logs_to_cloudwatch(express_template):
+    express_template.has_resource_properties(
+        "AWS::StepFunctions::StateMachine",
+        {
+            "StateMachineType": "EXPRESS",
+            "LoggingConfiguration": {
+                "Destinations": [
+                    {"CloudWatchLogsLogGroup": {"LogGroupArn": Match.any_value()}}
+                ],
+                "Level": "ALL",
+                "IncludeExecutionData": False,
+            },
+        },
+    )
+
+
+def test_mock_payment_wait_is_configurable(express_template):
+    states = utils.state_machine_definition(express_template)["States"]
+    assert states["Mock Payment Process (Wait 1 min)"]["Seconds"] == 0
+
+
+def test_placed_order_is_sent_to_the_queue(state_machine, orders_table):
+    orders_table.items[ORDER["pkey"]] = dict(ORDER)
+
+    execution = state_machine.start_sync_execution(dict(ORDER))
+
+    assert execution["status"] == "SUCCEEDED"
+    assert orders_table.items[ORDER["pkey"]]["Status"] == "PLACED"
+    assert [message["pkey"] for message in state_machine.messages] == [ORDER["pkey"]]
+    assert state_machine.messages[0]["Status"] == "PLACED"
+
+
+def test_cancelled_order_stops_the_execution(state_machine, orders_table):
+    orders_table.items[ORDER["pkey"]] = dict(ORDER, Status="CANCELLED")
+
+    execution = state_machine.start_sync_execution(dict(ORDER))
+
+    assert execution["status"] == "FAILED"
+    assert orders_table.items[ORDER["pkey"]]["Status"] == "CANCELLED"
+    assert state_machine.messages == []
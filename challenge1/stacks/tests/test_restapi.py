@@ -0,0 +1,44 @@
+import pytest
+from .conftest import utils
+from aws_cdk.assertions import Match
+
+
+@pytest.fixture(scope="module")
+def template():
+    return utils.synth()
+
+
+def test_restapi_can_query_the_orders_index(template):
+    orders_table_arn = {"Fn::GetAtt": [Match.string_like_regexp("OrdersTable"), "Arn"]}
+    template.has_resource_properties(
+        "AWS::IAM::Role",
+        {
+            "RoleName": "order-restapi-role",
+            "Policies": Match.array_with(
+                [
+                    {
+                        "PolicyName": "dynamodb",
+                        "PolicyDocument": {
+                            "Statement": [
+                                Match.object_like(
+                                    {
+                                        "Action": "dynamodb:*",
+                                        "Resource": [
+                                            orders_table_arn,
+                                            {
+                                                "Fn::Join": [
+                                                    "",
+                                                    [orders_table_arn, "/index/*"],
+                                                ]
+                                            },
+                                        ],
+                                    }
+                                )
+                            ],
+                            "Version": "2012-10-17",
+                        },
+                    }
+                ]
+            ),
+        },
+    )
@@ -0,0 +1,87 @@
+import json
+import time
+import pytest
+from collections import Counter
+from types import SimpleNamespace
+from unittest.mock import patch
+from content import index
+
+# latency of a request to the instance metadata service, a link-local http call
+METADATA_SERVICE_LATENCY = 0.0005
+
+METADATA = {
+    "ami-id": "ami-0abcdef1234567890",
+    "block-device-mapping": {"ami": "/dev/xvda", "root": "/dev/xvda"},
+    "hostname": "ip-10-0-0-1.ec2.internal",
+    "placement": {"availability-zone": "us-east-1a", "region": "us-east-1"},
+    "services": {"domain": "amazonaws.com", "partition": "aws"},
+    "system": "xen",
+}
+
+
+class MetadataService:
+    """
+    stand-in for the instance metadata service serving `metadata`, every
+    request takes `latency` seconds and is counted in `calls`
+    """
+
+    def __init__(self, metadata, latency=0):
+        self.metadata = metadata
+        self.latency = latency
+        self.calls = Counter()
+
+    def put(self, url, headers=None):
+        self.__round_trip("put")
+        return SimpleNamespace(text="test-token", status_code=200)
+
+    def get(self, url, headers=None):
+        self.__round_trip("get")
+        value = self.metadata
+        for key in filter(None, url[len(index.METADATA_BASE_URL) :].split("/")):
+            value = value.get(key) if isinstance(value, dict) else None
+        if value is None:
+            return SimpleNamespace(text="", status_code=404)
+        if isinstance(value, dict):
+            # directories list their keys, sub directories end with a /
+            value = "\n".join(k + "/" if isinstance(v, dict) else k for k, v in value.items())
+        return SimpleNamespace(text=value, status_code=200)
+
+    def __round_trip(self, method):
+        self.calls[method] += 1
+        time.sleep(self.latency)
+
+
+@pytest.mark.benchmark(group="get_metadata")
+@pytest.mark.parametrize(
+    "path, expected, round_trips",
+    [
+        # the root, its 6 keys and the 6 keys of its 3 directories
+        pytest.param(None, METADATA, 13, id="full"),
+        pytest.param("placement/", METADATA["placement"], 3, id="directory"),
+        pytest.param("hostname", METADATA["hostname"], 1, id="key"),
+    ],
+)
+def test_get_metadata(benchmark, path, expected, round_trips):
+    """
+    every directory and key is a request, the token is only requested once
+    """
+    service = MetadataService(METADATA, latency=METADATA_SERVICE_LATENCY)
+    calls = []
+
+    def get_metadata():
+        before = sum(service.calls.values())
+        response = index.get_metadata(path)
+        calls.append(sum(service.calls.values()) - before)
+        return response
+
+    with patch.object(index.requests, "get", service.get), patch.object(
+        index.requests, "put", service.put
+    ), patch.object(index, "__token", None):
+        # the first call requests the token
+        index.get_metadata(path)
+        response = benchmark.pedantic(get_metadata, rounds=20)
+
+    assert (json.loads(response) if path != "hostname" else response) == expected
+    benchmark.extra_info["round_trips"] = sum(calls) / len(calls)
+    assert calls == [round_trips] * len(calls)
+    assert service.calls["put"] == 1
@@ -80,10 +80,12 @@ def get_access_token():
     return __refresh_token()
 
 
-def __get_metadata(url, data={}):
+def __get_metadata(url, data=None):
     """
     get instance metadata
     """
+    # a new dict per call, a shared default would keep the keys of earlier calls
+    data = {} if data is None else data
     __response = __get_data(url)
     if not url.endswith("/"):
         try:
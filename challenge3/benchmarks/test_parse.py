@@ -0,0 +1,23 @@
+import pytest
+from content.get_item import parse, DELIMITER
+
+
+def nested_object(depth):
+    """
+    {"k0": {"k1": ... {"k<depth - 1>": "value"}}} and the key of its value
+    """
+    keys = [f"k{i}" for i in range(depth)]
+    obj = "value"
+    for key in reversed(keys):
+        obj = {key: obj, f"{key}-sibling": "other"}
+    return obj, DELIMITER.join(keys)
+
+
+@pytest.mark.benchmark(group="parse")
+@pytest.mark.parametrize("depth", [1, 10, 100])
+def test_parse(benchmark, depth):
+    """
+    parsing is local, its cost grows with the depth of the key
+    """
+    obj, key = nested_object(depth)
+    assert benchmark(parse, obj, key) == "value"